@@ -0,0 +1,334 @@
+import argparse
+import importlib
+import json
+import multiprocessing
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from functools import partial
+from typing import Optional
+
+from emulators.AsyncEmulator import AsyncEmulator
+from emulators.AsyncioEmulator import AsyncioEmulator
+from emulators.DiscreteEventEmulator import DiscreteEventEmulator
+from emulators.EventLog import QUIET, EventLog
+from emulators.ShardedEmulator import ShardedEmulator
+from emulators.SyncEmulator import SyncEmulator
+
+try:
+    import resource
+except ImportError:  # not available on Windows, peak memory is not measured there
+    resource = None
+
+# the solutions measured, as module and class in exercises/
+EXERCISES = [
+    "demo.PingPong",
+    "exercise1.Gossip",
+    "exercise2.RipCommunication",
+    "exercise4.Centralised",
+    "exercise4.TokenRing",
+    "exercise4.RicartAgrawala",
+    "exercise4.Maekawa",
+    "exercise4.SuzukiKasami",
+    "exercise4.ChangRoberts",
+    "exercise4.Bully",
+    "exercise5.BasicMulticast",
+    "exercise5.ReliableMulticast",
+    "exercise5.ReliableIPMulticast",
+    "exercise5.TOSEQMulticast",
+    "exercise5.ISISMulticast",
+    "exercise5.COMulticast",
+    "exercise6.FResilientConsensus",
+    "exercise6.SingleByzantine",
+    "exercise6.King",
+    "exercise6.PAXOS",
+    "exercise7.Bully",
+    "exercise8.GfsNetwork",
+    "exercise9.MapReduceNetwork",
+    "exercise10.BlockchainNetwork",
+    "exercise11.ChordNetwork",
+    "exercise12.AodvNode",
+]
+
+# every emulator that runs without a user at the keyboard
+ENGINES = {
+    "async": AsyncEmulator,
+    "sync": SyncEmulator,
+    "discrete": DiscreteEventEmulator,
+    "asyncio": AsyncioEmulator,
+    "sharded": partial(ShardedEmulator, shards=2),
+    "sharded-sync": partial(ShardedEmulator, shards=2, synchronous=True),
+}
+# the engines with rounds, the others report None
+ROUNDS = {"sync", "sharded-sync"}
+# the engines running devices in worker processes, whose memory the benchmark cannot see, they report None
+WORKERS = {"sharded", "sharded-sync"}
+
+
+def measure(exercise: str, engine: str, devices: int, limit: float) -> dict:
+    """
+    Run one solution in the current process, meant to be called in a fresh process.
+
+    Solutions that do not terminate, e.g. the mutual exclusion algorithms, are measured until the time limit and
+    reported as ``limit``, their message rate is still comparable between runs. The sharded emulator counts what its
+    shards reported up to ``_Shard.progress_interval`` before the limit. Its peak memory is None, the devices live in
+    worker processes that are killed rather than waited for at the limit.
+
+    Args:
+        exercise (str): One of EXERCISES.
+        engine (str): One of ENGINES.
+        devices (int): The number of devices.
+        limit (float): Seconds after which the measurement stops.
+
+    Returns:
+        dict: The measurement, see ``run``.
+    """
+    module, algorithm = exercise.split(".")
+    kind = getattr(importlib.import_module(f"exercises.{module}"), algorithm)
+    # the same choices in every run of a solution
+    random.seed(0)
+    emulator = ENGINES[engine](devices, kind, log=EventLog(QUIET, []))
+    start = time.perf_counter()
+    failures = []
+
+    def run_emulator():
+        try:
+            emulator.run()
+        except Exception as e:
+            failures.append(e)
+
+    runner = threading.Thread(target=run_emulator, daemon=True)
+    runner.start()
+    runner.join(limit)
+    wall = time.perf_counter() - start
+    if len(failures) > 0:
+        # e.g. a sharded emulator refusing devices that share state through the context of the run
+        raise failures[0]
+    progress = emulator.progress()
+    return {
+        "status": "limit" if runner.is_alive() else "ok",
+        "wall": wall,
+        "messages": progress.messages_sent,
+        "messages_per_second": progress.messages_sent / wall if wall > 0 else 0.0,
+        "rounds": progress.rounds if engine in ROUNDS else None,
+        "peak_rss": None if engine in WORKERS else _peak_rss(),
+    }
+
+
+def _peak_rss() -> Optional[int]:
+    # in bytes, Linux reports kilobytes and macOS bytes
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _measure_in_child(results: multiprocessing.Queue, *args):
+    # devices print a lot, also from the processes of the sharded emulator
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    os.dup2(devnull, 2)
+    try:
+        results.put(measure(*args))
+    except Exception as e:
+        results.put({"status": "error", "error": repr(e)})
+    results.close()
+    results.join_thread()
+    # exiting skips the clean up of multiprocessing, the worker processes of the sharded emulator would live on
+    for child in multiprocessing.active_children():
+        child.kill()
+    # threads of devices that did not terminate would keep the process alive
+    os._exit(0)
+
+
+def run(
+    exercises: list[str],
+    engines: list[str],
+    sizes: list[int],
+    limit: float,
+    repeat: int,
+) -> list[dict]:
+    """
+    Measure every combination of solution, emulator and number of devices, each run in a process of its own.
+
+    Returns:
+        list[dict]: One record per combination with the keys ``exercise``, ``engine``, ``devices`` and ``status``,
+            which is ``ok``, ``limit`` (still running at the time limit), ``error`` or ``hung`` (killed), and for
+            measured runs ``wall`` in seconds, ``messages``, ``messages_per_second``, ``rounds`` (None for engines
+            without rounds) and ``peak_rss`` in bytes (None for the sharded engines). Of several repetitions the one with the most messages per second is kept.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in methods else "spawn")
+    records = []
+    print(
+        f"{'exercise':<30} {'engine':>12} {'devices':>7} {'status':>6} {'wall':>8} {'messages':>9} {'msg/s':>9} "
+        f"{'rounds':>6} {'rss':>7}"
+    )
+    for exercise in exercises:
+        for engine in engines:
+            for devices in sizes:
+                best = None
+                for _ in range(repeat):
+                    results = context.Queue()
+                    process = context.Process(
+                        target=_measure_in_child,
+                        args=[results, exercise, engine, devices, limit],
+                    )
+                    process.start()
+                    try:
+                        # the child reports shortly after the limit, unless a device blocks the emulator itself
+                        measured = results.get(timeout=limit + 10)
+                    except queue.Empty:
+                        measured = {"status": "hung"}
+                        process.kill()
+                    process.join()
+                    if best is None or measured.get(
+                        "messages_per_second", -1
+                    ) > best.get("messages_per_second", -1):
+                        best = measured
+                record = {"exercise": exercise, "engine": engine, "devices": devices}
+                record.update(best)
+                records.append(record)
+                _print(record)
+    return records
+
+
+def _print(record: dict):
+    line = f"{record['exercise']:<30} {record['engine']:>12} {record['devices']:>7} {record['status']:>6}"
+    if "wall" in record:
+        rss = record["peak_rss"]
+        rounds = record["rounds"]
+        line += (
+            f" {record['wall']:>7.3f}s {record['messages']:>9} {record['messages_per_second']:>9.0f} "
+            f"{'-' if rounds is None else rounds:>6} {'-' if rss is None else f'{rss / 2**20:.0f}M':>7}"
+        )
+    print(line, flush=True)
+
+
+def compare(records: list[dict], baseline: list[dict], threshold: float) -> list[str]:
+    """
+    Find the runs that got slower or use more memory than in a baseline.
+
+    Args:
+        records (list[dict]): The records of this run.
+        baseline (list[dict]): The records of an earlier run, as written by ``--output``.
+        threshold (float): The tolerated change, e.g. 0.2 for 20 percent.
+
+    Returns:
+        list[str]: A description of every regression.
+    """
+    earlier = {
+        (record["exercise"], record["engine"], record["devices"]): record
+        for record in baseline
+    }
+    regressions = []
+    for record in records:
+        key = (record["exercise"], record["engine"], record["devices"])
+        before = earlier.get(key)
+        if before is None:
+            continue
+        name = f"{record['exercise']} on {record['engine']} with {record['devices']} devices"
+        if "wall" not in before:
+            # e.g. a sharded run refused right away, which must not start to hang
+            if record["status"] != before["status"]:
+                regressions.append(
+                    f"{name}: {before['status']} before, {record['status']} now"
+                )
+            continue
+        if "wall" not in record:
+            regressions.append(
+                f"{name}: {before['status']} before, {record['status']} now"
+            )
+            continue
+        if before["status"] == "ok" and record["status"] == "ok":
+            if record["wall"] > before["wall"] * (1 + threshold):
+                regressions.append(
+                    f"{name}: {record['wall']:.3f} s, {before['wall']:.3f} s before"
+                )
+        elif record["messages_per_second"] < before["messages_per_second"] * (
+            1 - threshold
+        ):
+            # runs stopped at the time limit are compared on how many messages they got through
+            regressions.append(
+                f"{name}: {record['messages_per_second']:.0f} messages/s, {before['messages_per_second']:.0f} before"
+            )
+        if record["peak_rss"] is not None and before["peak_rss"] is not None:
+            if record["peak_rss"] > before["peak_rss"] * (1 + threshold):
+                regressions.append(
+                    f"{name}: {record['peak_rss'] / 2**20:.0f} MB peak memory, {before['peak_rss'] / 2**20:.0f} MB before"
+                )
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Wall time, message rate, rounds and peak memory of the solutions in exercises/ for every emulator "
+        "and number of devices."
+    )
+    parser.add_argument(
+        "--exercises",
+        metavar="module.Class",
+        type=str,
+        nargs="+",
+        default=EXERCISES,
+        choices=EXERCISES,
+        help="Solutions to measure, by default all",
+    )
+    parser.add_argument(
+        "--engines",
+        metavar="engine",
+        type=str,
+        nargs="+",
+        default=list(ENGINES.keys()),
+        choices=list(ENGINES.keys()),
+        help=f"Emulators to measure: {', '.join(ENGINES.keys())} (default all)",
+    )
+    parser.add_argument(
+        "--devices",
+        metavar="N",
+        type=int,
+        nargs="+",
+        default=[4, 16, 64],
+        help="Numbers of devices to measure",
+    )
+    parser.add_argument(
+        "--limit",
+        metavar="S",
+        type=float,
+        default=5.0,
+        help="Seconds after which a run that did not terminate is stopped",
+    )
+    parser.add_argument(
+        "--repeat", metavar="R", type=int, default=1, help="Best of R measurements"
+    )
+    parser.add_argument(
+        "--output", metavar="file", type=str, help="Write the results as JSON"
+    )
+    parser.add_argument(
+        "--baseline",
+        metavar="file",
+        type=str,
+        help="Compare against the results of an earlier run, written with --output",
+    )
+    parser.add_argument(
+        "--threshold",
+        metavar="F",
+        type=float,
+        default=0.2,
+        help="Slowdown or memory growth compared to the baseline reported as a regression, e.g. 0.2 for 20%%",
+    )
+    args = parser.parse_args()
+    records = run(args.exercises, args.engines, args.devices, args.limit, args.repeat)
+    if args.output is not None:
+        with open(args.output, "w") as file:
+            json.dump(records, file, indent=1)
+    if args.baseline is not None:
+        with open(args.baseline) as file:
+            regressions = compare(records, json.load(file), args.threshold)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if len(regressions) > 0:
+            sys.exit(1)
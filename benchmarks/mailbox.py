@@ -0,0 +1,97 @@
+import argparse
+import random
+import timeit
+
+from emulators.Mailbox import Mailbox
+
+
+class ShufflingMailbox(Mailbox):
+    """
+    The mailbox as it used to be, reshuffling every waiting message whenever one is put.
+    """
+
+    def put(self, message):
+        with self._lock:
+            self._messages.append(message)
+            random.shuffle(self._messages)
+            self._arrived.notify()
+
+    def _take(self):
+        return self._messages.pop()
+
+
+def fill_and_drain(mailbox_type, pending: int, bulk: bool = False):
+    mailbox = mailbox_type(random.Random(0))
+    for message in range(pending):
+        mailbox.put(message)
+    if bulk:
+        # what receive_all does
+        mailbox.drain()
+        return
+    while mailbox.get() is not None:
+        pass
+
+
+def run(sizes: list[int], repeat: int):
+    print(f"{'pending':>8} {'shuffle':>12} {'swap':>12} {'speedup':>8} {'drain':>12}")
+    for pending in sizes:
+        number = max(1, 20000 // pending)
+        shuffling = min(
+            timeit.repeat(
+                lambda: fill_and_drain(ShufflingMailbox, pending),
+                number=number,
+                repeat=repeat,
+            )
+        )
+        swapping = min(
+            timeit.repeat(
+                lambda: fill_and_drain(Mailbox, pending), number=number, repeat=repeat
+            )
+        )
+        draining = min(
+            timeit.repeat(
+                lambda: fill_and_drain(Mailbox, pending, bulk=True),
+                number=number,
+                repeat=repeat,
+            )
+        )
+        print(
+            f"{pending:>8} {1e6 * shuffling / (number * pending):>9.2f} us {1e6 * swapping / (number * pending):>9.2f} us "
+            f"{shuffling / swapping:>7.1f}x {1e6 * draining / (number * pending):>9.2f} us"
+        )
+
+
+def check_reproducible(pending: int):
+    orders = []
+    for _ in range(2):
+        mailbox = Mailbox(random.Random(42))
+        for message in range(pending):
+            mailbox.put(message)
+        orders.append([mailbox.get() for _ in range(pending)])
+    assert orders[0] == orders[1], "seeded mailboxes delivered in different orders"
+    assert sorted(orders[0]) == list(range(pending)), "messages were lost"
+    mailbox = Mailbox(random.Random(42))
+    for message in range(pending):
+        mailbox.put(message)
+    assert sorted(mailbox.drain()) == list(range(pending)), "drain lost messages"
+    assert len(mailbox) == 0, "drain left messages behind"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Cost per message of filling a mailbox with N messages and draining it again."
+    )
+    parser.add_argument(
+        "--sizes",
+        metavar="N",
+        type=int,
+        nargs="+",
+        default=[1, 2, 4, 8, 16, 64, 256, 1024, 4096],
+        help="Numbers of pending messages to measure",
+    )
+    parser.add_argument(
+        "--repeat", metavar="R", type=int, default=5, help="Best of R measurements"
+    )
+    args = parser.parse_args()
+    check_reproducible(max(args.sizes))
+    run(args.sizes, args.repeat)
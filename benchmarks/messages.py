@@ -0,0 +1,148 @@
+import argparse
+import copy
+import pickle
+import timeit
+import tracemalloc
+
+from emulators.Mailbox import Mailbox
+from emulators.MessageStub import MessageStub, compact
+
+
+class LegacyStub:
+    """
+    The message stub as it used to be, keeping every attribute in a per-instance ``__dict__``.
+    """
+
+    _frozen = False
+
+    def __init__(self, sender_id: int, destination_id: int):
+        self._source = sender_id
+        self._destination = destination_id
+
+    @property
+    def source(self) -> int:
+        return self._source
+
+    @property
+    def destination(self) -> int:
+        return self._destination
+
+    def __setattr__(self, name, value):
+        if self._frozen:
+            raise AttributeError(f"Cannot set {name}, the message is frozen")
+        object.__setattr__(self, name, value)
+
+
+class LegacyPing(LegacyStub):
+    def __init__(self, sender: int, destination: int, is_ping: bool):
+        super().__init__(sender, destination)
+        self.is_ping = is_ping
+
+
+class Ping(MessageStub):
+    def __init__(self, sender: int, destination: int, is_ping: bool):
+        super().__init__(sender, destination)
+        self.is_ping = is_ping
+
+
+@compact
+class CompactPing(MessageStub):
+    is_ping: bool
+
+    def __init__(self, sender: int, destination: int, is_ping: bool):
+        super().__init__(sender, destination)
+        self.is_ping = is_ping
+
+
+VARIANTS = {"before": LegacyPing, "plain": Ping, "compact": CompactPing}
+
+
+def bytes_per_message(message_type, count: int) -> float:
+    # the first instance of a class allocates the keys shared by the dictionaries of all instances
+    message_type(0, 1, True)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    messages = [message_type(i % 100, (i + 1) % 100, True) for i in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    # the list holding the messages is not part of the messages
+    return (after - before - messages.__sizeof__()) / count
+
+
+def deep_copy(message):
+    # what the DeepCopy policy does
+    return pickle.loads(pickle.dumps(message, pickle.HIGHEST_PROTOCOL))
+
+
+def shallow_copy(message):
+    # what the CopyOnWrite policy does
+    if isinstance(message, MessageStub):
+        return message.clone()
+    return copy.copy(message)
+
+
+def send_and_receive(message_type, copier, count: int):
+    mailbox = Mailbox()
+    for i in range(count):
+        mailbox.put(copier(message_type(i % 100, (i + 1) % 100, True)))
+    mailbox.drain()
+
+
+def run(count: int, repeat: int):
+    print(f"{'message':>14} {'memory':>12} {'deep copy':>14} {'shallow copy':>14}")
+    # measure memory first, the timings leave garbage behind
+    sizes = {
+        name: bytes_per_message(message_type, count)
+        for name, message_type in VARIANTS.items()
+    }
+    for name, message_type in VARIANTS.items():
+        timings = []
+        for copier in (deep_copy, shallow_copy):
+            best = min(
+                timeit.repeat(
+                    lambda: send_and_receive(message_type, copier, count),
+                    number=1,
+                    repeat=repeat,
+                )
+            )
+            timings.append(count / best)
+        print(
+            f"{name:>14} {sizes[name]:>8.0f} B/m {timings[0]:>10.0f} m/s {timings[1]:>10.0f} m/s"
+        )
+
+
+def check_equivalent():
+    for message_type in (Ping, CompactPing):
+        message = message_type(1, 2, True)
+        message.freeze()
+        for clone in (deep_copy(message), shallow_copy(message)):
+            assert type(clone) is message_type, "copies changed type"
+            assert (clone.source, clone.destination, clone.is_ping) == (1, 2, True)
+            assert clone.frozen, "copies of frozen messages have to stay frozen"
+        assert hash(message) == hash(message), "frozen messages are not hashable"
+    assert CompactPing(1, 2, True) != CompactPing(
+        1, 2, True
+    ), "compact messages compare by value"
+    assert not hasattr(
+        CompactPing(1, 2, True), "__dict__"
+    ), "compact messages have a dict"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Memory per message and messages sent per second through a mailbox, for each message layout."
+    )
+    parser.add_argument(
+        "--messages",
+        metavar="N",
+        type=int,
+        default=100000,
+        help="Number of messages to create and send",
+    )
+    parser.add_argument(
+        "--repeat", metavar="R", type=int, default=3, help="Best of R measurements"
+    )
+    args = parser.parse_args()
+    run(args.messages, args.repeat)
+    # freezing a message guards the assignments of its class, so the messages are checked after measuring them
+    check_equivalent()
@@ -1,10 +1,12 @@
-import copy
-import random
+import threading
 import time
 from typing import Optional
 from os import name
 
 from emulators.EmulatorStub import EmulatorStub
+from emulators.EventLog import MESSAGES, RECEIVE, SEND
+from emulators.Latency import DEFAULT_LATENCY, LatencyModel
+from emulators.Mailbox import Mailbox, TimedMailbox
 from emulators.MessageStub import MessageStub
 
 if name == "posix":
@@ -18,69 +20,164 @@ else:
 
 
 class AsyncEmulator(EmulatorStub):
-    def __init__(self, number_of_devices: int, kind):
-        super().__init__(number_of_devices, kind)
-        self._terminated = 0
-        self._messages: dict[int, list[MessageStub]] = {}
+    """
+    Asynchronous emulator running every device in its own thread.
+
+    Network delays are emulated in virtual time: every device has a clock, a message is stamped with the clock of its
+    sender plus a delay drawn from the latency model, and mailboxes hand out messages in timestamp order. Receiving a
+    message moves the clock of the receiver forward to the timestamp, waiting for the next round moves it by an idle
+    delay. Passing ``latency=None`` drops the clocks and delivers the messages of a mailbox in any order.
+    """
+
+    def __init__(
+        self,
+        number_of_devices: int,
+        kind,
+        latency: Optional[LatencyModel] = DEFAULT_LATENCY,
+        **kwargs,
+    ):
+        super().__init__(number_of_devices, kind, **kwargs)
+        if self._topology is not None:
+            # the links of the topology have delays of their own
+            latency = self._topology
+        # replays draw the delays as well, so the devices draw the same random numbers as in the recorded run
+        self._latency = latency
+        self._clocks = [0.0 for _ in self.ids]
+        mailbox = Mailbox if self._latency is None else TimedMailbox
+        self._messages: dict[int, Mailbox] = {
+            index: mailbox(self._rng) for index in self.ids if self._hosts(index)
+        }
         self._messages_sent = 0
+        self._counter_lock = threading.Lock()
 
     def run(self):
-        self._progress.acquire()
         self._start_threads()
-        self._progress.release()
-
-        while True:
-            time.sleep(0.1)
-            self._progress.acquire()
-            # check if everyone terminated
-            if self.all_terminated:
-                break
-            self._progress.release()
+        self.wait_for_termination()
         for t in self._threads:
             t.join()
+        self._log.close()
         return
 
     def queue(self, message: MessageStub, stepper=False):
-        if not stepper:
-            self._progress.acquire()
-        self._messages_sent += 1
-        print(f"\r\t{GREEN}Send{RESET} {message}")
-        if message.destination not in self._messages:
-            self._messages[message.destination] = []
-        self._messages[message.destination].append(
-            copy.deepcopy(message)
-        )  # avoid accidental memory sharing
-        random.shuffle(
-            self._messages[message.destination]
-        )  # shuffle to emulate changes in order
-        time.sleep(
-            random.uniform(0.01, 0.1)
-        )  # try to obfuscate delays and emulate network delays
-        if not stepper:
-            self._progress.release()
-
-    def dequeue(self, index: int, stepper=False) -> Optional[MessageStub]:
-        if not stepper:
-            self._progress.acquire()
-        if index not in self._messages:
-            if not stepper:
-                self._progress.release()
-            return None
-        elif len(self._messages[index]) == 0:
-            if not stepper:
-                self._progress.release()
+        # the stepper flag is kept for the SteppingEmulator, mailboxes take care of their own locking
+        if not self._exists(message):
+            return
+        if self._faults is not None:
+            return self.queue_many([message])
+        with self._counter_lock:
+            self._messages_sent += 1
+        m = self._copy(message)
+        if self._log.level >= MESSAGES:
+            self._log.record(SEND, m)
+        if self._metrics is not None:
+            self._metrics.message_sent(m, self._time(m.source))
+        self._deliver(m)
+
+    def queue_many(self, messages: list[MessageStub]):
+        self._deliver_all(self._copy_many(messages))
+
+    def broadcast(
+        self,
+        message: MessageStub,
+        include_self: bool = False,
+        destinations: Optional[list[int]] = None,
+    ):
+        self._deliver_all(self._copy_broadcast(message, include_self, destinations))
+
+    def _deliver_all(self, messages: list[MessageStub]):
+        with self._counter_lock:
+            self._messages_sent += len(messages)
+        for m in messages:
+            self._deliver(m)
+
+    def _deliver(self, m: MessageStub):
+        if self._latency is None:
+            self._messages[m.destination].put(m)
+        else:
+            self._messages[m.destination].put(
+                m, self._latency.arrival(m, self._clocks[m.source])
+            )
+
+    def dequeue(
+        self, index: int, stepper=False, timeout: Optional[float] = None
+    ) -> Optional[MessageStub]:
+        # never block while the SteppingEmulator holds the progress lock
+        mailbox = self._messages[index]
+        if self._turns is not None and timeout is not None:
+            # wait without the turn, a replay finds the message there when the device gets the turn back
+            self._turns.give(index)
+            if not self._turns.replaying:
+                mailbox.wait(timeout)
+            self._turns.take(index)
+            timeout = None
+        if self._forced:
+            m = self._replay_mailbox(index, mailbox, None if stepper else timeout)
+        elif self._latency is None:
+            m = mailbox.get(None if stepper else timeout)
+        else:
+            entry = mailbox.get_timed(None if stepper else timeout)
+            if entry is None:
+                m = None
+            else:
+                timestamp, m = entry
+                self._clocks[index] = max(self._clocks[index], timestamp)
+        if m is not None:
+            if self._log.level >= MESSAGES:
+                self._log.record(RECEIVE, m)
+            if self._recording:
+                self._delivery_schedule.delivered(index, m, self._rounds)
+            if self._metrics is not None:
+                self._metrics.message_received(index, m, self._time(index))
+        return m
+
+    def _replay_mailbox(
+        self, index: int, mailbox: Mailbox, timeout: Optional[float]
+    ) -> Optional[MessageStub]:
+        expected = self._delivery_schedule.expected(index)
+        if expected is None:
             return None
+        m = mailbox.get_where(expected, timeout)
+        if m is not None:
+            self._delivery_schedule.advance(index)
+        return m
+
+    def drain(self, index: int) -> list[MessageStub]:
+        if self._forced:
+            return EmulatorStub.drain(self, index)
+        mailbox = self._messages[index]
+        if self._latency is None:
+            messages = mailbox.drain()
         else:
-            m = self._messages[index].pop()
-            print(f"\r\t{GREEN}Recieve{RESET} {m}")
-            if not stepper:
-                self._progress.release()
-            return m
+            entries = mailbox.drain_timed()
+            if len(entries) > 0:
+                self._clocks[index] = max(self._clocks[index], entries[-1][0])
+            messages = [m for _, m in entries]
+        if self._log.level >= MESSAGES:
+            for m in messages:
+                self._log.record(RECEIVE, m)
+        if self._recording:
+            for m in messages:
+                self._delivery_schedule.delivered(index, m, self._rounds)
+        if self._metrics is not None:
+            now = self._time(index)
+            for m in messages:
+                self._metrics.message_received(index, m, now)
+        return messages
+
+    def _time(self, index: int) -> float:
+        if self._latency is None:
+            return super()._time(index)
+        return self._clocks[index]
+
+    def now(self, index: int) -> float:
+        if self._latency is None:
+            return super().now(index)
+        return self._clocks[index]
 
     def done(self, index: int):
-        time.sleep(
-            random.uniform(0.01, 0.1)
-        )  # try to obfuscate delays and emulate network delays
+        if self._latency is not None:
+            self._clocks[index] += self._latency.idle(index)
+        time.sleep(0)  # give the other threads a chance to run
         return
 
     def print_statistics(self):
@@ -88,8 +185,15 @@ class AsyncEmulator(EmulatorStub):
         print(
             f"\t{GREEN}Average{RESET} {self._messages_sent/len(self._devices)} messages/device"
         )
+        print(f"\t{GREEN}Copied{RESET} {self._bytes_copied} bytes")
+        if self._latency is not None:
+            print(f"\t{GREEN}Virtual time{RESET} {max(self._clocks):.3f} s")
+
+    def statistics(self) -> dict:
+        statistics = super().statistics()
+        if self._latency is not None:
+            statistics["virtual_time"] = max(self._clocks)
+        return statistics
 
     def terminated(self, index: int):
-        self._progress.acquire()
-        self._terminated += 1
-        self._progress.release()
+        return
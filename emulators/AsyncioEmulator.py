@@ -0,0 +1,389 @@
+import asyncio
+import inspect
+import threading
+import time
+import traceback
+from os import name
+from typing import Iterable, Optional
+
+from emulators.EmulatorStub import EmulatorStub
+from emulators.EventLog import MESSAGES, RECEIVE, SEND
+from emulators.Faults import DeviceCrashed
+from emulators.Medium import Medium
+from emulators.MessageStub import MessageStub
+from emulators.Schedule import take_where
+
+if name == "posix":
+    RESET = "\u001B[0m"
+    CYAN = "\u001B[36m"
+    GREEN = "\u001B[32m"
+else:
+    RESET = ""
+    CYAN = ""
+    GREEN = ""
+
+
+class AsyncioMedium(Medium):
+    """
+    Medium of the AsyncioEmulator.
+
+    Devices implementing ``async def run`` await ``send``, ``receive``, ``receive_all``, ``wait_for_next_round`` and
+    ``wait_for_message``. Devices with a regular ``run`` are executed in a worker thread, where the same methods block
+    until the event loop has carried out the operation, so existing devices work unchanged. Threaded devices polling
+    an empty mailbox or waiting for the next round do so in their own thread, without a round trip through the loop.
+    """
+
+    # empty polls in a row before a threaded device sleeps, a device draining its mailbox only sees a single one
+    idle_polls = 2
+
+    def __init__(self, index: int, emulator):
+        super().__init__(index, emulator)
+        self._empty_polls = 0
+
+    def send(self, message: MessageStub):
+        if self._checked:
+            self._check()
+        self._empty_polls = 0
+        return self._emulator.submit(self._emulator.queue(message))
+
+    def send_many(self, messages: Iterable[MessageStub]):
+        if self._checked:
+            self._check()
+        self._empty_polls = 0
+        return self._emulator.submit(self._emulator.queue_many(list(messages)))
+
+    def broadcast(
+        self,
+        message: MessageStub,
+        include_self: bool = False,
+        destinations: Optional[Iterable[int]] = None,
+    ):
+        if self._checked:
+            self._check()
+        self._empty_polls = 0
+        return self._emulator.submit(
+            self._emulator.broadcast(
+                message,
+                include_self,
+                None if destinations is None else list(destinations),
+            )
+        )
+
+    def receive(self, timeout: Optional[float] = None) -> Optional[MessageStub]:
+        if self._checked:
+            self._check()
+        if self._emulator.threaded():
+            self._empty_polls += 1
+            m = self._emulator.poll(
+                self._id, timeout, self._empty_polls >= self.idle_polls
+            )
+            if m is not None:
+                self._empty_polls = 0
+            return m
+        return self._emulator.dequeue(self._id, timeout)
+
+    def receive_all(self) -> list[MessageStub]:
+        if self._checked:
+            self._check()
+        if self._emulator.threaded():
+            self._empty_polls += 1
+            if self._empty_polls >= self.idle_polls:
+                self._emulator.wait_for_mail(self._id)
+            messages = self._emulator.submit(self._emulator.drain(self._id))
+            if len(messages) > 0:
+                self._empty_polls = 0
+            return messages
+        return self._emulator.drain(self._id)
+
+    def wait_for_next_round(self):
+        if self._checked:
+            self._check()
+        if self._emulator.threaded():
+            # there are no rounds, only the other threads have to get a chance to run
+            time.sleep(0)
+            return None
+        return self._emulator.done(self._id)
+
+    def wait_for_message(self, rounds: Optional[int] = None) -> bool:
+        if self._checked:
+            self._check()
+        if self._emulator.threaded():
+            self._emulator.wait_for_mail(self._id)
+            return True
+        return self._emulator.idle(self._id, rounds)
+
+
+class AsyncioEmulator(EmulatorStub):
+    _medium_type = AsyncioMedium
+    _runs_coroutines = True
+    # seconds a threaded device polling an empty mailbox sleeps at most, spinning threads would starve the loop
+    poll_interval = 0.01
+
+    def __init__(self, number_of_devices: int, kind, **kwargs):
+        super().__init__(number_of_devices, kind, **kwargs)
+        self._messages: dict[int, list[MessageStub]] = {index: [] for index in self.ids}
+        self._messages_sent = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        # devices waiting in receive with a timeout, woken up by the next message delivered to them
+        self._arrived: dict[int, asyncio.Event] = {}
+        # set when a message is delivered to a threaded device sleeping in wait_for_mail
+        self._mail: dict[int, threading.Event] = {}
+        self._napping: set[int] = set()
+
+    def submit(self, coroutine):
+        # coroutines are handed to async devices, threaded devices wait for the loop to run them
+        if threading.get_ident() == self._loop_thread:
+            return coroutine
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def threaded(self) -> bool:
+        """
+        Returns:
+            bool: True if the caller is a device running in a thread of its own, rather than a coroutine.
+        """
+        return threading.get_ident() != self._loop_thread
+
+    def poll(
+        self, index: int, timeout: Optional[float] = None, idle: bool = False
+    ) -> Optional[MessageStub]:
+        """
+        Receive a message for a threaded device, see ``AsyncioMedium.receive``.
+
+        Args:
+            index (int): The receiving device.
+            timeout (Optional[float]): Seconds to wait for a message, by default the device does not wait.
+            idle (bool): Whether the device did nothing but poll lately, it then sleeps until a message arrives or
+                ``poll_interval`` has passed instead of spinning.
+        """
+        if timeout is not None and self._turns is not None:
+            # wait without the turn, a replay finds the message there when the device gets the turn back
+            self._turns.give(index)
+            if not self._turns.replaying:
+                self.submit(self._wait(index, timeout))
+            self._turns.take(index)
+            timeout = None
+        if timeout is None and len(self._messages[index]) == 0:
+            # only the loop adds messages, and an empty mailbox does not need it to stay empty
+            if self._turns is not None:
+                # the other devices take their turns instead
+                time.sleep(0)
+                return None
+            if idle:
+                self.wait_for_mail(index)
+            else:
+                time.sleep(0)
+            if len(self._messages[index]) == 0:
+                return None
+        return self.submit(self.dequeue(index, timeout))
+
+    def wait_for_mail(self, index: int):
+        """
+        Let a threaded device sleep until a message is delivered to it or ``poll_interval`` has passed.
+
+        Args:
+            index (int): The waiting device.
+        """
+        if self._turns is not None:
+            # the other devices take their turns instead
+            time.sleep(0)
+            return
+        mail = self._mail[index]
+        mail.clear()
+        # announced before looking at the mailbox, a message delivered after the look finds the device napping
+        self._napping.add(index)
+        if len(self._messages[index]) == 0:
+            mail.wait(self.poll_interval)
+        self._napping.discard(index)
+
+    def run(self):
+        asyncio.run(self._main())
+        self._log.close()
+
+    async def _main(self):
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        order = list(self.ids)
+        self._rng.shuffle(order)
+        threaded = {
+            index
+            for index in order
+            if not inspect.iscoroutinefunction(self._devices[index].run)
+        }
+        self._mail = {index: threading.Event() for index in threaded}
+        print("Starting Devices")
+        pending = []
+        for index in order:
+            if index in threaded:
+                # plain threads, an executor refuses work once the main thread has exited
+                returned = self._loop.create_future()
+                threading.Thread(
+                    target=self._run_thread, args=[index, returned]
+                ).start()
+                pending.append(returned)
+            else:
+                pending.append(asyncio.create_task(self._run_task(index)))
+        await asyncio.gather(*pending)
+
+    async def _run_task(self, index: int):
+        try:
+            await self._devices[index].run()
+        except DeviceCrashed:
+            pass
+        except Exception:
+            traceback.print_exc()
+        finally:
+            self._device_returned()
+
+    def _run_thread(self, index: int, returned: asyncio.Future):
+        if self._turns is not None:
+            self._turns.take(index)
+        try:
+            self._devices[index].run()
+        except DeviceCrashed:
+            pass
+        except Exception:
+            traceback.print_exc()
+        finally:
+            self._device_returned()
+            if self._turns is not None:
+                self._turns.finish(index)
+            self._loop.call_soon_threadsafe(returned.set_result, None)
+
+    def _take(self, index: int) -> Optional[MessageStub]:
+        mailbox = self._messages[index]
+        if len(mailbox) == 0:
+            return None
+        if self._forced:
+            expected = self._delivery_schedule.expected(index)
+            m = None if expected is None else take_where(mailbox, expected)
+            if m is None:
+                return None
+            self._delivery_schedule.advance(index)
+        else:
+            # pick a random message to emulate changes in order
+            nxt = self._rng.randrange(len(mailbox))
+            mailbox[nxt], mailbox[-1] = mailbox[-1], mailbox[nxt]
+            m = mailbox.pop()
+        if self._log.level >= MESSAGES:
+            self._log.record(RECEIVE, m)
+        if self._recording:
+            self._delivery_schedule.delivered(index, m)
+        if self._metrics is not None:
+            self._metrics.message_received(index, m, self._time(index))
+        return m
+
+    async def queue(self, message: MessageStub):
+        if not self._exists(message):
+            return
+        if self._faults is not None:
+            return await self.queue_many([message])
+        self._messages_sent += 1
+        m = self._copy(message)
+        if self._log.level >= MESSAGES:
+            self._log.record(SEND, m)
+        if self._metrics is not None:
+            self._metrics.message_sent(m, self._time(m.source))
+        self._deliver(m)
+        await asyncio.sleep(0)
+
+    async def queue_many(self, messages: list[MessageStub]):
+        self._append_all(self._copy_many(messages))
+        await asyncio.sleep(0)
+
+    async def broadcast(
+        self,
+        message: MessageStub,
+        include_self: bool = False,
+        destinations: Optional[list[int]] = None,
+    ):
+        self._append_all(self._copy_broadcast(message, include_self, destinations))
+        await asyncio.sleep(0)
+
+    def _append_all(self, messages: list[MessageStub]):
+        self._messages_sent += len(messages)
+        for m in messages:
+            self._deliver(m)
+
+    def _deliver(self, m: MessageStub):
+        self._messages[m.destination].append(m)
+        if m.destination in self._arrived:
+            self._arrived[m.destination].set()
+        if m.destination in self._napping:
+            self._mail[m.destination].set()
+
+    async def dequeue(
+        self, index: int, timeout: Optional[float] = None
+    ) -> Optional[MessageStub]:
+        m = self._take(index)
+        if m is None and timeout is not None:
+            deadline = self._loop.time() + timeout
+            # a replay may have to leave the messages already there to others
+            while m is None and await self._arrival(
+                index, deadline - self._loop.time()
+            ):
+                m = self._take(index)
+        if m is None:
+            # give the other devices a chance to send something
+            await asyncio.sleep(0)
+        return m
+
+    async def _wait(self, index: int, timeout: float):
+        if len(self._messages[index]) == 0:
+            await self._arrival(index, timeout)
+
+    async def _arrival(self, index: int, timeout: float) -> bool:
+        # returns False if no message was delivered in time
+        if timeout <= 0:
+            return False
+        arrived = self._arrived[index] = asyncio.Event()
+        try:
+            await asyncio.wait_for(arrived.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            del self._arrived[index]
+
+    async def drain(self, index: int) -> list[MessageStub]:
+        if self._forced:
+            messages = []
+            while True:
+                m = self._take(index)
+                if m is None:
+                    break
+                messages.append(m)
+            await asyncio.sleep(0)
+            return messages
+        messages = self._messages[index]
+        self._messages[index] = []
+        self._rng.shuffle(messages)
+        if self._log.level >= MESSAGES:
+            for m in messages:
+                self._log.record(RECEIVE, m)
+        if self._recording:
+            for m in messages:
+                self._delivery_schedule.delivered(index, m)
+        if self._metrics is not None:
+            now = self._time(index)
+            for m in messages:
+                self._metrics.message_received(index, m, now)
+        await asyncio.sleep(0)
+        return messages
+
+    async def done(self, index: int):
+        await asyncio.sleep(0)
+
+    async def idle(self, index: int, rounds: Optional[int] = None) -> bool:
+        await self.done(index)
+        return True
+
+    def print_statistics(self):
+        print(f"\t{GREEN}Total{RESET} {self._messages_sent} messages")
+        print(
+            f"\t{GREEN}Average{RESET} {self._messages_sent/len(self._devices)} messages/device"
+        )
+        print(f"\t{GREEN}Copied{RESET} {self._bytes_copied} bytes")
+
+    def terminated(self, index: int):
+        return
@@ -0,0 +1,97 @@
+import re
+from typing import Optional
+
+from emulators.MessageStub import MessageStub
+
+
+class Breakpoint:
+    """
+    Stops a stepping emulator running at full speed when a message matching it is sent or received.
+
+    A breakpoint is written as ``[CLASS] [from SOURCE] [to DESTINATION] [round ROUND] [if EXPRESSION]``, every part
+    being optional: ``Vote to 3`` stops at the first ``Vote`` message to device 3, ``round 5`` at the first message of
+    round 5 or later, and ``if device.leader is not None`` at the first message of a device that knows a leader. The
+    expression is Python and can use ``message``, ``device`` (the device sending or receiving the message), ``round``
+    and ``devices`` (all devices).
+
+    The parts are compiled once into a single function, so checking a breakpoint on every message costs a call.
+
+    Attributes:
+        text (str): The breakpoint as it was written.
+        once (bool): Whether the breakpoint is removed after stopping the emulator once.
+        rounds (bool): Whether the breakpoint depends on the round, which only the synchronous network counts.
+    """
+
+    def __init__(self, text: str, once: bool = False):
+        self.text = text
+        self.once = once
+        self.rounds = False
+        words = text.split()
+        conditions = []
+        i = 0
+        while i < len(words):
+            word = words[i]
+            if word == "if":
+                expression = " ".join(words[i + 1 :])
+                if expression == "":
+                    raise ValueError(f'Missing condition after "if" in "{text}"')
+                conditions.append(f"({expression})")
+                self.rounds = (
+                    self.rounds or re.search(r"\bround\b", expression) is not None
+                )
+                break
+            if word in ["from", "to", "round"]:
+                if i + 1 == len(words) or not words[i + 1].isdigit():
+                    raise ValueError(f'Expected a number after "{word}" in "{text}"')
+                number = int(words[i + 1])
+                self.rounds = self.rounds or word == "round"
+                conditions.append(
+                    {
+                        "from": f"message.source == {number}",
+                        "to": f"message.destination == {number}",
+                        "round": f"round >= {number}",
+                    }[word]
+                )
+                i += 2
+                continue
+            if not word.isidentifier():
+                raise ValueError(f'Unknown part "{word}" in "{text}"')
+            conditions.append(f"type(message).__name__ == {word!r}")
+            i += 1
+        source = " and ".join(conditions) or "True"
+        # raises a SyntaxError for a broken expression now, instead of on the first message
+        self._predicate = eval(
+            compile(
+                f"lambda message, device, round, devices: {source}",
+                "<breakpoint>",
+                "eval",
+            ),
+            {},
+        )
+
+    def fires(self, message: MessageStub, device, round: int, devices: list) -> bool:
+        """
+        Returns:
+            bool: True if the emulator should stop, also if the expression raised an exception.
+        """
+        try:
+            return bool(self._predicate(message, device, round, devices))
+        except Exception as e:
+            print(f'Breakpoint "{self.text}" failed: {e!r}')
+            return True
+
+    def __str__(self):
+        return self.text
+
+
+def first_hit(
+    breakpoints: list[Breakpoint],
+    message: MessageStub,
+    device,
+    round: int,
+    devices: list,
+) -> Optional[Breakpoint]:
+    for breakpoint in breakpoints:
+        if breakpoint.fires(message, device, round, devices):
+            return breakpoint
+    return None
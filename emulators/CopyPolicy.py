@@ -0,0 +1,82 @@
+import copy
+import pickle
+import sys
+
+from emulators.MessageStub import MessageStub
+
+
+class CopyPolicy:
+    """
+    Decides how a message is copied when it is sent, so sender and receiver do not accidentally share memory.
+
+    The policy of an emulator applies to every message, unless the class of the message sets ``copy_policy``.
+    """
+
+    def copy(self, message: MessageStub) -> tuple[MessageStub, int]:
+        """
+        Copy a message that is about to be sent.
+
+        Args:
+            message (MessageStub): The message handed to the medium by the sender.
+
+        Returns:
+            tuple[MessageStub, int]: The message to deliver and the number of bytes copied.
+        """
+        raise NotImplementedError("You have to implement a copy policy!")
+
+
+class DeepCopy(CopyPolicy):
+    """
+    Deliver an independent copy of the message, the default.
+
+    Messages are copied by pickling them, which is faster than ``copy.deepcopy`` and tells how many bytes were
+    copied. Messages that cannot be pickled fall back to ``copy.deepcopy`` and count as their shallow size.
+    """
+
+    def copy(self, message: MessageStub) -> tuple[MessageStub, int]:
+        try:
+            data = pickle.dumps(message, pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            return copy.deepcopy(message), _shallow_size(message)
+        return pickle.loads(data), len(data)
+
+
+class FreezeOnSend(CopyPolicy):
+    """
+    Deliver the message itself and make it immutable.
+
+    Nothing is copied, any attempt to assign to an attribute of the message after it was sent raises an error. The
+    contents of lists and dictionaries referenced by the message must not be changed either.
+    """
+
+    def copy(self, message: MessageStub) -> tuple[MessageStub, int]:
+        message.freeze()
+        return message, 0
+
+
+class CopyOnWrite(CopyPolicy):
+    """
+    Deliver a shallow copy of the message.
+
+    The receiver gets its own message object sharing the attribute values of the sent one, so assigning an attribute
+    on either side is not seen by the other. Lists and dictionaries referenced by the message are shared and have to be
+    replaced rather than changed in place.
+    """
+
+    def copy(self, message: MessageStub) -> tuple[MessageStub, int]:
+        clone = message.clone()
+        return clone, _shallow_size(clone)
+
+
+def _shallow_size(message: MessageStub) -> int:
+    size = sys.getsizeof(message)
+    if hasattr(message, "__dict__"):
+        size += sys.getsizeof(message.__dict__)
+    return size
+
+
+DEEP_COPY = DeepCopy()
+FREEZE_ON_SEND = FreezeOnSend()
+COPY_ON_WRITE = CopyOnWrite()
+
+POLICIES = {"deep": DEEP_COPY, "freeze": FREEZE_ON_SEND, "cow": COPY_ON_WRITE}
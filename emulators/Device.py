@@ -69,6 +69,16 @@ class Device:
         """
         return self._medium
 
+    @property
+    def context(self):
+        """
+        Get the state shared by the devices of this run, see RunContext.
+
+        Returns:
+            RunContext: The context of the run.
+        """
+        return self._medium.context
+
 
 class WorkerDevice(Device):
     _concurrent_workers = 0
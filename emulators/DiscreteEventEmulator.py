@@ -0,0 +1,304 @@
+import heapq
+import threading
+import traceback
+from collections import deque
+from functools import partial
+from os import name
+from typing import Optional
+
+from emulators.EmulatorStub import EmulatorStub
+from emulators.EventLog import MESSAGES, RECEIVE, SEND
+from emulators.Latency import DEFAULT_LATENCY, LatencyModel
+from emulators.MessageStub import MessageStub
+from emulators.Schedule import take_where
+
+try:
+    import greenlet
+except ImportError:  # fall back to parking one thread per device
+    greenlet = None
+
+if name == "posix":
+    RESET = "\u001B[0m"
+    CYAN = "\u001B[36m"
+    GREEN = "\u001B[32m"
+else:
+    RESET = ""
+    CYAN = ""
+    GREEN = ""
+
+
+class DiscreteEventEmulator(EmulatorStub):
+    """
+    Asynchronous emulator driven by a single event queue ordered on virtual time.
+
+    Exactly one device runs at any moment. A device gives up control by calling ``wait_for_next_round``, by polling
+    an empty mailbox or by returning, after which the next event is popped from the queue. A device polling an empty
+    mailbox is parked until a message is delivered to it or the idle time of the latency model has passed. When
+    ``greenlet`` is installed every device is a greenlet inside the thread calling ``run``; otherwise each device gets
+    a small-stack thread and control is handed directly from thread to thread. Either way no lock is contended and no
+    time is spent sleeping, so the cost of a run is proportional to the number of events it generates.
+    """
+
+    _DELIVER = 0
+    _RESUME = 1
+    # a single device runs at a time
+    _takes_turns = False
+
+    stack_size = 256 * 1024
+
+    def __init__(
+        self,
+        number_of_devices: int,
+        kind,
+        latency: Optional[LatencyModel] = DEFAULT_LATENCY,
+        **kwargs,
+    ):
+        super().__init__(number_of_devices, kind, **kwargs)
+        if self._topology is not None:
+            # the links of the topology have delays of their own
+            latency = self._topology
+        # replays draw the delays as well, so the devices draw the same random numbers as in the recorded run
+        self._latency = latency
+        if self._delivery_schedule is not None and not self._forced:
+            # nothing happens in parallel, so the seed alone repeats a run
+            self._delivery_schedule.turns = []
+        self._now = 0.0
+        self._events: list[tuple[float, int, int, object]] = []
+        self._sequence = 0
+        self._messages: dict[int, deque[MessageStub]] = {
+            index: deque() for index in self.ids
+        }
+        self._messages_sent = 0
+        self._events_processed = 0
+        # the sequence number of the one RESUME event of each device that counts, earlier ones were superseded
+        self._resumes = [0 for _ in self.ids]
+        # devices polling an empty mailbox, resumed by the next message delivered to them
+        self._parked: set[int] = set()
+        # greenlet mode
+        self._hub = None
+        self._greenlets = []
+        # thread mode
+        self._resume = [threading.Lock() for _ in self.ids]
+        self._finished = threading.Lock()
+
+    def _schedule(self, time: float, kind: int, payload):
+        self._sequence += 1
+        if kind == self._RESUME:
+            self._resumes[payload] = self._sequence
+        heapq.heappush(self._events, (time, self._sequence, kind, payload))
+
+    def _dispatch(self) -> Optional[int]:
+        # process events until a device has to be resumed, returns None once the queue is exhausted
+        events = self._events
+        while True:
+            if not events:
+                if len(self._parked) == 0:
+                    return None
+                # nothing will ever be delivered, let the parked devices find out for themselves
+                for index in sorted(self._parked):
+                    self._schedule(self._now, self._RESUME, index)
+                self._parked.clear()
+            time, sequence, kind, payload = heapq.heappop(events)
+            if kind == self._RESUME and self._resumes[payload] != sequence:
+                # the device was woken up by a delivery before it timed out
+                continue
+            self._now = time
+            self._events_processed += 1
+            if kind == self._DELIVER:
+                destination = payload.destination
+                self._messages[destination].append(payload)
+                if destination in self._parked:
+                    self._parked.discard(destination)
+                    self._schedule(time, self._RESUME, destination)
+            else:
+                self._parked.discard(payload)
+                return payload
+
+    def _park(self, index: int):
+        # resuming at the same instant would let a device polling in a loop starve the deliveries it waits for
+        self._parked.add(index)
+        if self._latency is None:
+            self._suspend(index, None)
+        else:
+            self._suspend(index, self._latency.idle(index))
+
+    def _suspend(self, index: int, delay: Optional[float]):
+        if delay is not None:
+            self._schedule(self._now + delay, self._RESUME, index)
+        if self._hub is not None:
+            self._hub.switch()
+            return
+        # the suspending thread runs the scheduler itself and passes control directly to the next device
+        nxt = self._dispatch()
+        if nxt == index:
+            return
+        self._hand_over(nxt)
+        self._resume[index].acquire()
+
+    def run(self):
+        order = list(self.ids)
+        self._rng.shuffle(order)
+        for index in order:
+            self._schedule(0.0, self._RESUME, index)
+
+        if greenlet is not None:
+            self._run_greenlets()
+        else:
+            self._run_threads()
+        self._log.close()
+
+    def _run_greenlets(self):
+        self._hub = greenlet.getcurrent()
+        self._greenlets = [
+            greenlet.greenlet(partial(self._run_greenlet, index)) for index in self.ids
+        ]
+        print("Starting Devices")
+        while True:
+            nxt = self._dispatch()
+            if nxt is None:
+                break
+            self._greenlets[nxt].switch()
+        self._hub = None
+
+    def _run_greenlet(self, index: int):
+        try:
+            super()._run_thread(index)
+        except Exception:
+            traceback.print_exc()
+
+    def _run_threads(self):
+        for index in self.ids:
+            self._resume[index].acquire()
+        self._finished.acquire()
+        previous = threading.stack_size(self.stack_size)
+        try:
+            self._start_threads()
+        finally:
+            threading.stack_size(previous)
+
+        self._hand_over(self._dispatch())
+        self._finished.acquire()
+        for t in self._threads:
+            t.join()
+
+    def _hand_over(self, nxt: Optional[int]):
+        if nxt is None:
+            self._finished.release()
+        else:
+            self._resume[nxt].release()
+
+    def _run_thread(self, index: int):
+        self._resume[index].acquire()
+        try:
+            super()._run_thread(index)
+        finally:
+            self._hand_over(self._dispatch())
+
+    def queue(self, message: MessageStub):
+        if not self._exists(message):
+            return
+        if self._faults is not None:
+            return self.queue_many([message])
+        self._messages_sent += 1
+        m = self._copy(message)
+        if self._log.level >= MESSAGES:
+            self._log.record(SEND, m)
+        if self._metrics is not None:
+            self._metrics.message_sent(m, self._now)
+        self._schedule(self._arrival(m), self._DELIVER, m)
+
+    def queue_many(self, messages: list[MessageStub]):
+        self._schedule_all(self._copy_many(messages))
+
+    def broadcast(
+        self,
+        message: MessageStub,
+        include_self: bool = False,
+        destinations: Optional[list[int]] = None,
+    ):
+        self._schedule_all(self._copy_broadcast(message, include_self, destinations))
+
+    def _schedule_all(self, messages: list[MessageStub]):
+        self._messages_sent += len(messages)
+        for m in messages:
+            self._schedule(self._arrival(m), self._DELIVER, m)
+
+    def dequeue(
+        self, index: int, timeout: Optional[float] = None
+    ) -> Optional[MessageStub]:
+        mailbox = self._messages[index]
+        m = None
+        if self._forced:
+            expected = self._delivery_schedule.expected(index)
+            if expected is not None:
+                m = take_where(mailbox, expected)
+                if m is not None:
+                    self._delivery_schedule.advance(index)
+        elif len(mailbox) > 0:
+            m = mailbox.popleft()
+        if m is None:
+            # let the others run, a polling device would otherwise never give up control
+            self._park(index)
+            return None
+        if self._log.level >= MESSAGES:
+            self._log.record(RECEIVE, m)
+        if self._recording:
+            self._delivery_schedule.delivered(index, m)
+        if self._metrics is not None:
+            self._metrics.message_received(index, m, self._now)
+        return m
+
+    def drain(self, index: int) -> list[MessageStub]:
+        if self._forced:
+            return EmulatorStub.drain(self, index)
+        mailbox = self._messages[index]
+        if len(mailbox) == 0:
+            self._park(index)
+            return []
+        messages = list(mailbox)
+        mailbox.clear()
+        if self._log.level >= MESSAGES:
+            for m in messages:
+                self._log.record(RECEIVE, m)
+        if self._recording:
+            for m in messages:
+                self._delivery_schedule.delivered(index, m)
+        if self._metrics is not None:
+            for m in messages:
+                self._metrics.message_received(index, m, self._now)
+        return messages
+
+    def _time(self, index: int) -> float:
+        return self._now
+
+    def now(self, index: int) -> float:
+        return self._now
+
+    def _arrival(self, m: MessageStub) -> float:
+        # without a latency model messages arrive instantly, in the order they were sent
+        if self._latency is None:
+            return self._now
+        return self._latency.arrival(m, self._now)
+
+    def done(self, index: int):
+        self._suspend(
+            index, 0.0 if self._latency is None else self._latency.idle(index)
+        )
+
+    def print_statistics(self):
+        print(f"\t{GREEN}Total{RESET} {self._messages_sent} messages")
+        print(
+            f"\t{GREEN}Average{RESET} {self._messages_sent/len(self._devices)} messages/device"
+        )
+        print(f"\t{GREEN}Copied{RESET} {self._bytes_copied} bytes")
+        print(f"\t{GREEN}Total{RESET} {self._events_processed} events")
+        print(f"\t{GREEN}Virtual time{RESET} {self._now:.3f} s")
+
+    def statistics(self) -> dict:
+        statistics = super().statistics()
+        statistics["events"] = self._events_processed
+        statistics["virtual_time"] = self._now
+        return statistics
+
+    def terminated(self, index: int):
+        return
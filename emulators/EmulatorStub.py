@@ -1,51 +1,302 @@
+import inspect
 import random
+import sys
 import threading
+import time
+from typing import NamedTuple, Optional
 
+from emulators.CopyPolicy import DEEP_COPY, CopyPolicy
+from emulators.EventLog import BROADCAST, DROP, MESSAGES, SEND, EventLog
+from emulators.Faults import DeviceCrashed, FaultModel
 from emulators.Medium import Medium
 from emulators.MessageStub import MessageStub
+from emulators.Metrics import Metrics
+from emulators.RunContext import RunContext
+from emulators.Schedule import Schedule, Turns
+from emulators.Topology import Topology
+
+
+class Progress(NamedTuple):
+    devices: int
+    running: int
+    messages_sent: int
+    rounds: int
 
 
 class EmulatorStub:
-    def __init__(self, number_of_devices: int, kind):
+    _medium_type = Medium
+    _context_type = RunContext
+    _messages_sent = 0
+    _rounds = 0
+    _bytes_copied = 0
+    # devices run in threads of their own and take turns while a schedule is recorded or replayed, see Turns
+    _takes_turns = True
+    # devices implementing run as a coroutine are awaited, see AsyncioEmulator
+    _runs_coroutines = False
+
+    def __init__(
+        self,
+        number_of_devices: int,
+        kind,
+        copy_policy: CopyPolicy = DEEP_COPY,
+        log: Optional[EventLog] = None,
+        seed: Optional[int] = None,
+        schedule: Optional[Schedule] = None,
+        metrics: Optional[Metrics] = None,
+        topology: Optional[Topology] = None,
+        faults: Optional[FaultModel] = None,
+    ):
+        if not self._runs_coroutines and inspect.iscoroutinefunction(
+            getattr(kind, "run", None)
+        ):
+            raise TypeError(
+                f"{kind.__name__}.run is a coroutine, only the asyncio network type can run it"
+            )
         self._nids = number_of_devices
         self._devices = []
         self._threads = []
         self._media = []
-        self._progress = threading.Lock()
+        self._metrics = metrics
+        self._topology = topology
+        self._faults = faults
+        self._started = time.perf_counter()
+        self._progress = (
+            threading.Lock() if metrics is None else metrics.timed_lock("progress")
+        )
+        self._running_lock = threading.Lock()
+        self._all_returned = threading.Event()
+        self._copy_policy = copy_policy
+        self._copy_lock = threading.Lock()
+        # sends, receives and rounds are recorded here instead of printed by the emulators
+        self._log = log if log is not None else EventLog()
+        # the emulator draws from its own generator when seeded, so devices using random do not change its choices
+        self._seed = seed
+        self._rng = random.Random(seed) if seed is not None else random
+        self._delivery_schedule = schedule
+        # a replay records its deliveries as well, to compare them to the recorded ones
+        self._recording = schedule is not None
+        self._forced = schedule is not None and schedule.forced
+        # messages are stamped to tell them apart in a schedule and in the metrics, see sequence_key
+        self._sent_by = (
+            [0 for _ in self.ids]
+            if schedule is not None or metrics is not None
+            else None
+        )
+        # the unknown destinations messages were dropped for, each of them is reported once
+        self._unknown_destinations: set[str] = set()
+        self._turns = None
+        if schedule is not None and self._takes_turns and not self._forced:
+            self._turns = Turns(number_of_devices, schedule.turns)
+            schedule.turns = self._turns.order
+        # state the devices of this run share, so nothing carries over to the next run in the same process
+        self._context = self._context_type(number_of_devices, seed)
 
         for index in self.ids:
-            self._media.append(Medium(index, self))
+            if not self._hosts(index):
+                # the device runs elsewhere, see the ShardedEmulator
+                self._media.append(None)
+                self._devices.append(None)
+                continue
+            self._media.append(self._medium_type(index, self))
             self._devices.append(kind(index, number_of_devices, self._media[-1]))
             self._threads.append(
                 threading.Thread(target=self._run_thread, args=[index])
             )
+        # termination is counted as devices return, so nobody has to poll the threads
+        self._running = len(self._threads)
+        if self._running == 0:
+            self._all_returned.set()
+
+    def _hosts(self, index: int) -> bool:
+        return True
 
     def _run_thread(self, index: int):
-        self._devices[index].run()
+        if self._turns is not None:
+            self._turns.take(index)
         try:
+            self._devices[index].run()
+        except DeviceCrashed:
+            # the device crashed for good, see FaultModel
+            pass
+        finally:
+            self._device_returned()
             self.terminated(index)
-        except Exception:
-            self.terminated(index)
-            raise
+            if self._turns is not None:
+                self._turns.finish(index)
+
+    def _device_returned(self):
+        with self._running_lock:
+            self._running -= 1
+            if self._running == 0:
+                if self._metrics is not None:
+                    self._metrics.finished()
+                self._all_returned.set()
+
+    def _copy(self, message: MessageStub, routed: bool = True) -> MessageStub:
+        if routed and self._topology is not None:
+            self._topology.check(message.source, message.destination)
+        # avoid accidental memory sharing, as cheaply as the policy of the message allows
+        policy = message.copy_policy or self._copy_policy
+        m, size = policy.copy(message)
+        if size:
+            with self._copy_lock:
+                self._bytes_copied += size
+        if self._sent_by is not None:
+            self._stamp(m)
+        return m
+
+    def _stamp(self, m: MessageStub):
+        # identifies the message in a schedule, only the thread of the sender counts its messages
+        self._sent_by[m.source] += 1
+        object.__setattr__(m, "_sequence", self._sent_by[m.source])
+
+    def _exists(self, message: MessageStub, destination=None) -> bool:
+        # messages to devices that do not exist never arrive, the way they were left in the mailboxes of nobody before
+        if destination is None:
+            destination = message.destination
+        if isinstance(destination, int) and 0 <= destination < self._nids:
+            return True
+        if self._log.level >= MESSAGES:
+            self._log.record(DROP, message, repr(destination))
+        if repr(destination) not in self._unknown_destinations:
+            self._unknown_destinations.add(repr(destination))
+            print(
+                f"Dropping {type(message).__name__} from device {message.source} to unknown device {destination!r}, "
+                f"there are devices 0 to {self._nids - 1}",
+                file=sys.stderr,
+            )
+        return False
+
+    def _copy_many(self, messages: list[MessageStub]) -> list[MessageStub]:
+        copies = [self._copy(message) for message in messages if self._exists(message)]
+        if self._faults is not None:
+            copies = self._inject(copies)
+        if self._log.level >= MESSAGES:
+            for m in copies:
+                self._log.record(SEND, m)
+        if self._metrics is not None:
+            for m in copies:
+                self._metrics.message_sent(m, self._time(m.source))
+        return copies
+
+    def _copy_broadcast(
+        self,
+        message: MessageStub,
+        include_self: bool,
+        destinations: Optional[list[int]],
+    ) -> list[MessageStub]:
+        # one copy is shared by every receiver, so it must not change anymore
+        shared = self._copy(message, routed=False)
+        shared.freeze()
+        envelopes = self._envelopes(shared, include_self, destinations)
+        if self._sent_by is not None:
+            for envelope in envelopes:
+                self._stamp(envelope)
+        if self._faults is not None:
+            envelopes = self._inject(envelopes)
+        if self._log.level >= MESSAGES:
+            self._log.record(BROADCAST, shared, len(envelopes))
+        if self._metrics is not None:
+            for envelope in envelopes:
+                self._metrics.message_sent(envelope, self._time(envelope.source))
+        return envelopes
+
+    def _envelopes(
+        self,
+        message: MessageStub,
+        include_self: bool,
+        destinations: Optional[list[int]],
+    ) -> list[MessageStub]:
+        if destinations is None:
+            if self._topology is not None:
+                destinations = self._topology.neighbours(message.source)
+                if include_self:
+                    destinations.append(message.source)
+            else:
+                destinations = [
+                    index
+                    for index in self.ids
+                    if include_self or index != message.source
+                ]
+        else:
+            destinations = [d for d in destinations if self._exists(message, d)]
+            if self._topology is not None:
+                for destination in destinations:
+                    self._topology.check(message.source, destination)
+        return [message.readdressed(destination) for destination in destinations]
+
+    def _inject(self, messages: list[MessageStub]) -> list[MessageStub]:
+        # lost messages are never logged nor counted as sent, duplicates are delivered as separate copies
+        delivered = []
+        for m in messages:
+            deliveries = self._faults.deliveries(
+                m.source, m.destination, self.now(m.source)
+            )
+            if deliveries > 0:
+                delivered.append(m)
+            if deliveries > 1:
+                if m.frozen:
+                    duplicate = m.readdressed(m.destination)
+                    if self._sent_by is not None:
+                        self._stamp(duplicate)
+                else:
+                    duplicate = self._copy(m, routed=False)
+                delivered.append(duplicate)
+        return delivered
+
+    def now(self, index: int) -> float:
+        """
+        The time of a device that faults are scheduled in, seconds since the emulator was created unless the network
+        keeps time of its own.
+        """
+        return time.perf_counter() - self._started
+
+    def _time(self, index: int) -> float:
+        # the time of a device reported to the metrics, emulators keeping virtual time override this
+        return time.perf_counter()
 
     def _start_threads(self):
         cpy = self._threads.copy()
-        random.shuffle(cpy)
+        self._rng.shuffle(cpy)
         print("Starting Threads")
         for thread in cpy:
             thread.start()
 
     @property
     def all_terminated(self) -> bool:
-        return all([not self._threads[x].is_alive() for x in self.ids])
+        return self._all_returned.is_set()
+
+    def wait_for_termination(self, timeout: Optional[float] = None) -> bool:
+        return self._all_returned.wait(timeout)
+
+    def progress(self) -> Progress:
+        # plain reads of counters that are only ever replaced, safe to call from any thread without locking
+        return Progress(self._nids, self._running, self._messages_sent, self._rounds)
 
     @property
     def ids(self):
         return range(0, self._nids)
 
+    @property
+    def context(self) -> RunContext:
+        return self._context
+
+    @property
+    def topology(self) -> Optional[Topology]:
+        return self._topology
+
+    @property
+    def faults(self) -> Optional[FaultModel]:
+        return self._faults
+
+    @property
+    def turns(self) -> Optional[Turns]:
+        return self._turns
+
     def print_result(self):
         for d in self._devices:
-            d.print_result()
+            if d is not None:
+                d.print_result()
 
     def run(self):
         raise NotImplementedError("Please contact the instructor")
@@ -53,14 +304,61 @@ class EmulatorStub:
     def queue(self, message: MessageStub):
         raise NotImplementedError("Please contact the instructor")
 
+    def queue_many(self, messages: list[MessageStub]):
+        # emulators with a cheaper way of sending many messages override this
+        for message in messages:
+            self.queue(message)
+
+    def broadcast(
+        self,
+        message: MessageStub,
+        include_self: bool = False,
+        destinations: Optional[list[int]] = None,
+    ):
+        for envelope in self._envelopes(message, include_self, destinations):
+            # receivers get the same guarantees as from the shared copy of the emulators overriding this
+            envelope.freeze()
+            self.queue(envelope)
+
     def dequeue(self, id) -> MessageStub:
         raise NotImplementedError("Please contact the instructor")
 
+    def drain(self, index: int) -> list[MessageStub]:
+        # emulators able to empty a mailbox in one go override this
+        messages = []
+        while True:
+            message = self.dequeue(index)
+            if message is None:
+                return messages
+            messages.append(message)
+
     def done(self, id):
         raise NotImplementedError("Please contact the instructor")
 
+    def idle(self, index: int, rounds: Optional[int] = None) -> bool:
+        # emulators without rounds to skip wait a single round, the device checks its mailbox afterwards anyway
+        self.done(index)
+        return True
+
     def print_statistics(self):
         raise NotImplementedError("Please contact the instructor")
 
+    def statistics(self) -> dict:
+        """
+        The numbers printed by ``print_statistics``, for programs running many emulations.
+
+        Returns:
+            dict: ``messages``, ``rounds`` and ``bytes_copied``, extended by the emulators, and the counts of the fault
+                model if there is one.
+        """
+        statistics = {
+            "messages": self._messages_sent,
+            "rounds": self._rounds,
+            "bytes_copied": self._bytes_copied,
+        }
+        if self._faults is not None:
+            statistics.update(self._faults.statistics())
+        return statistics
+
     def terminated(self, index: int):
         raise NotImplementedError("Please contact the instructor")
@@ -0,0 +1,358 @@
+import json
+import struct
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from os import name
+from typing import Any, BinaryIO, Iterator, NamedTuple, Optional, TextIO
+
+if name == "posix":
+    RESET = "\u001B[0m"
+    CYAN = "\u001B[36m"
+    GREEN = "\u001B[32m"
+else:
+    RESET = ""
+    CYAN = ""
+    GREEN = ""
+
+# verbosity levels, an event is recorded if its level is at most the level of the log
+QUIET = 0
+ROUNDS = 1
+MESSAGES = 2
+
+LEVELS = {"quiet": QUIET, "rounds": ROUNDS, "messages": MESSAGES}
+
+# kinds of events
+SEND = 0
+RECEIVE = 1
+ROUND = 2
+BROADCAST = 3
+DROP = 4
+
+KINDS = ["send", "receive", "round", "broadcast", "drop"]
+
+
+class Snapshot(NamedTuple):
+    """
+    What the log keeps of a message, taken when the event is recorded since the receiver may change the message.
+
+    Attributes:
+        type (str): The name of the class of the message.
+        source (int): The sender.
+        destination (int): The receiver.
+        text (str): The message as printed.
+    """
+
+    type: str
+    source: int
+    destination: int
+    text: str
+
+    def __str__(self) -> str:
+        return self.text
+
+
+def snapshot(message: Any) -> Snapshot:
+    try:
+        text = str(message)
+    except Exception as e:
+        # a broken __str__ of a message must neither stop the device nor the log
+        text = f"<{type(message).__name__} that cannot be printed: {e!r}>"
+    return Snapshot(
+        type(message).__name__,
+        getattr(message, "source", None),
+        getattr(message, "destination", None),
+        text,
+    )
+
+
+class Event(NamedTuple):
+    """
+    A single thing that happened during an emulation.
+
+    Attributes:
+        time (float): Seconds since the log was created.
+        kind (int): What happened, one of the kinds defined in this module.
+        message (Optional[Snapshot]): The message sent or received, if any.
+        value (Any): Additional information, e.g. the number of a round.
+    """
+
+    time: float
+    kind: int
+    message: Optional[Snapshot] = None
+    value: Any = None
+
+    def text(self) -> str:
+        if self.kind == SEND:
+            return f"\r\t{GREEN}Send{RESET} {self.message}"
+        if self.kind == RECEIVE:
+            return f"\r\t{GREEN}Receive{RESET} {self.message}"
+        if self.kind == ROUND:
+            return f"\r\t## {GREEN}ROUND {self.value}{RESET} ##"
+        if self.kind == BROADCAST:
+            return f"\r\t{GREEN}Broadcast{RESET} {self.message} to {self.value} devices"
+        if self.kind == DROP:
+            return (
+                f"\r\t{GREEN}Drop{RESET} {self.message} to unknown device {self.value}"
+            )
+        return f"\r\t{KINDS[self.kind]} {self.message} {self.value}"
+
+    def as_dict(self) -> dict:
+        record = {"time": self.time, "kind": KINDS[self.kind]}
+        if self.message is not None:
+            record["type"] = self.message.type
+            record["source"] = self.message.source
+            record["destination"] = self.message.destination
+            record["message"] = self.message.text
+        if self.value is not None:
+            record["value"] = self.value
+        return record
+
+
+class Sink:
+    """
+    Destination of the events of a log, written to from the background thread of the log.
+    """
+
+    def write(self, events: list[Event]):
+        raise NotImplementedError("You have to implement a sink!")
+
+    def close(self):
+        return
+
+
+class ConsoleSink(Sink):
+    def __init__(self, stream: Optional[TextIO] = None):
+        self._stream = stream
+
+    def write(self, events: list[Event]):
+        stream = self._stream or sys.stdout
+        stream.write("\n".join([event.text() for event in events]) + "\n")
+        stream.flush()
+
+
+class JsonlSink(Sink):
+    """
+    Writes one JSON object per event and line.
+    """
+
+    def __init__(self, path: str):
+        self._file = open(path, "w")
+
+    def write(self, events: list[Event]):
+        self._file.write(
+            "".join([json.dumps(event.as_dict()) + "\n" for event in events])
+        )
+
+    def close(self):
+        self._file.close()
+
+
+class BinarySink(Sink):
+    """
+    Writes compact fixed-size records followed by the name of the class and the text of the message, see
+    ``read_binary``.
+    """
+
+    # time, kind, source, destination, value, length of the name of the class and length of the text
+    header = struct.Struct("<dBiiqHI")
+
+    def __init__(self, path: str):
+        self._file: BinaryIO = open(path, "wb")
+
+    def write(self, events: list[Event]):
+        chunks = []
+        for event in events:
+            message = event.message
+            name = b"" if message is None else message.type.encode()
+            text = b"" if message is None else message.text.encode()
+            chunks.append(
+                self.header.pack(
+                    event.time,
+                    event.kind,
+                    _device(None if message is None else message.source),
+                    _device(None if message is None else message.destination),
+                    event.value if isinstance(event.value, int) else -1,
+                    len(name),
+                    len(text),
+                )
+            )
+            chunks.append(name)
+            chunks.append(text)
+        self._file.write(b"".join(chunks))
+
+    def close(self):
+        self._file.close()
+
+
+def _device(index: Any) -> int:
+    # devices are numbered from 0, anything else, e.g. the unknown destination of a dropped message, is stored as -1
+    return index if isinstance(index, int) and index >= 0 else -1
+
+
+def read_binary(path: str) -> Iterator[dict]:
+    """
+    Read a file written by a BinarySink.
+
+    Args:
+        path (str): The file to read.
+
+    Returns:
+        Iterator[dict]: The events, with the same fields as the JSONL sink writes.
+    """
+    header = BinarySink.header
+    with open(path, "rb") as file:
+        while True:
+            data = file.read(header.size)
+            if len(data) < header.size:
+                return
+            timestamp, kind, source, destination, value, named, length = header.unpack(
+                data
+            )
+            record = {"time": timestamp, "kind": KINDS[kind]}
+            if named > 0:
+                # only events with a message have the name of its class
+                record["type"] = file.read(named).decode()
+                record["source"] = None if source < 0 else source
+                record["destination"] = None if destination < 0 else destination
+                record["message"] = file.read(length).decode()
+            if value >= 0:
+                record["value"] = value
+            yield record
+
+
+class EventLog:
+    """
+    Structured log of the events of an emulation.
+
+    Recording an event takes a snapshot of the message and appends it to a bounded ring buffer and a pending queue,
+    both without taking a lock. The events are handed to the sinks by a background thread, so emulators never do
+    console or file I/O while holding their locks. Whoever prints to the console in between calls ``flush`` first, to
+    keep the output in order. Emulators check ``level`` before recording, so a log at level QUIET costs a single
+    comparison per message.
+
+    Attributes:
+        level (int): Events above this level are not recorded.
+        history (deque[Event]): The most recent events.
+    """
+
+    interval = 0.05
+
+    def __init__(
+        self,
+        level: int = MESSAGES,
+        sinks: Optional[list[Sink]] = None,
+        capacity: int = 10000,
+    ):
+        self.level = level
+        self.history: deque[Event] = deque(maxlen=capacity)
+        self._sinks = [ConsoleSink()] if sinks is None else sinks
+        self._pending: deque[Event] = deque()
+        self._start = time.perf_counter()
+        self._drain_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._writer: Optional[threading.Thread] = None
+
+    def record(self, kind: int, message: Any = None, value: Any = None):
+        """
+        Record an event, callers check ``level`` first.
+
+        Args:
+            kind (int): What happened.
+            message (Any): The message sent or received, if any.
+            value (Any): Additional information.
+        """
+        event = Event(
+            time.perf_counter() - self._start,
+            kind,
+            None if message is None else snapshot(message),
+            value,
+        )
+        self.history.append(event)
+        if self._sinks:
+            self._pending.append(event)
+            if self._writer is None:
+                self._start_writer()
+
+    def _start_writer(self):
+        with self._drain_lock:
+            if self._writer is None and not self._closed:
+                self._writer = threading.Thread(target=self._write_loop, daemon=True)
+                self._writer.start()
+
+    def _write_loop(self):
+        while not self._closed:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                traceback.print_exc()
+
+    def flush(self):
+        """
+        Hand all pending events to the sinks.
+        """
+        with self._drain_lock:
+            events = []
+            while self._pending:
+                events.append(self._pending.popleft())
+            if len(events) > 0:
+                for sink in self._sinks:
+                    try:
+                        sink.write(events)
+                    except Exception:
+                        # report the failure and keep on logging to the other sinks
+                        print(
+                            f"Writing the log to {type(sink).__name__} failed:",
+                            file=sys.stderr,
+                        )
+                        traceback.print_exc()
+
+    def close(self):
+        """
+        Write the pending events, stop the background thread and close the sinks.
+        """
+        self._closed = True
+        if self._writer is not None:
+            self._wake.set()
+            self._writer.join()
+            self._writer = None
+        self.flush()
+        for sink in self._sinks:
+            sink.close()
+        self._sinks = []
+
+    def events(self) -> list[Event]:
+        return list(self.history)
+
+
+def make_log(
+    level: str = "messages",
+    console: bool = True,
+    jsonl: Optional[str] = None,
+    binary: Optional[str] = None,
+) -> EventLog:
+    """
+    Create a log from command line arguments.
+
+    Args:
+        level (str): One of the names in LEVELS.
+        console (bool): Whether to print the events.
+        jsonl (Optional[str]): File to write the events to as JSON lines.
+        binary (Optional[str]): File to write the events to in the binary format.
+
+    Returns:
+        EventLog: The log, at level QUIET if there is nowhere to write the events to.
+    """
+    sinks = []
+    if console:
+        sinks.append(ConsoleSink())
+    if jsonl is not None:
+        sinks.append(JsonlSink(jsonl))
+    if binary is not None:
+        sinks.append(BinarySink(binary))
+    return EventLog(LEVELS[level] if len(sinks) > 0 else QUIET, sinks)
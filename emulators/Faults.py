@@ -0,0 +1,215 @@
+import json
+import math
+import random
+import threading
+from typing import NamedTuple, Optional
+
+
+class DeviceCrashed(Exception):
+    """
+    Raised in a device at its first call to the medium after it crashed for good, ending its ``run``.
+    """
+
+
+class Partition(NamedTuple):
+    """
+    Groups of devices that cannot reach each other from ``start`` until ``end``.
+
+    Devices not listed in any group form one more group together.
+    """
+
+    start: float
+    end: float
+    groups: list[list[int]]
+
+
+class Crash(NamedTuple):
+    """
+    A device crashing at ``at``. Without ``recover`` it stops for good (crash-stop), otherwise it is cut off from the
+    network until ``recover`` and carries on with its state afterwards, as if restored from stable storage
+    (crash-recovery).
+    """
+
+    device: int
+    at: float
+    recover: Optional[float] = None
+
+
+class FaultModel:
+    """
+    Lost and duplicated messages, partitions and crashes, on top of the reordering every network does.
+
+    Faults are scheduled in the time of the network: rounds in the ``sync`` network, virtual seconds in networks with
+    a latency model or a topology and otherwise seconds since the emulator was created. Whether a message is lost is
+    decided when it is sent, from the time of its sender.
+
+    Drawing a random number for every message would make the faults as expensive as the messages. Instead the number
+    of messages until the next loss (or duplicate) on a link is drawn from the geometric distribution each time one
+    happens, so a message that gets through costs a decrement and a random number is only drawn per fault. Messages
+    between devices without a probability of their own share a counter per sender, which is only touched by the
+    thread of the sender.
+
+    Attributes:
+        drop (float): The probability of losing a message.
+        duplicate (float): The probability of delivering a message twice.
+        links (dict[tuple[int, int], tuple[float, float]]): Probabilities of losing and duplicating messages from a
+            source to a destination, replacing ``drop`` and ``duplicate`` for that link.
+        partitions (list[Partition]): When the network is split.
+        crashes (list[Crash]): When devices crash, and maybe recover.
+        rng (random.Random): The source of randomness, defaults to the global ``random`` module.
+        lost (int): Messages lost at random.
+        duplicated (int): Messages delivered twice.
+        partitioned (int): Messages lost to a partition.
+        crashed (int): Messages lost because their sender or receiver was crashed.
+    """
+
+    def __init__(
+        self,
+        drop: float = 0.0,
+        duplicate: float = 0.0,
+        links: Optional[dict[tuple[int, int], tuple[float, float]]] = None,
+        partitions: Optional[list[Partition]] = None,
+        crashes: Optional[list[Crash]] = None,
+        rng: Optional[random.Random] = None,
+    ):
+        self.drop = drop
+        self.duplicate = duplicate
+        self.links = links or {}
+        self.partitions = partitions or []
+        self.crashes = crashes or []
+        self.rng = rng if rng is not None else random
+        self.lost = 0
+        self.duplicated = 0
+        self.partitioned = 0
+        self.crashed = 0
+        self._group_of = [
+            {
+                device: group
+                for group, devices in enumerate(p.groups)
+                for device in devices
+            }
+            for p in self.partitions
+        ]
+        self._crashes_of: dict[int, list[Crash]] = {}
+        for crash in self.crashes:
+            self._crashes_of.setdefault(crash.device, []).append(crash)
+        # messages to go until the next fault, by kind and sender or link
+        self._remaining: dict[tuple, int] = {}
+        self._lock = threading.Lock()
+
+    def deliveries(self, source: int, destination: int, now: float) -> int:
+        """
+        Decide the fate of a message.
+
+        Args:
+            source (int): The sending device.
+            destination (int): The receiving device.
+            now (float): The time of the sender.
+
+        Returns:
+            int: How many times the message is delivered: 0, 1 or 2.
+        """
+        if len(self._crashes_of) > 0 and (
+            self.is_crashed(source, now) or self.is_crashed(destination, now)
+        ):
+            self._count("crashed")
+            return 0
+        for partition, group_of in zip(self.partitions, self._group_of):
+            if partition.start <= now < partition.end and group_of.get(
+                source, -1
+            ) != group_of.get(destination, -1):
+                self._count("partitioned")
+                return 0
+        link = self.links.get((source, destination))
+        if link is None:
+            drop, duplicate, key = self.drop, self.duplicate, source
+        else:
+            drop, duplicate = link
+            key = (source, destination)
+        if drop > 0 and self._happens(("drop", key), drop):
+            self._count("lost")
+            return 0
+        if duplicate > 0 and self._happens(("duplicate", key), duplicate):
+            self._count("duplicated")
+            return 2
+        return 1
+
+    def _happens(self, key: tuple, probability: float) -> bool:
+        remaining = self._remaining.get(key)
+        if remaining is None:
+            remaining = self._gap(probability)
+        if remaining == 0:
+            self._remaining[key] = self._gap(probability)
+            return True
+        self._remaining[key] = remaining - 1
+        return False
+
+    def _gap(self, probability: float) -> int:
+        # messages that get through before the next fault
+        if probability >= 1.0:
+            return 0
+        return int(math.log(1.0 - self.rng.random()) / math.log(1.0 - probability))
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def is_crashed(self, index: int, now: float) -> bool:
+        for crash in self._crashes_of.get(index, ()):
+            if crash.at <= now and (crash.recover is None or now < crash.recover):
+                return True
+        return False
+
+    def check(self, index: int, now: float):
+        """
+        Stop a device that crashed for good.
+
+        Raises:
+            DeviceCrashed: If the device has a crash-stop failure at or before ``now``.
+        """
+        for crash in self._crashes_of.get(index, ()):
+            if crash.recover is None and crash.at <= now:
+                raise DeviceCrashed(f"Device {index} crashed at {crash.at}")
+
+    def statistics(self) -> dict:
+        return {
+            "lost": self.lost,
+            "duplicated": self.duplicated,
+            "partitioned": self.partitioned,
+            "crashed": self.crashed,
+        }
+
+
+def parse_faults(text: str) -> FaultModel:
+    """
+    Create a fault model from a command line argument.
+
+    Args:
+        text (str): Either ``drop=P``, ``duplicate=P`` or both separated by a comma, or a JSON file with the keys
+            ``drop``, ``duplicate``, ``links`` (a list of ``[source, destination, drop, duplicate]``), ``partitions``
+            (a list of ``{"start": T, "end": T, "groups": [[devices], ...]}``) and ``crashes`` (a list of
+            ``{"device": D, "at": T}``, with ``"recover": T`` for crash-recovery).
+
+    Returns:
+        FaultModel: The model.
+    """
+    if text.endswith(".json"):
+        with open(text) as file:
+            spec = json.load(file)
+        return FaultModel(
+            drop=spec.get("drop", 0.0),
+            duplicate=spec.get("duplicate", 0.0),
+            links={
+                (int(source), int(destination)): (float(drop), float(duplicate))
+                for source, destination, drop, duplicate in spec.get("links", [])
+            },
+            partitions=[Partition(**p) for p in spec.get("partitions", [])],
+            crashes=[Crash(**c) for c in spec.get("crashes", [])],
+        )
+    probabilities = {}
+    for setting in text.split(","):
+        key, _, value = setting.partition("=")
+        if key not in ["drop", "duplicate"] or value == "":
+            raise ValueError(f'Unknown fault "{setting}"')
+        probabilities[key] = float(value)
+    return FaultModel(**probabilities)
@@ -0,0 +1,127 @@
+import pickle
+import tempfile
+import threading
+from array import array
+from collections import deque
+from typing import Iterator, NamedTuple, Optional
+
+from emulators.MessageStub import MessageStub
+
+
+class Summary(NamedTuple):
+    """
+    Stands in for a spilled message that could not be pickled, enough to show it.
+    """
+
+    source: int
+    destination: int
+    text: str
+
+    def __str__(self):
+        return self.text
+
+
+class History:
+    """
+    The messages sent or received while stepping, numbered from 0 in the order they happened.
+
+    The most recent ``capacity`` messages are kept in memory. Older ones are pickled to an append-only file, a
+    temporary file unless a path is given, and the position of every spilled message in the file is kept in a flat
+    array, so any message can still be read back by its sequence number with a single seek. The sequence numbers of
+    the messages every device sent or received are indexed as well, so the messages of one device are found without
+    going through the others.
+
+    Attributes:
+        capacity (Optional[int]): The number of messages kept in memory, None keeps them all.
+    """
+
+    def __init__(self, capacity: Optional[int] = None, path: Optional[str] = None):
+        self.capacity = capacity
+        self._path = path
+        self._recent: deque = deque()
+        self._spilled = array("q")
+        self._file = None
+        self._by_device: dict[int, array] = {}
+        self._lock = threading.Lock()
+
+    def append(self, message: MessageStub) -> int:
+        """
+        Returns:
+            int: The sequence number of the message.
+        """
+        with self._lock:
+            sequence = len(self._spilled) + len(self._recent)
+            self._recent.append(message)
+            self._index(message.source, sequence)
+            if message.destination != message.source:
+                self._index(message.destination, sequence)
+            if self.capacity is not None and len(self._recent) > self.capacity:
+                self._spill(self._recent.popleft())
+            return sequence
+
+    # called with the lock held
+    def _index(self, device: int, sequence: int):
+        if device not in self._by_device:
+            self._by_device[device] = array("q")
+        self._by_device[device].append(sequence)
+
+    def _spill(self, message: MessageStub):
+        if self._file is None:
+            self._file = (
+                open(self._path, "w+b")
+                if self._path is not None
+                else tempfile.TemporaryFile()
+            )
+        try:
+            data = pickle.dumps(message, pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            data = pickle.dumps(
+                Summary(message.source, message.destination, str(message))
+            )
+        self._file.seek(0, 2)
+        self._spilled.append(self._file.tell())
+        self._file.write(data)
+
+    def _read(self, sequence: int) -> MessageStub:
+        self._file.seek(self._spilled[sequence])
+        return pickle.load(self._file)
+
+    def __len__(self) -> int:
+        return len(self._spilled) + len(self._recent)
+
+    def __getitem__(self, sequence: int) -> MessageStub:
+        """
+        Get a message by its sequence number, negative numbers count from the end like in a list.
+
+        Raises:
+            IndexError: If there is no message with the sequence number.
+        """
+        with self._lock:
+            length = len(self._spilled) + len(self._recent)
+            if sequence < 0:
+                sequence += length
+            if not 0 <= sequence < length:
+                raise IndexError(f"No message with sequence number {sequence}")
+            if sequence >= len(self._spilled):
+                return self._recent[sequence - len(self._spilled)]
+            return self._read(sequence)
+
+    def __iter__(self) -> Iterator[MessageStub]:
+        for sequence in range(len(self)):
+            yield self[sequence]
+
+    def involving(self, device: int) -> list[tuple[int, MessageStub]]:
+        """
+        Returns:
+            list[tuple[int, MessageStub]]: The sequence numbers and the messages a device sent or received, in order.
+        """
+        with self._lock:
+            sequences = self._by_device.get(device, array("q")).tolist()
+        return [(sequence, self[sequence]) for sequence in sequences]
+
+    def close(self):
+        # the spilled messages cannot be read anymore afterwards
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
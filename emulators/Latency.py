@@ -0,0 +1,150 @@
+import random
+from typing import Optional
+
+from emulators.MessageStub import MessageStub
+
+
+class LatencyModel:
+    """
+    Network delays in virtual time (seconds) used by emulators that keep a virtual clock.
+
+    Attributes:
+        rng (random.Random): The source of randomness, defaults to the global ``random`` module.
+    """
+
+    def __init__(self, rng: Optional[random.Random] = None):
+        self.rng = rng if rng is not None else random
+
+    def sample(self, source: int, destination: int) -> float:
+        """
+        Draw the delay of a single message.
+
+        Args:
+            source (int): The sending device.
+            destination (int): The receiving device.
+
+        Returns:
+            float: The delay of the message in virtual seconds.
+        """
+        raise NotImplementedError("You have to implement a latency model!")
+
+    def idle(self, index: int) -> float:
+        """
+        Draw the virtual time passing when a device waits for the next round.
+
+        Args:
+            index (int): The waiting device.
+
+        Returns:
+            float: The time spent waiting in virtual seconds.
+        """
+        return self.sample(index, index)
+
+    def arrival(self, message: MessageStub, now: float) -> float:
+        """
+        Schedule the delivery of a message.
+
+        Args:
+            message (MessageStub): The message, as it will be delivered.
+            now (float): The virtual time of the sender.
+
+        Returns:
+            float: The virtual time at which the message arrives.
+        """
+        return now + self.sample(message.source, message.destination)
+
+
+class ConstantLatency(LatencyModel):
+    def __init__(self, delay: float, rng: Optional[random.Random] = None):
+        super().__init__(rng)
+        self.delay = delay
+
+    def sample(self, source: int, destination: int) -> float:
+        return self.delay
+
+
+class UniformLatency(LatencyModel):
+    def __init__(self, low: float, high: float, rng: Optional[random.Random] = None):
+        super().__init__(rng)
+        self.low = low
+        self.high = high
+
+    def sample(self, source: int, destination: int) -> float:
+        return self.rng.uniform(self.low, self.high)
+
+
+class ExponentialLatency(LatencyModel):
+    def __init__(
+        self, mean: float, minimum: float = 0.0, rng: Optional[random.Random] = None
+    ):
+        super().__init__(rng)
+        self.mean = mean
+        self.minimum = minimum
+
+    def sample(self, source: int, destination: int) -> float:
+        return self.minimum + self.rng.expovariate(1.0 / self.mean)
+
+
+class MatrixLatency(LatencyModel):
+    """
+    Fixed per-link delays, ``matrix[source][destination]`` is the delay from source to destination.
+    """
+
+    def __init__(self, matrix: list[list[float]], rng: Optional[random.Random] = None):
+        super().__init__(rng)
+        self.matrix = matrix
+
+    def sample(self, source: int, destination: int) -> float:
+        return self.matrix[source][destination]
+
+    def idle(self, index: int) -> float:
+        # the diagonal is usually zero, wait as long as the fastest link of the device instead
+        delays = [delay for delay in self.matrix[index] if delay > 0]
+        return min(delays) if len(delays) > 0 else 0.0
+
+
+# the models taking numbers on the command line, with the names of the numbers they take
+MODELS: dict[str, tuple[type, tuple[str, ...]]] = {
+    "constant": (ConstantLatency, ("D",)),
+    "uniform": (UniformLatency, ("LOW", "HIGH")),
+    "exponential": (ExponentialLatency, ("MEAN",)),
+}
+
+# the delays the emulators have always drawn between messages
+DEFAULT_LATENCY = UniformLatency(0.01, 0.1)
+
+
+def parse_latency(text: str) -> Optional[LatencyModel]:
+    """
+    Create a latency model from a command line argument.
+
+    Args:
+        text (str): One of ``none``, ``constant:D``, ``uniform:LOW,HIGH``, ``exponential:MEAN`` or ``matrix:FILE``,
+            where FILE contains one whitespace separated row of delays per device.
+
+    Returns:
+        Optional[LatencyModel]: The model, or None for ``none``.
+
+    Raises:
+        ValueError: If the model is unknown or does not get the number of values it takes.
+    """
+    kind, _, arguments = text.partition(":")
+    if kind == "none":
+        if arguments != "":
+            raise ValueError(f'The latency model "none" takes no values, got "{text}"')
+        return None
+    if kind == "matrix":
+        with open(arguments) as file:
+            return MatrixLatency(
+                [[float(x) for x in line.split()] for line in file if line.strip()]
+            )
+    if kind not in MODELS:
+        raise ValueError(f'Unknown latency model "{text}"')
+    model, names = MODELS[kind]
+    values = [float(x) for x in arguments.split(",") if x != ""]
+    if len(values) != len(names):
+        # further values would be taken for the random generator of the model
+        raise ValueError(
+            f'The latency model "{kind}" takes {kind}:{",".join(names)}, got "{text}"'
+        )
+    return model(*values)
@@ -0,0 +1,236 @@
+import heapq
+import itertools
+import random
+import threading
+from typing import Callable, Optional
+
+from emulators.MessageStub import MessageStub
+
+
+class Mailbox:
+    """
+    Messages waiting to be delivered to a single device.
+
+    Each mailbox has its own lock, so devices sending to and receiving from different devices never contend, and a
+    condition variable that lets a receiver sleep until a message arrives. Messages are delivered in any order: a
+    uniformly random message is taken by swapping it with the last one, so both sending and receiving take constant
+    time however many messages are waiting.
+
+    Attributes:
+        _messages (list[MessageStub]): The messages in transit to the device.
+        _arrived (threading.Condition): Signalled whenever a message is put in the mailbox.
+        _rng (random.Random): Picks the message to deliver, the global ``random`` module unless a seeded instance is
+            passed for reproducible runs.
+    """
+
+    def __init__(self, rng: Optional[random.Random] = None):
+        self._messages: list[MessageStub] = []
+        self._lock = threading.Lock()
+        self._arrived = threading.Condition(self._lock)
+        self._rng = rng if rng is not None else random
+
+    def put(self, message: MessageStub):
+        """
+        Add a message to the mailbox and wake up a waiting receiver.
+
+        Args:
+            message (MessageStub): The message to deliver.
+        """
+        with self._lock:
+            self._messages.append(message)
+            self._arrived.notify()
+
+    def get(self, timeout: Optional[float] = None) -> Optional[MessageStub]:
+        """
+        Take a message from the mailbox.
+
+        Args:
+            timeout (Optional[float]): Seconds to wait for a message if the mailbox is empty, None returns immediately.
+
+        Returns:
+            Optional[MessageStub]: The message, or None if the mailbox stayed empty.
+        """
+        with self._lock:
+            if timeout is not None and len(self._messages) == 0:
+                self._arrived.wait_for(lambda: len(self._messages) > 0, timeout)
+            if len(self._messages) == 0:
+                return None
+            return self._take()
+
+    def wait(self, timeout: float) -> bool:
+        """
+        Wait for a message to arrive, without taking it.
+
+        Args:
+            timeout (float): Seconds to wait if the mailbox is empty.
+
+        Returns:
+            bool: Whether a message is waiting.
+        """
+        with self._lock:
+            return self._arrived.wait_for(lambda: len(self._messages) > 0, timeout)
+
+    def get_where(
+        self, predicate: Callable[[MessageStub], bool], timeout: Optional[float] = None
+    ) -> Optional[MessageStub]:
+        """
+        Take a specific message from the mailbox, used to replay a recorded schedule.
+
+        Args:
+            predicate (Callable[[MessageStub], bool]): Selects the message.
+            timeout (Optional[float]): Seconds to wait for the message if it is not there, None returns immediately.
+
+        Returns:
+            Optional[MessageStub]: The message, or None if it did not arrive.
+        """
+        with self._lock:
+            if timeout is not None:
+                self._arrived.wait_for(
+                    lambda: self._position(predicate) is not None, timeout
+                )
+            i = self._position(predicate)
+            return None if i is None else self._remove(i)
+
+    # called with the lock held
+    def _position(self, predicate: Callable[[MessageStub], bool]) -> Optional[int]:
+        for i, message in enumerate(self._messages):
+            if predicate(message):
+                return i
+        return None
+
+    def _remove(self, i: int) -> MessageStub:
+        return self._messages.pop(i)
+
+    def drain(self) -> list[MessageStub]:
+        """
+        Take all messages from the mailbox at once.
+
+        Returns:
+            list[MessageStub]: The messages, in random order.
+        """
+        with self._lock:
+            messages = self._messages
+            self._messages = []
+        self._rng.shuffle(messages)
+        return messages
+
+    def _take(self) -> MessageStub:
+        # pick a random message to emulate changes in order
+        messages = self._messages
+        nxt = self._rng.randrange(len(messages))
+        messages[nxt], messages[-1] = messages[-1], messages[nxt]
+        return messages.pop()
+
+    # list-like access used when inspecting the messages in transit
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def __iter__(self):
+        with self._lock:
+            return iter(self._messages.copy())
+
+    def __getitem__(self, index: int) -> MessageStub:
+        return self._messages[index]
+
+    def index(self, message: MessageStub) -> int:
+        return self._messages.index(message)
+
+    def pop(self, index: int = -1) -> MessageStub:
+        with self._lock:
+            return self._messages.pop(index)
+
+
+class TimedMailbox(Mailbox):
+    """
+    Messages waiting to be delivered to a single device, ordered on the virtual time they arrive at.
+
+    Messages are handed out in the order of their delivery timestamps, so a message sent later over a faster link
+    overtakes one sent earlier over a slower link, without anybody sleeping. Ties are broken by the order of sending.
+
+    Attributes:
+        _messages (list[tuple[float, int, MessageStub]]): Heap of (timestamp, sequence number, message).
+    """
+
+    _sequence = itertools.count()
+
+    def put(self, message: MessageStub, timestamp: float = 0.0):
+        """
+        Add a message to the mailbox and wake up a waiting receiver.
+
+        Args:
+            message (MessageStub): The message to deliver.
+            timestamp (float): The virtual time at which the message arrives.
+        """
+        with self._lock:
+            heapq.heappush(self._messages, (timestamp, next(self._sequence), message))
+            self._arrived.notify()
+
+    def get_timed(
+        self, timeout: Optional[float] = None
+    ) -> Optional[tuple[float, MessageStub]]:
+        """
+        Take the message with the earliest timestamp from the mailbox.
+
+        Args:
+            timeout (Optional[float]): Seconds to wait for a message if the mailbox is empty, None returns immediately.
+
+        Returns:
+            Optional[tuple[float, MessageStub]]: The timestamp and the message, or None if the mailbox stayed empty.
+        """
+        with self._lock:
+            if timeout is not None and len(self._messages) == 0:
+                self._arrived.wait_for(lambda: len(self._messages) > 0, timeout)
+            if len(self._messages) == 0:
+                return None
+            timestamp, _, message = heapq.heappop(self._messages)
+            return timestamp, message
+
+    def get(self, timeout: Optional[float] = None) -> Optional[MessageStub]:
+        entry = self.get_timed(timeout)
+        return None if entry is None else entry[1]
+
+    def _position(self, predicate: Callable[[MessageStub], bool]) -> Optional[int]:
+        for i, (_, _, message) in enumerate(self._messages):
+            if predicate(message):
+                return i
+        return None
+
+    def _remove(self, i: int) -> MessageStub:
+        _, _, message = self._messages.pop(i)
+        heapq.heapify(self._messages)
+        return message
+
+    def drain_timed(self) -> list[tuple[float, MessageStub]]:
+        """
+        Take all messages from the mailbox at once.
+
+        Returns:
+            list[tuple[float, MessageStub]]: The timestamps and the messages, in timestamp order.
+        """
+        with self._lock:
+            entries = self._messages
+            self._messages = []
+        entries.sort()
+        return [(timestamp, message) for timestamp, _, message in entries]
+
+    def drain(self) -> list[MessageStub]:
+        return [message for _, message in self.drain_timed()]
+
+    def __iter__(self):
+        with self._lock:
+            return iter([message for _, _, message in self._messages])
+
+    def __getitem__(self, index: int) -> MessageStub:
+        return self._messages[index][2]
+
+    def index(self, message: MessageStub) -> int:
+        for i, (_, _, candidate) in enumerate(self._messages):
+            if candidate == message:
+                return i
+        raise ValueError(f"{message} is not in the mailbox")
+
+    def pop(self, index: int = -1) -> MessageStub:
+        with self._lock:
+            _, _, message = self._messages.pop(index)
+            heapq.heapify(self._messages)
+            return message
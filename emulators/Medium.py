@@ -1,3 +1,5 @@
+from typing import Iterable, Optional
+
 from emulators.MessageStub import MessageStub
 
 
@@ -12,6 +14,8 @@ class Medium:
     Attributes:
         _id (int): The unique identifier for the medium.
         _emulator: The emulator object associated with the medium.
+        _faults: The fault model of the emulator, if any.
+        _turns: The turns the devices take while a schedule is recorded or replayed, if any.
     """
 
     _id: int
@@ -19,6 +23,17 @@ class Medium:
     def __init__(self, index: int, emulator):
         self._id = index
         self._emulator = emulator
+        self._faults = emulator.faults
+        self._turns = emulator.turns
+        self._checked = self._faults is not None or self._turns is not None
+
+    def _check(self):
+        # every call to the medium lets the other devices take a turn
+        if self._turns is not None:
+            self._turns.switch(self._id)
+        # a device that crashed for good stops at its next call to the medium
+        if self._faults is not None:
+            self._faults.check(self._id, self._emulator.now(self._id))
 
     def send(self, message: MessageStub):
         """
@@ -27,16 +42,65 @@ class Medium:
         Args:
             message (MessageStub): The message to be sent.
         """
+        if self._checked:
+            self._check()
         self._emulator.queue(message)
 
-    def receive(self) -> MessageStub:
+    def send_many(self, messages: Iterable[MessageStub]):
+        """
+        Send several messages at once, which is cheaper than sending them one by one.
+
+        Args:
+            messages (Iterable[MessageStub]): The messages to be sent.
+        """
+        if self._checked:
+            self._check()
+        self._emulator.queue_many(list(messages))
+
+    def broadcast(
+        self,
+        message: MessageStub,
+        include_self: bool = False,
+        destinations: Optional[Iterable[int]] = None,
+    ):
+        """
+        Send a message to all other devices, or to a group of devices.
+
+        The message is copied once and the copy is shared by all receivers, so it is frozen (see MessageStub.freeze)
+        and lists or dictionaries in it must not be changed by the receivers. The destination of the message is
+        ignored, every receiver gets the message addressed to itself.
+
+        Args:
+            message (MessageStub): The message to be sent.
+            include_self (bool): Whether the sending device receives the message as well.
+            destinations (Optional[Iterable[int]]): The devices to send the message to, by default all devices, or all
+                neighbours with a topology.
+        """
+        if self._checked:
+            self._check()
+        self._emulator.broadcast(
+            message,
+            include_self,
+            None if destinations is None else list(destinations),
+        )
+
+    def receive(self, timeout: Optional[float] = None) -> MessageStub:
         """
         Receive a message from the medium.
 
+        Args:
+            timeout (Optional[float]): Seconds to sleep while waiting for a message to arrive. By default the call
+                returns None immediately if no message is available. Emulators that only deliver messages between
+                rounds or in virtual time ignore the timeout.
+
         Returns:
             MessageStub: The received message.
         """
-        return self._emulator.dequeue(self._id)
+        if self._checked:
+            self._check()
+        if timeout is None:
+            return self._emulator.dequeue(self._id)
+        return self._emulator.dequeue(self._id, timeout=timeout)
 
     def receive_all(self) -> list[MessageStub]:
         """
@@ -45,12 +109,9 @@ class Medium:
         Returns:
             list[MessageStub]: A list of received messages.
         """
-        messages = []
-        while True:
-            message = self._emulator.dequeue(self._id)
-            if message is None:
-                return messages
-            messages.append(message)
+        if self._checked:
+            self._check()
+        return self._emulator.drain(self._id)
 
     def wait_for_next_round(self):
         """
@@ -58,8 +119,31 @@ class Medium:
 
         This method signals that the device is waiting for the next communication round to begin.
         """
+        if self._checked:
+            self._check()
         self._emulator.done(self._id)
 
+    def wait_for_message(self, rounds: Optional[int] = None) -> bool:
+        """
+        Wait until a message arrives, instead of waking up every round.
+
+        Servers polling with ``receive_all`` and ``wait_for_next_round`` cost a wake-up per round even when nothing
+        happens. The ``sync`` network keeps a device waiting here asleep until a round delivers a message to it, and
+        skips rounds altogether while every device is asleep and nothing is in transit, unless it is sharded. Other
+        networks wait a single round, so the device has to check its mailbox after waking up either way.
+
+        Args:
+            rounds (Optional[int]): Wake up after this many rounds at the latest, e.g. to time out. None waits for a
+                message only.
+
+        Returns:
+            bool: False if the device was woken up because every device was waiting and nothing was in transit, so
+                no message will arrive unless a device sends one.
+        """
+        if self._checked:
+            self._check()
+        return self._emulator.idle(self._id, rounds)
+
     @property
     def ids(self):
         """
@@ -69,3 +153,35 @@ class Medium:
             int: The unique identifier of the medium.
         """
         return self._emulator.ids
+
+    @property
+    def context(self):
+        """
+        Get the state shared by the devices of this run.
+
+        Returns:
+            RunContext: The context of the emulator.
+        """
+        return self._emulator.context
+
+    @property
+    def topology(self):
+        """
+        Get the links of the network, if the emulator was given a topology.
+
+        Returns:
+            Optional[Topology]: The topology, or None if every device can reach every other device.
+        """
+        return self._emulator.topology
+
+    def neighbours(self) -> list[int]:
+        """
+        Get the devices this device can send to, other than itself.
+
+        Returns:
+            list[int]: The neighbours in the topology, or all other devices without one.
+        """
+        topology = self._emulator.topology
+        if topology is not None:
+            return topology.neighbours(self._id)
+        return [index for index in self._emulator.ids if index != self._id]
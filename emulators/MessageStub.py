@@ -1,14 +1,49 @@
+import copyreg
+from operator import attrgetter
+from typing import Optional
+
+
 class MessageStub:
     """
     Represents a message used in communication within a simulation.
 
+    Subclasses keep their attributes in a ``__dict__`` as usual, unless they are decorated with ``compact``.
+
     Attributes:
         _source (int): The identifier of the message sender.
         _destination (int): The identifier of the message receiver.
+        _frozen (bool): Whether the message was frozen when it was sent, see ``freeze``. Assignments only check it
+            in classes of which a message was frozen, so assigning attributes costs nothing extra until then.
+        _sequence (int): Set by emulators recording or replaying a schedule, see ``emulators.Schedule``.
+        copy_policy (Optional[CopyPolicy]): How messages of this class are copied when sent, None uses the policy of
+            the emulator. See ``emulators.CopyPolicy``.
+        type_tag (int): The index of the class in MESSAGE_TYPES for classes decorated with ``compact``, otherwise -1.
     """
 
-    _source: int
-    _destination: int
+    __slots__ = ()
+
+    _frozen = False
+    copy_policy = None
+    type_tag = -1
+    # every slot of the class and its bases, filled in by __init_subclass__
+    _slot_names: tuple[str, ...] = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        names = []
+        for klass in reversed(cls.__mro__):
+            slots = klass.__dict__.get("__slots__", ())
+            names += [slots] if isinstance(slots, str) else list(slots)
+        if "_frozen" in names:
+            # restored last when a message is loaded or cloned, the other slots cannot be set once it is True
+            names.remove("_frozen")
+            names.append("_frozen")
+        cls._slot_names = tuple(names)
+        if len(names) == 1:
+            getter = attrgetter(names[0])
+            cls._slot_values = lambda message: (getter(message),)
+        elif len(names) > 1:
+            cls._slot_values = attrgetter(*names)
 
     def __init__(self, sender_id: int, destination_id: int):
         """
@@ -18,6 +53,10 @@ class MessageStub:
             sender_id (int): The identifier of the message sender.
             destination_id (int): The identifier of the message receiver.
         """
+        if self.type_tag >= 0:
+            # compact messages have no class defaults to fall back to
+            self._sequence = 0
+            self._frozen = False
         self._source = sender_id
         self._destination = destination_id
 
@@ -60,3 +99,206 @@ class MessageStub:
             value (int): The new identifier for the source device.
         """
         self._source = value
+
+    def clone(self) -> "MessageStub":
+        """
+        Create a shallow copy of the message, without going through ``__init__``.
+
+        Returns:
+            MessageStub: A message of the same type sharing all attribute values with this one.
+        """
+        clone = object.__new__(type(self))
+        for name in self._slot_names:
+            try:
+                object.__setattr__(clone, name, getattr(self, name))
+            except AttributeError:
+                # the slot was never set
+                pass
+        if hasattr(self, "__dict__"):
+            object.__setattr__(clone, "__dict__", self.__dict__.copy())
+        return clone
+
+    def readdressed(self, destination: int) -> "MessageStub":
+        """
+        Create a shallow copy of the message with another destination, used to deliver one message to many devices.
+
+        Args:
+            destination (int): The identifier of the receiver of the copy.
+
+        Returns:
+            MessageStub: A message of the same type sharing all other attributes with this one.
+        """
+        clone = self.clone()
+        object.__setattr__(clone, "_destination", destination)
+        return clone
+
+    def freeze(self):
+        """
+        Make the message immutable, assigning to any of its attributes afterwards raises an AttributeError.
+
+        The message keeps its class, the class checks the flag on every assignment from the first frozen message on.
+        """
+        if not self._frozen:
+            _guard(type(self))
+            object.__setattr__(self, "_frozen", True)
+
+    @property
+    def frozen(self) -> bool:
+        """
+        Get whether the message is immutable, see ``freeze``.
+
+        Returns:
+            bool: True if the message was frozen.
+        """
+        return self._frozen
+
+
+def _guard(cls: type):
+    # wraps the assignment and pickling of a class, once
+    if getattr(cls.__setattr__, "guards_frozen", False):
+        return
+    assign = cls.__setattr__
+    reduce = cls.__reduce_ex__
+
+    def __setattr__(self, name, value):
+        if getattr(self, "_frozen", False):
+            raise AttributeError(
+                f"Cannot set {name} of {type(self).__name__}, the message is frozen since it was sent"
+            )
+        assign(self, name, value)
+
+    def __reduce_ex__(self, protocol: int):
+        if not self._frozen:
+            return reduce(self, protocol)
+        # pickled as a copy that is not frozen, the class of the loaded message may not be guarded yet
+        thawed = self.clone()
+        object.__setattr__(thawed, "_frozen", False)
+        return _refreeze, (thawed,)
+
+    __setattr__.guards_frozen = True
+    type.__setattr__(cls, "__setattr__", __setattr__)
+    type.__setattr__(cls, "__reduce_ex__", __reduce_ex__)
+
+
+def _refreeze(message: MessageStub) -> MessageStub:
+    message.freeze()
+    return message
+
+
+# the attributes of the stub, kept in slots by the first class decorated with compact
+STUB_FIELDS = ("_source", "_destination", "_sequence", "_frozen")
+
+# the classes decorated with compact, indexed by their type tag
+MESSAGE_TYPES: list[type] = []
+
+
+def compact(cls: Optional[type] = None, *, eq: bool = False):
+    """
+    Class decorator turning a message class into a compact record.
+
+    The attributes declared as class annotations are stored in slots instead of a per-instance ``__dict__``, which
+    saves memory when many messages are in transit. Any other attribute assigned in ``__init__`` raises an
+    AttributeError, so every attribute has to be declared and assigned before the message is sent. Bases of the
+    class other than MessageStub have to be decorated as well, or their instances keep a ``__dict__``. The class is
+    registered in MESSAGE_TYPES and gets an integer ``type_tag``. Copies are pickled as the tuple of the values of the
+    slots, without their names. Like other messages, compact messages are only equal to themselves and can be used in
+    sets and as keys of dictionaries, unless the class is decorated with ``@compact(eq=True)``: its messages then
+    compare equal when their type and all attributes are equal, and they are not hashable.
+
+    Example::
+
+        @compact
+        class Vote(MessageStub):
+            candidate: int
+
+            def __init__(self, sender: int, destination: int, candidate: int):
+                super().__init__(sender, destination)
+                self.candidate = candidate
+
+    Args:
+        cls (Optional[type]): A subclass of MessageStub.
+        eq (bool): Whether messages compare equal by value.
+
+    Returns:
+        type: The slotted version of the class, or a decorator creating it when called with ``eq`` only.
+    """
+    if cls is None:
+        return lambda klass: compact(klass, eq=eq)
+    fields = tuple(cls.__dict__.get("__annotations__", {}))
+    if "_source" not in cls._slot_names:
+        fields = STUB_FIELDS + fields
+    namespace = dict(cls.__dict__)
+    namespace.pop("__dict__", None)
+    namespace.pop("__weakref__", None)
+    namespace["__slots__"] = fields
+    namespace["type_tag"] = len(MESSAGE_TYPES)
+    compacted = type(cls)(cls.__name__, cls.__bases__, namespace)
+    compacted.__qualname__ = cls.__qualname__
+    # methods calling super() without arguments still refer to the original class
+    for value in namespace.values():
+        functions = [value]
+        if isinstance(value, (staticmethod, classmethod)):
+            functions = [value.__func__]
+        elif isinstance(value, property):
+            functions = [value.fget, value.fset, value.fdel]
+        for function in functions:
+            for cell in getattr(function, "__closure__", None) or ():
+                if cell.cell_contents is cls:
+                    cell.cell_contents = compacted
+    if eq and "__eq__" not in cls.__dict__:
+        compacted.__eq__ = _equal
+        compacted.__hash__ = None
+    if "clone" not in cls.__dict__:
+        compacted.clone = _clone
+    if "__reduce_ex__" not in cls.__dict__ and "__setstate__" not in cls.__dict__:
+        compacted.__reduce_ex__ = _reduce
+        compacted.__setstate__ = _state_setter(compacted._slot_names)
+    MESSAGE_TYPES.append(compacted)
+    return compacted
+
+
+def _state_setter(names: tuple[str, ...]):
+    # assigns every slot in a single statement, unpacking the tuple pickled by _reduce
+    namespace = {}
+    targets = ", ".join(f"self.{name}" for name in names)
+    exec(f"def __setstate__(self, state):\n    {targets}, = state\n", namespace)
+    return namespace["__setstate__"]
+
+
+def _equal(self, other) -> bool:
+    if type(self) is not type(other):
+        return NotImplemented
+    for name in self._slot_names:
+        if name == "_sequence" or name == "_frozen":
+            continue
+        if getattr(self, name, None) != getattr(other, name, None):
+            return False
+    return getattr(self, "__dict__", None) == getattr(other, "__dict__", None)
+
+
+def _clone(self) -> MessageStub:
+    cls = type(self)
+    if cls.__dictoffset__:
+        return _rebuild(cls, self._slot_values(self), getattr(self, "__dict__", None))
+    clone = object.__new__(cls)
+    clone.__setstate__(self._slot_values(self))
+    return clone
+
+
+def _reduce(self, protocol: int):
+    # pickles the values of the slots without their names, loading them calls __new__ and __setstate__ in C
+    cls = type(self)
+    if cls.__dictoffset__:
+        # subclasses of compact classes that are not decorated themselves
+        return _rebuild, (cls, self._slot_values(self), self.__dict__)
+    return copyreg.__newobj__, (cls,), self._slot_values(self)
+
+
+def _rebuild(cls: type, values: tuple, attributes: Optional[dict]) -> MessageStub:
+    message = object.__new__(cls)
+    for name, value in zip(cls._slot_names, values):
+        object.__setattr__(message, name, value)
+    if attributes:
+        # subclasses of compact classes that are not decorated themselves
+        object.__setattr__(message, "__dict__", attributes.copy())
+    return message
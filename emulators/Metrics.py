@@ -0,0 +1,307 @@
+import json
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+
+from emulators.MessageStub import MessageStub
+from emulators.Schedule import sequence_key
+
+# upper bounds of the buckets of histograms, wide enough for real and virtual seconds alike
+DEFAULT_BOUNDS = tuple(
+    round(scale * 10.0**exponent, 9)
+    for exponent in range(-6, 2)
+    for scale in (1.0, 2.5, 5.0)
+)
+# upper bounds of the buckets counting messages per round
+COUNT_BOUNDS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+
+class Histogram:
+    """
+    Counts of observed values per bucket, exported like the histograms of Prometheus.
+
+    Attributes:
+        bounds (tuple[float, ...]): The inclusive upper bound of every bucket, the last bucket has no upper bound.
+        counts (list[int]): The number of values in every bucket.
+        sum (float): The sum of all values.
+        count (int): The number of values.
+        max (float): The largest value.
+    """
+
+    def __init__(self, bounds: tuple = DEFAULT_BOUNDS):
+        self.bounds = bounds
+        self.counts = [0 for _ in range(len(bounds) + 1)]
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimate a quantile from the buckets.
+
+        Args:
+            q (float): Between 0 and 1, e.g. 0.99.
+
+        Returns:
+            float: The upper bound of the bucket holding the quantile, or the largest value for the last bucket.
+        """
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank and seen > 0:
+                return min(bound, self.max)
+        return self.max
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "max": self.max,
+            "buckets": {
+                str(bound): count for bound, count in zip(self.bounds, self.counts)
+            },
+            "overflow": self.counts[-1],
+        }
+
+
+class TimedLock:
+    """
+    A lock measuring how long threads wait to acquire it, used in place of ``threading.Lock``.
+
+    Acquiring a free lock is counted as no wait without reading the clock.
+    """
+
+    def __init__(self, metrics: "Metrics", name: str):
+        self._lock = threading.Lock()
+        self._metrics = metrics
+        self._name = name
+
+    def acquire(self, blocking: bool = True, timeout: float = -1) -> bool:
+        if self._lock.acquire(False):
+            self._metrics.waited(self._name, 0.0)
+            return True
+        if not blocking:
+            return False
+        start = time.perf_counter()
+        acquired = self._lock.acquire(True, timeout)
+        if acquired:
+            self._metrics.waited(self._name, time.perf_counter() - start)
+        return acquired
+
+    def release(self):
+        self._lock.release()
+
+    def locked(self) -> bool:
+        return self._lock.locked()
+
+    def __enter__(self) -> bool:
+        return self.acquire()
+
+    def __exit__(self, *args):
+        self.release()
+
+
+class Metrics:
+    """
+    Counters, mailbox depths and histograms of an emulation.
+
+    Emulators report every message sent and received together with the time it happened, in virtual time where they
+    keep it and in real time otherwise, and the ``sync`` network reports the number of messages of every round. A
+    message counts towards the mailbox of its destination from the moment it is sent until it is received. Everything
+    is updated under one lock, so ``snapshot`` can be taken from any thread while the emulation is running. Emulators
+    check for a missing registry before reporting, so a run without metrics pays a single comparison per message.
+
+    Attributes:
+        sent (Counter[int]): Messages sent by every device.
+        received (Counter[int]): Messages received by every device.
+        sent_by_type (Counter[str]): Messages sent per message class.
+        received_by_type (Counter[str]): Messages received per message class.
+        depth (Counter[int]): Messages sent to every device that it did not receive yet.
+        high_water (Counter[int]): The largest depth of the mailbox of every device.
+        latency (Histogram): Time from sending to receiving a message.
+        rounds (list[int]): The number of messages delivered at the start of every round of the ``sync`` network.
+        round_sizes (Histogram): The same numbers as a histogram.
+        lock_waits (dict[str, Histogram]): Time spent waiting for the locks of the emulator, see ``TimedLock``.
+    """
+
+    def __init__(self, bounds: tuple = DEFAULT_BOUNDS):
+        self.sent: Counter[int] = Counter()
+        self.received: Counter[int] = Counter()
+        self.sent_by_type: Counter[str] = Counter()
+        self.received_by_type: Counter[str] = Counter()
+        self.depth: Counter[int] = Counter()
+        self.high_water: Counter[int] = Counter()
+        self.latency = Histogram(bounds)
+        self.round_sizes = Histogram(COUNT_BOUNDS)
+        self.rounds: list[int] = []
+        self.lock_waits: dict[str, Histogram] = {}
+        self._bounds = bounds
+        self._sent_at: dict[tuple[int, int], float] = {}
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+
+    def message_sent(self, message: MessageStub, now: float):
+        """
+        Args:
+            message (MessageStub): The copy of the message that is delivered.
+            now (float): The time of the sender.
+        """
+        destination = message.destination
+        with self._lock:
+            self.sent[message.source] += 1
+            self.sent_by_type[type(message).__name__] += 1
+            depth = self.depth[destination] + 1
+            self.depth[destination] = depth
+            if depth > self.high_water[destination]:
+                self.high_water[destination] = depth
+            # stamped by the emulator, unlike its identity the stamp is never reused by another message
+            self._sent_at[sequence_key(message)] = now
+
+    def message_received(self, index: int, message: MessageStub, now: float):
+        """
+        Args:
+            index (int): The receiving device.
+            message (MessageStub): The message.
+            now (float): The time of the receiver.
+        """
+        with self._lock:
+            self.received[index] += 1
+            self.received_by_type[type(message).__name__] += 1
+            self.depth[index] -= 1
+            sent_at = self._sent_at.pop(sequence_key(message), None)
+            if sent_at is not None:
+                self.latency.observe(max(0.0, now - sent_at))
+
+    def finished(self):
+        """
+        Forget when the messages that were never received were sent, called once every device has returned.
+        """
+        with self._lock:
+            self._sent_at.clear()
+
+    def round(self, messages: int):
+        """
+        Args:
+            messages (int): The number of messages delivered at the start of the round.
+        """
+        with self._lock:
+            self.rounds.append(messages)
+            self.round_sizes.observe(messages)
+
+    def waited(self, name: str, seconds: float):
+        with self._lock:
+            histogram = self.lock_waits.get(name)
+            if histogram is None:
+                histogram = self.lock_waits[name] = Histogram(self._bounds)
+            histogram.observe(seconds)
+
+    def timed_lock(self, name: str) -> TimedLock:
+        return TimedLock(self, name)
+
+    def snapshot(self) -> dict:
+        """
+        Returns:
+            dict: All metrics in plain lists and dictionaries, ready to be written as JSON.
+        """
+        with self._lock:
+            return {
+                "elapsed": time.perf_counter() - self._start,
+                "sent": _by_key(self.sent),
+                "received": _by_key(self.received),
+                "sent_by_type": dict(self.sent_by_type),
+                "received_by_type": dict(self.received_by_type),
+                "in_transit": _by_key(+self.depth),
+                "high_water": _by_key(self.high_water),
+                "latency": self.latency.as_dict(),
+                "rounds": list(self.rounds),
+                "lock_waits": {
+                    name: histogram.as_dict()
+                    for name, histogram in self.lock_waits.items()
+                },
+            }
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot())
+
+    def to_prometheus(self) -> str:
+        """
+        Returns:
+            str: All metrics in the text format of Prometheus.
+        """
+        with self._lock:
+            lines = []
+            for name, kind, label, counter in [
+                ("emulator_messages_sent_total", "counter", "device", self.sent),
+                (
+                    "emulator_messages_received_total",
+                    "counter",
+                    "device",
+                    self.received,
+                ),
+                (
+                    "emulator_messages_sent_by_type_total",
+                    "counter",
+                    "type",
+                    self.sent_by_type,
+                ),
+                (
+                    "emulator_messages_received_by_type_total",
+                    "counter",
+                    "type",
+                    self.received_by_type,
+                ),
+                ("emulator_mailbox_depth", "gauge", "device", self.depth),
+                ("emulator_mailbox_depth_max", "gauge", "device", self.high_water),
+            ]:
+                _labelled(lines, name, kind, label, counter)
+            _histogram(lines, "emulator_delivery_latency_seconds", self.latency)
+            lines.append("# TYPE emulator_rounds_total counter")
+            lines.append(f"emulator_rounds_total {len(self.rounds)}")
+            _histogram(lines, "emulator_round_messages", self.round_sizes)
+            for name, histogram in self.lock_waits.items():
+                _histogram(
+                    lines, "emulator_lock_wait_seconds", histogram, f'lock="{name}"'
+                )
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str):
+        """
+        Write the metrics to a file, in the text format of Prometheus for files ending in ``.prom`` and as JSON
+        otherwise.
+        """
+        text = self.to_prometheus() if path.endswith(".prom") else self.to_json()
+        with open(path, "w") as file:
+            file.write(text)
+
+
+def _by_key(counter: Counter) -> dict:
+    return {str(key): counter[key] for key in sorted(counter)}
+
+
+def _labelled(lines: list[str], name: str, kind: str, label: str, counter: Counter):
+    lines.append(f"# TYPE {name} {kind}")
+    for key in sorted(counter):
+        lines.append(f'{name}{{{label}="{key}"}} {counter[key]}')
+
+
+def _histogram(lines: list[str], name: str, histogram: Histogram, labels: str = ""):
+    if f"# TYPE {name} histogram" not in lines:
+        lines.append(f"# TYPE {name} histogram")
+    prefix = labels + "," if labels else ""
+    seen = 0
+    for bound, count in zip(histogram.bounds, histogram.counts):
+        seen += count
+        lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {seen}')
+    lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {histogram.count}')
+    suffix = "{" + labels + "}" if labels else ""
+    lines.append(f"{name}_sum{suffix} {histogram.sum}")
+    lines.append(f"{name}_count{suffix} {histogram.count}")
@@ -0,0 +1,52 @@
+import threading
+from typing import Any, Callable, Optional
+
+
+class RunContext:
+    """
+    State shared by the devices of a single run of an emulator.
+
+    Devices reach the context of their run through ``Device.context`` or ``Medium.context``. State kept here instead
+    of in class attributes or module globals is fresh for every emulator, so runs can follow each other or run side
+    by side in the same process, e.g. when the GUI restarts an algorithm or in a batch of repeated runs.
+
+    Attributes:
+        number_of_devices (int): The number of devices in the run.
+        seed (Optional[int]): The seed of the emulator, if any.
+        lock (threading.RLock): Held while shared state is created, devices may also hold it to update it.
+    """
+
+    def __init__(self, number_of_devices: int, seed: Optional[int] = None):
+        self.number_of_devices = number_of_devices
+        self.seed = seed
+        self.lock = threading.RLock()
+        self._state: dict[str, Any] = {}
+        self._counters: dict[str, int] = {}
+
+    def shared(self, name: str, create: Callable[[], Any]) -> Any:
+        """
+        Get a piece of shared state, creating it on first use.
+
+        Args:
+            name (str): Identifies the state within the run.
+            create (Callable[[], Any]): Creates the state, called once per run, e.g. ``list``.
+
+        Returns:
+            Any: The same object for every device asking for the name in this run.
+        """
+        with self.lock:
+            if name not in self._state:
+                self._state[name] = create()
+            return self._state[name]
+
+    def count(self, name: str) -> int:
+        """
+        Increment a counter of the run.
+
+        Returns:
+            int: The value of the counter after incrementing it, starting from 1.
+        """
+        with self.lock:
+            value = self._counters.get(name, 0) + 1
+            self._counters[name] = value
+            return value
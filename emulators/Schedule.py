@@ -0,0 +1,313 @@
+import json
+import threading
+from collections import deque
+from typing import Callable, Optional
+
+from emulators.MessageStub import MessageStub
+
+# kinds of events
+DELIVER = "deliver"
+PICK = "pick"
+ROUND = "round"
+
+
+def sequence_key(message: MessageStub) -> tuple[int, int]:
+    """
+    Identify a message independently of thread timing.
+
+    Args:
+        message (MessageStub): A message stamped by an emulator recording or replaying a schedule, or collecting
+            metrics.
+
+    Returns:
+        tuple[int, int]: The sender and how many messages it had sent, counting this one.
+    """
+    return message.source, message._sequence
+
+
+class Schedule:
+    """
+    The order in which devices received their messages during a run, recorded to reproduce the run exactly.
+
+    While a schedule is recorded or replayed, emulators stamp every message with how many messages its sender had sent,
+    counting this one, so the sender and that number identify the message in any run. Networks running the devices
+    in threads also let them take turns (see Turns) and record the order of the turns. A replay runs the devices
+    again with the seed and the turns of the recorded run, so devices drawing random numbers or counting how often
+    ``receive`` returned None make the same choices and get the same messages. The deliveries of the replay are
+    recorded as well and compared to the recorded ones by ``divergence``.
+
+    Runs of the stepping emulator cannot be repeated like this, as messages are picked by hand. Their replay hands
+    every device the messages it received in the recorded run, in the same order and, for the ``sync`` network, in the
+    same rounds, without shuffling them. A device asking for a message that has not arrived yet gets None.
+
+    Attributes:
+        seed (Optional[int]): The seed of the recorded run.
+        events (list[list]): ``[DELIVER or PICK, device, source, sequence, round]`` for every message received and
+            ``[ROUND, round]`` for every round started, in the order they happened.
+        turns (Optional[list[list[int]]]): The order in which the devices took turns, see Turns. None if the run cannot
+            be repeated and the replay hands over the recorded messages instead.
+        replaying (bool): Whether the schedule was loaded to be replayed.
+        replayed (list[list]): The events of the replay, like ``events``.
+    """
+
+    def __init__(
+        self,
+        seed: Optional[int] = None,
+        events: Optional[list] = None,
+        turns: Optional[list[list[int]]] = None,
+    ):
+        self.seed = seed
+        self.events = [] if events is None else events
+        self.turns = turns
+        self.replaying = events is not None
+        self.replayed = []
+        self._lock = threading.Lock()
+        self._expected: dict[int, deque[tuple[int, int, int]]] = {}
+        if self.forced:
+            for event in self.events:
+                if event[0] != ROUND:
+                    _, device, source, sequence, rnd = event
+                    self._expected.setdefault(device, deque()).append(
+                        (source, sequence, rnd)
+                    )
+
+    def delivered(
+        self, index: int, message: MessageStub, rnd: int = 0, picked: bool = False
+    ):
+        """
+        Record that a device received a message.
+
+        Args:
+            index (int): The receiving device.
+            message (MessageStub): The stamped message.
+            rnd (int): The current round of the ``sync`` network.
+            picked (bool): Whether the message was picked by hand in the stepping emulator.
+        """
+        with self._lock:
+            self._written().append(
+                [PICK if picked else DELIVER, index, *sequence_key(message), rnd]
+            )
+
+    def round(self, rnd: int):
+        with self._lock:
+            self._written().append([ROUND, rnd])
+
+    def _written(self) -> list:
+        return self.replayed if self.replaying else self.events
+
+    @property
+    def forced(self) -> bool:
+        """
+        Whether the replay hands every device the recorded messages, because the recorded run cannot be repeated.
+        """
+        return self.replaying and self.turns is None
+
+    def expected(
+        self, index: int, rnd: int = 0
+    ) -> Optional[Callable[[MessageStub], bool]]:
+        """
+        Tell which message a device receives next when replaying.
+
+        Args:
+            index (int): The receiving device.
+            rnd (int): The current round of the ``sync`` network.
+
+        Returns:
+            Optional[Callable[[MessageStub], bool]]: True for the expected message, None if the device receives
+                nothing more in this round.
+        """
+        pending = self._expected.get(index)
+        if not pending or pending[0][2] > rnd:
+            return None
+        source, sequence, _ = pending[0]
+        return lambda m: m.source == source and m._sequence == sequence
+
+    def advance(self, index: int):
+        """
+        Move on to the next message of a device, once the expected one was received.
+        """
+        self._expected[index].popleft()
+
+    def remaining(self) -> int:
+        """
+        Returns:
+            int: The number of recorded deliveries that did not happen during a forced replay, zero unless the run
+                diverged.
+        """
+        return sum(len(pending) for pending in self._expected.values())
+
+    def divergence(self) -> Optional[int]:
+        """
+        Compare the replay to the recorded run.
+
+        Returns:
+            Optional[int]: The position of the first event of the replay that differs from the recorded one, None if
+                the replay received the same messages in the same order as the recorded run.
+        """
+        for position, (recorded, replayed) in enumerate(
+            zip(self.events, self.replayed)
+        ):
+            if _comparable(recorded) != _comparable(replayed):
+                return position
+        if len(self.events) != len(self.replayed):
+            return min(len(self.events), len(self.replayed))
+        return None
+
+    def save(self, path: str):
+        with open(path, "w") as file:
+            json.dump(
+                {"seed": self.seed, "events": self.events, "turns": self.turns}, file
+            )
+
+    @staticmethod
+    def load(path: str) -> "Schedule":
+        with open(path) as file:
+            data = json.load(file)
+        return Schedule(data["seed"], data["events"], data.get("turns"))
+
+
+def _comparable(event: list) -> list:
+    # a forced replay delivers the messages picked in the stepping emulator like any other
+    return [DELIVER, *event[1:]] if event[0] == PICK else event
+
+
+class Turns:
+    """
+    Lets the devices of a network running them in threads run one at a time while a schedule is recorded or replayed.
+
+    A device holds the turn while it runs and passes it on whenever it calls the medium and while it waits for a
+    message or a round. Whatever the devices share, above all the global ``random`` generator and the mailboxes, is
+    then used in the order in which they took turns, so a replay taking the turns in the recorded order repeats the
+    recorded run exactly. While recording, devices take turns in the order they ask for them.
+
+    A replay gives up on the recorded order if the device whose turn it is does not take it within ``patience``
+    seconds, e.g. because a device checks the clock, and the devices take turns as they ask for them from then on.
+
+    Attributes:
+        order (list[list[int]]): ``[device, turns]`` for every device taking one or more turns in a row, in order.
+        replaying (bool): Whether the turns are handed out in a recorded order.
+        diverged (bool): Whether a replay gave up on the recorded order.
+    """
+
+    patience = 2.0
+
+    def __init__(self, number_of_devices: int, order: Optional[list[list[int]]] = None):
+        self.order = [] if order is None else order
+        self.replaying = order is not None
+        self.diverged = False
+        self._lock = threading.Lock()
+        # every device waits for its turn on a condition of its own, so only the next device is woken
+        self._turn = [threading.Condition(self._lock) for _ in range(number_of_devices)]
+        self._holder: Optional[int] = None
+        self._waiting: deque[int] = deque()
+        # the position in a replayed order, a run and the turns taken in it
+        self._run = 0
+        self._taken = 0
+        self._finished: set[int] = set()
+
+    def take(self, index: int):
+        """
+        Wait for the turn of a device.
+        """
+        with self._lock:
+            self._waiting.append(index)
+            while not self._may_take(index):
+                position = (self._run, self._taken)
+                if (
+                    not self._turn[index].wait(self.patience)
+                    and self._holder is None
+                    and (self._run, self._taken) == position
+                    and self.replaying
+                ):
+                    self._diverge()
+            self._waiting.remove(index)
+            self._holder = index
+            if not self.replaying:
+                if len(self.order) > 0 and self.order[-1][0] == index:
+                    self.order[-1][1] += 1
+                else:
+                    self.order.append([index, 1])
+            elif not self.diverged:
+                self._taken += 1
+                if self._taken == self.order[self._run][1]:
+                    self._run += 1
+                    self._taken = 0
+
+    # called with the lock held
+    def _may_take(self, index: int) -> bool:
+        if self._holder is not None:
+            return False
+        if not self.replaying or self.diverged:
+            return self._waiting[0] == index
+        if self._run == len(self.order):
+            # the replay takes more turns than the recorded run
+            self._diverge()
+            return self._waiting[0] == index
+        return self.order[self._run][0] == index
+
+    def _diverge(self):
+        self.diverged = True
+        for condition in self._turn:
+            condition.notify()
+
+    def give(self, index: int):
+        """
+        Pass the turn of a device on, e.g. before it waits.
+        """
+        with self._lock:
+            if self._holder != index:
+                return
+            self._holder = None
+            self._wake()
+
+    # called with the lock held
+    def _wake(self):
+        if not self.replaying or self.diverged:
+            if len(self._waiting) > 0:
+                self._turn[self._waiting[0]].notify()
+        elif self._run == len(self.order) or self.order[self._run][0] in self._finished:
+            # the device whose turn it is returned already
+            self._diverge()
+        else:
+            self._turn[self.order[self._run][0]].notify()
+
+    def switch(self, index: int):
+        """
+        Let the other devices take a turn, called whenever a device calls the medium.
+
+        Devices that do not hold the turn, like the coroutines of the asyncio network, are not held up.
+        """
+        if self._holder != index:
+            return
+        self.give(index)
+        self.take(index)
+
+    def finish(self, index: int):
+        """
+        Pass the turn of a device that returned on for good.
+        """
+        with self._lock:
+            self._finished.add(index)
+            if self._holder == index:
+                self._holder = None
+            self._wake()
+
+
+def take_where(
+    messages, predicate: Callable[[MessageStub], bool]
+) -> Optional[MessageStub]:
+    """
+    Remove the first message satisfying a predicate from a list or deque.
+
+    Args:
+        messages (list | deque): The messages waiting for a device.
+        predicate (Callable[[MessageStub], bool]): Selects the message.
+
+    Returns:
+        Optional[MessageStub]: The message, or None if none of the messages satisfies the predicate.
+    """
+    for i, message in enumerate(messages):
+        if predicate(message):
+            del messages[i]
+            return message
+    return None
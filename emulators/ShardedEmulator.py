@@ -0,0 +1,524 @@
+import contextlib
+import io
+import math
+import multiprocessing
+import os
+import pickle
+import queue
+import threading
+import traceback
+from bisect import bisect_right
+from os import name
+from typing import Optional
+
+from emulators.AsyncEmulator import AsyncEmulator
+from emulators.CopyPolicy import DEEP_COPY, CopyPolicy
+from emulators.EmulatorStub import EmulatorStub, Progress
+from emulators.EventLog import (
+    MESSAGES,
+    QUIET,
+    ROUND,
+    ROUNDS,
+    SEND,
+    ConsoleSink,
+    EventLog,
+)
+from emulators.MessageStub import MessageStub
+from emulators.RunContext import RunContext
+from emulators.SyncEmulator import SyncEmulator
+
+if name == "posix":
+    RESET = "\u001B[0m"
+    CYAN = "\u001B[36m"
+    GREEN = "\u001B[32m"
+else:
+    RESET = ""
+    CYAN = ""
+    GREEN = ""
+
+_STOP = None
+
+
+class SharedStateError(RuntimeError):
+    """
+    Raised when a device of a sharded emulation uses state shared through the context of the run.
+    """
+
+
+class _ShardContext(RunContext):
+    """
+    Context of a shard, the devices of the other shards live in other processes and would never see its state.
+    """
+
+    def shared(self, name: str, create):
+        raise SharedStateError(
+            f'The devices share "{name}" through the context of the run, which does not work across the processes '
+            f"of the sharded emulator, run them without shards"
+        )
+
+    def count(self, name: str) -> int:
+        raise SharedStateError(
+            f'The devices count "{name}" in the context of the run, which does not work across the processes of the '
+            f"sharded emulator, run them without shards"
+        )
+
+
+class _Shard:
+    """
+    Routing shared by the shards, the part of a sharded emulation running inside one worker process.
+
+    A shard hosts a contiguous range of devices. Messages between its own devices are handled by the emulator it is
+    mixed into, messages for devices of other shards are pickled right away, collected in one outbox per shard and put
+    on the inbox of that shard in batches, or all at once at the end of a round when ``batch_size`` is None.
+    """
+
+    batch_size: Optional[int] = 256
+    # seconds between the progress reports of a running shard, see ShardedEmulator.progress
+    progress_interval = 0.1
+    # messages are routed one by one, they may belong to different shards
+    queue_many = EmulatorStub.queue_many
+    broadcast = EmulatorStub.broadcast
+    _context_type = _ShardContext
+
+    def __init__(
+        self,
+        shard: int,
+        bounds: list[int],
+        inboxes: list,
+        results: multiprocessing.Queue,
+        kind,
+        log_level: int = MESSAGES,
+        **kwargs,
+    ):
+        self._shard = shard
+        self._bounds = bounds
+        self._inboxes = inboxes
+        self._results = results
+        self._outboxes: list[list[bytes]] = [[] for _ in inboxes]
+        self._outbox_lock = threading.Lock()
+        self._remote_sent = 0
+        self._remote_bytes = 0
+        self._stopped = threading.Event()
+        log = EventLog(log_level, [ConsoleSink()] if log_level > QUIET else [])
+        super().__init__(bounds[-1], kind, log=log, **kwargs)
+
+    def _hosts(self, index: int) -> bool:
+        return self._bounds[self._shard] <= index < self._bounds[self._shard + 1]
+
+    def _owner(self, index: int) -> int:
+        return bisect_right(self._bounds, index) - 1
+
+    def queue(self, message: MessageStub, stepper=False):
+        if not self._exists(message):
+            return
+        owner = self._owner(message.destination)
+        if owner == self._shard:
+            return super().queue(message)
+        # crossing to another process copies the message anyway, whatever the copy policy
+        data = pickle.dumps(message, pickle.HIGHEST_PROTOCOL)
+        if self._log.level >= MESSAGES:
+            self._log.record(SEND, message)
+        with self._outbox_lock:
+            self._remote_sent += 1
+            self._remote_bytes += len(data)
+            outbox = self._outboxes[owner]
+            outbox.append(data)
+            if self.batch_size is None or len(outbox) < self.batch_size:
+                return
+            self._outboxes[owner] = []
+        self._inboxes[owner].put(outbox)
+
+    def _take_outboxes(self) -> list[list[bytes]]:
+        with self._outbox_lock:
+            outboxes = self._outboxes
+            self._outboxes = [[] for _ in self._inboxes]
+        return outboxes
+
+    def _run_thread(self, index: int):
+        try:
+            super()._run_thread(index)
+        except SharedStateError:
+            # the other devices may wait for this one forever, the whole emulation fails instead
+            self._results.put(("failed", self._shard, traceback.format_exc()))
+
+    def _report_loop(self):
+        # the messages sent so far and the rounds completed, read without locking as they only ever grow
+        while not self._stopped.wait(self.progress_interval):
+            self._results.put(
+                (
+                    "progress",
+                    self._shard,
+                    (self._messages_sent + self._remote_sent, self._rounds),
+                )
+            )
+
+    def report(self) -> dict:
+        results = []
+        for device in self._devices:
+            if device is not None:
+                output = io.StringIO()
+                with contextlib.redirect_stdout(output):
+                    device.print_result()
+                results.append(output.getvalue())
+        return {
+            "messages_sent": self._messages_sent + self._remote_sent,
+            "bytes_copied": self._bytes_copied + self._remote_bytes,
+            "rounds": self._rounds,
+            "round_times": getattr(self, "_round_times", []),
+            "results": results,
+        }
+
+
+class _AsyncShard(_Shard, AsyncEmulator):
+    flush_interval = 0.002
+
+    def __init__(
+        self,
+        shard: int,
+        bounds: list[int],
+        inboxes: list,
+        results: multiprocessing.Queue,
+        kind,
+        **kwargs,
+    ):
+        # virtual clocks cannot be kept consistent across processes, messages are delivered in any order
+        super().__init__(shard, bounds, inboxes, results, kind, latency=None, **kwargs)
+
+    def run(self):
+        receiver = threading.Thread(target=self._receive_loop)
+        flusher = threading.Thread(target=self._flush_loop)
+        reporter = threading.Thread(target=self._report_loop)
+        receiver.start()
+        flusher.start()
+        reporter.start()
+        self._start_threads()
+        self.wait_for_termination()
+        for t in self._threads:
+            t.join()
+        self._stopped.set()
+        flusher.join()
+        reporter.join()
+        self._flush()
+        self._results.put(("finished", self._shard, None))
+        # keep emptying the inbox until every shard is finished, the other shards might still be sending
+        receiver.join()
+        for inbox in self._inboxes:
+            inbox.cancel_join_thread()
+        self._log.close()
+
+    def _flush(self):
+        for owner, batch in enumerate(self._take_outboxes()):
+            if len(batch) > 0:
+                self._inboxes[owner].put(batch)
+
+    def _flush_loop(self):
+        while not self._stopped.wait(self.flush_interval):
+            self._flush()
+
+    def _receive_loop(self):
+        inbox = self._inboxes[self._shard]
+        while True:
+            batch = inbox.get()
+            if batch is _STOP:
+                return
+            for data in batch:
+                m = pickle.loads(data)
+                self._messages[m.destination].put(m)
+
+
+class _SyncShard(_Shard, SyncEmulator):
+    batch_size = None
+    # other shards may still send messages and the rounds of all shards advance together, run skips rounds instead
+    _fast_forward = False
+
+    def __init__(
+        self,
+        shard: int,
+        bounds: list[int],
+        inboxes: list,
+        results: multiprocessing.Queue,
+        kind,
+        **kwargs,
+    ):
+        super().__init__(shard, bounds, inboxes, results, kind, **kwargs)
+        self._alive = len(self._threads)
+        self._outstanding = self._alive
+        # every device of every shard sleeps without a timeout and nothing is in transit, see _exchange
+        self._everyone_asleep = False
+
+    def run(self):
+        reporter = threading.Thread(target=self._report_loop)
+        reporter.start()
+        self._progress.acquire()
+        for index in self.ids:
+            self._awaits[index].acquire()
+        self._start_threads()
+        # make sure the round_lock is locked initially, a shard without devices finishes its rounds right away
+        self._round_lock.acquire()
+        if self._outstanding == 0:
+            self._round_lock.release()
+        self._progress.release()
+
+        early: dict[int, list[tuple[int, Optional[float], list[bytes]]]] = {}
+        while True:
+            self._round_lock.acquire()
+            alive, asleep_until = self._exchange(early)
+            self._progress.acquire()
+            if self._shard == 0 and self._log.level >= ROUNDS:
+                self._log.record(ROUND, value=self._rounds)
+            if alive == 0:
+                self._progress.release()
+                break
+            if asleep_until == math.inf:
+                # no message can ever arrive, wake everybody to tell them
+                self._everyone_asleep = True
+            elif asleep_until is not None and asleep_until - 1 > self._rounds:
+                # nothing happens until the first device times out, every shard skips the same rounds
+                self._skipped += asleep_until - 1 - self._rounds
+                self._rounds = asleep_until - 1
+            self._advance_round()
+            if self._outstanding == 0:
+                self._round_lock.release()
+            self._progress.release()
+        for t in self._threads:
+            t.join()
+        self._stopped.set()
+        reporter.join()
+        self._results.put(("finished", self._shard, None))
+        self._log.close()
+
+    def _wake(self) -> list[int]:
+        if self._everyone_asleep:
+            self._everyone_asleep = False
+            self._quiet.update(self._sleeping.keys())
+            for index in self._sleeping:
+                self._sleeping[index] = self._rounds
+        return super()._wake()
+
+    def _asleep_until(self, outboxes: list[list[bytes]]) -> Optional[float]:
+        # the round the first device of this shard times out in if they all sleep and nothing is in transit, else None
+        if len(self._waiting) > 0 or len(self._current_round_messages) > 0:
+            return None
+        if any(len(batch) > 0 for batch in outboxes):
+            return None
+        deadlines = [d for d in self._sleeping.values() if d is not None]
+        return min(deadlines) if len(deadlines) > 0 else math.inf
+
+    def _exchange(
+        self, early: dict[int, list[tuple[int, Optional[float], list[bytes]]]]
+    ) -> tuple[int, Optional[float]]:
+        # every shard sends every other shard one batch per round, receiving them all is the global round barrier
+        outboxes = self._take_outboxes()
+        asleep_until = self._asleep_until(outboxes)
+        for owner, batch in enumerate(outboxes):
+            if owner != self._shard:
+                self._inboxes[owner].put(
+                    (self._rounds, self._alive, asleep_until, batch)
+                )
+        arrived = early.pop(self._rounds, [])
+        inbox = self._inboxes[self._shard]
+        while len(arrived) < len(self._inboxes) - 1:
+            rnd, alive, remote_asleep_until, batch = inbox.get()
+            if rnd == self._rounds:
+                arrived.append((alive, remote_asleep_until, batch))
+            else:
+                # a faster shard is already done with the next round
+                early.setdefault(rnd, []).append((alive, remote_asleep_until, batch))
+        alive = self._alive
+        for remote_alive, remote_asleep_until, batch in arrived:
+            alive += remote_alive
+            if asleep_until is not None:
+                # the whole network is asleep only if every shard is, until the first device anywhere times out
+                asleep_until = (
+                    None
+                    if remote_asleep_until is None
+                    else min(asleep_until, remote_asleep_until)
+                )
+            for data in batch:
+                m = pickle.loads(data)
+                if m.destination not in self._current_round_messages:
+                    self._current_round_messages[m.destination] = []
+                self._current_round_messages[m.destination].append(m)
+        return alive, asleep_until
+
+
+def _run_shard(
+    synchronous: bool,
+    shard: int,
+    bounds: list[int],
+    inboxes: list,
+    results: multiprocessing.Queue,
+    kind,
+    options: dict,
+):
+    try:
+        shard_type = _SyncShard if synchronous else _AsyncShard
+        emulator = shard_type(shard, bounds, inboxes, results, kind, **options)
+        emulator.run()
+        results.put(("result", shard, emulator.report()))
+    except BaseException:
+        results.put(("failed", shard, traceback.format_exc()))
+
+
+class ShardedEmulator:
+    """
+    Emulator partitioning the devices across worker processes, so CPU-bound devices are not limited to a single core.
+
+    Each worker process hosts a contiguous range of devices and runs them like the AsyncEmulator, or like the
+    SyncEmulator when ``synchronous`` is set, in which case the shards exchange their messages at the end of every round
+    so all devices still proceed in lockstep. Messages between shards are pickled and sent through ``multiprocessing``
+    queues in batches. Devices only share memory with devices of the same shard, so algorithms relying on class or
+    module variables to coordinate devices do not work across shards, and devices using ``shared`` or ``count`` of
+    the context of the run make the emulation fail with a SharedStateError. Asynchronous shards deliver in any order,
+    they do not support latency models. While they run, the shards report the messages they sent and the rounds they
+    completed every ``_Shard.progress_interval`` seconds, so ``progress`` lags behind by at most that long.
+
+    Attributes:
+        _shards (int): The number of worker processes.
+        _bounds (list[int]): The first device of each shard, followed by the number of devices.
+    """
+
+    def __init__(
+        self,
+        number_of_devices: int,
+        kind,
+        shards: Optional[int] = None,
+        synchronous: bool = False,
+        copy_policy: CopyPolicy = DEEP_COPY,
+        log: Optional[EventLog] = None,
+    ):
+        self._nids = number_of_devices
+        self._kind = kind
+        self._synchronous = synchronous
+        self._shards = max(1, min(shards or os.cpu_count() or 1, number_of_devices))
+        self._bounds = [
+            shard * number_of_devices // self._shards
+            for shard in range(self._shards + 1)
+        ]
+        self._options = {
+            "copy_policy": copy_policy,
+            "log_level": log.level if log is not None else MESSAGES,
+        }
+        self._log = log
+        self._running = number_of_devices
+        self._messages_sent = 0
+        self._bytes_copied = 0
+        self._rounds = 0
+        # the latest messages sent and rounds reported by each running shard
+        self._shard_progress: dict[int, tuple[int, int]] = {}
+        self._round_times: list[float] = []
+        self._results: list[str] = []
+
+    @property
+    def ids(self):
+        return range(0, self._nids)
+
+    @property
+    def all_terminated(self) -> bool:
+        return self._running == 0
+
+    def progress(self) -> Progress:
+        return Progress(self._nids, self._running, self._messages_sent, self._rounds)
+
+    def run(self):
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("fork" if "fork" in methods else "spawn")
+        inboxes = [context.Queue() for _ in range(self._shards)]
+        results = context.Queue()
+        workers = [
+            context.Process(
+                target=_run_shard,
+                args=(
+                    self._synchronous,
+                    shard,
+                    self._bounds,
+                    inboxes,
+                    results,
+                    self._kind,
+                    self._options,
+                ),
+                daemon=True,
+            )
+            for shard in range(self._shards)
+        ]
+        print(f"Starting {self._shards} shards")
+        for worker in workers:
+            worker.start()
+
+        reports = {}
+        finished = 0
+        try:
+            while len(reports) < self._shards:
+                try:
+                    kind, shard, payload = results.get(timeout=1.0)
+                except queue.Empty:
+                    if any(worker.exitcode not in (None, 0) for worker in workers):
+                        raise RuntimeError("A shard died unexpectedly")
+                    continue
+                if kind == "failed":
+                    raise RuntimeError(f"Shard {shard} failed:\n{payload}")
+                if kind == "progress":
+                    # counters only ever grow, progress() may be called from another thread at any time
+                    self._shard_progress[shard] = payload
+                    self._messages_sent = sum(
+                        sent for sent, _ in self._shard_progress.values()
+                    )
+                    self._rounds = max(
+                        rounds for _, rounds in self._shard_progress.values()
+                    )
+                elif kind == "finished":
+                    finished += 1
+                    self._running -= self._bounds[shard + 1] - self._bounds[shard]
+                    if finished == self._shards and not self._synchronous:
+                        # nobody sends anymore, let the shards stop emptying their inboxes
+                        for inbox in inboxes:
+                            inbox.put(_STOP)
+                else:
+                    reports[shard] = payload
+        finally:
+            for worker in workers:
+                if worker.is_alive() and len(reports) < self._shards:
+                    worker.terminate()
+            for worker in workers:
+                worker.join()
+            if self._log is not None:
+                self._log.close()
+
+        self._messages_sent = sum(
+            report["messages_sent"] for report in reports.values()
+        )
+        for shard in range(self._shards):
+            report = reports[shard]
+            self._bytes_copied += report["bytes_copied"]
+            self._results += report["results"]
+        self._rounds = reports[0]["rounds"]
+        self._round_times = reports[0]["round_times"]
+
+    def print_result(self):
+        for result in self._results:
+            print(result, end="")
+
+    def statistics(self) -> dict:
+        statistics = {
+            "messages": self._messages_sent,
+            "rounds": self._rounds,
+            "bytes_copied": self._bytes_copied,
+        }
+        if len(self._round_times) > 0:
+            statistics["round_time"] = sum(self._round_times) / len(self._round_times)
+        return statistics
+
+    def print_statistics(self):
+        print(f"\t{GREEN}Total{RESET} {self._messages_sent} messages")
+        print(
+            f"\t{GREEN}Average{RESET} {self._messages_sent/self._nids} messages/device"
+        )
+        print(f"\t{GREEN}Copied{RESET} {self._bytes_copied} bytes")
+        print(f"\t{GREEN}Shards{RESET} {self._shards} processes")
+        if self._synchronous:
+            print(f"\t{GREEN}Total{RESET} {self._rounds} rounds")
+            if len(self._round_times) > 0:
+                print(
+                    f"\t{GREEN}Round time{RESET} {1000 * sum(self._round_times) / len(self._round_times):.3f} ms average, "
+                    f"{1000 * max(self._round_times):.3f} ms slowest"
+                )
@@ -1,13 +1,17 @@
-import copy
-import random
-from time import sleep
+import math
 from typing import Optional
 from emulators.AsyncEmulator import AsyncEmulator
 from .EmulatorStub import EmulatorStub
 from emulators.SyncEmulator import SyncEmulator
 from emulators.MessageStub import MessageStub
+from emulators.Breakpoints import Breakpoint, first_hit
+from emulators.EventLog import MESSAGES, RECEIVE, ROUND, ROUNDS
+from emulators.History import History
+from emulators.Schedule import take_where
+from emulators.Transit import TransitStore
 from threading import (
     Barrier,
+    Condition,
     Lock,
     BrokenBarrierError,
 )  # run getpass in seperate thread
@@ -26,42 +30,79 @@ else:
 class SteppingEmulator(SyncEmulator, AsyncEmulator):
     _single = False
     last_action = ""
-    messages_received: list[MessageStub] = []
-    messages_sent: list[MessageStub] = []
+    # messages of the history kept in memory, older ones are moved to a file, see History
+    history_size: Optional[int] = 10000
+    history_path: Optional[str] = None
     keyheld = False
     pick_device = -1
-    pick_running = False
     next_message = None
     log = None
     parent: EmulatorStub = AsyncEmulator
+    # devices wait for every step, the messages picked are recorded and handed over by a replay instead of turns
+    _takes_turns = False
+    # every message is a step of its own
+    queue_many = EmulatorStub.queue_many
+    broadcast = EmulatorStub.broadcast
+    drain = EmulatorStub.drain
 
     def __init__(
-        self, number_of_devices: int, kind
+        self, number_of_devices: int, kind, **kwargs
     ):  # default init, add stuff here to run when creating object
-        super().__init__(number_of_devices, kind)
+        if kwargs.get("faults") is not None:
+            # messages are stepped through one by one, there is nowhere to lose or duplicate them
+            raise ValueError("The stepping network does not support faults")
+        super().__init__(number_of_devices, kind, **kwargs)
         # self._stepper = Thread(target=lambda: getpass(""), daemon=True)
         # self._stepper.start()
         self.barrier = Barrier(parties=number_of_devices)
-        self.step_barrier = Barrier(parties=2)
+        # a device that has sent or received waits here for a permit, while the controller waits for the device
+        self._step_condition = Condition()
+        self._at_step = False
+        self._permits = 0
+        # the controller running the asynchronous network waits here for the devices to return or for a swap
+        self._parent_changed = Condition()
+        # checked while running, see advance
+        self.breakpoints: list[Breakpoint] = []
+        self.hit: Optional[tuple[Breakpoint, MessageStub]] = None
         self.is_stepping = True
         self.input_lock = Lock()
         # self.listener = keyboard.Listener(on_press=self._on_press, on_release=self._on_release)
         # self.listener.start()
         self.shell = self.prompt
-        self.messages_received: list[MessageStub] = []
-        self.messages_sent: list[MessageStub] = []
+        self.messages_received = History(
+            self.history_size,
+            None if self.history_path is None else f"{self.history_path}.received",
+        )
+        self.messages_sent = History(
+            self.history_size,
+            None if self.history_path is None else f"{self.history_path}.sent",
+        )
+        # the messages that can be picked, added when they reach the mailboxes of the current network
+        self.transit = TransitStore()
         msg = f"""
 {CYAN}Shell input:{RESET}:
     {CYAN}step(press return){RESET}: Step a single time through messages
+    {CYAN}<n>{RESET}, {CYAN}step <n>{RESET}:     Step n times through messages
+    {CYAN}continue{RESET}:           Run until a breakpoint stops the algorithm
+    {CYAN}until round <r>{RESET}:    Run until round r of the [sync] network
+    {CYAN}break <condition>{RESET}:  Stop running at messages matching [Message] [from #] [to #] [round #] [if expression]
+    {CYAN}breakpoints{RESET}:        Show all breakpoints
+    {CYAN}delete <#>{RESET}:         Delete a breakpoint
     {CYAN}exit{RESET}:               Finish the execution of the algorithm
     {CYAN}queue{RESET}:              Show all messages currently waiting to be transmitted
     {CYAN}queue <device #>{RESET}:   Show all messages currently waiting to be transmitted to a specific device
+    {CYAN}queue from <device #>{RESET}: Show all messages currently waiting to be transmitted from a specific device
+    {CYAN}queue <Message>{RESET}:    Show all messages of a class currently waiting to be transmitted
     {CYAN}pick{RESET}:               Pick the next message waiting to be transmitted to transmit next
+    {CYAN}pick <id>{RESET}:          Pick the message with the id to be transmitted next
     {CYAN}swap{RESET}:               Toggle between sync and async emulation
         """
         print(msg)
 
-    def dequeue(self, index: int) -> Optional[MessageStub]:
+    def dequeue(
+        self, index: int, timeout: Optional[float] = None
+    ) -> Optional[MessageStub]:
+        # every delivery is a step, so receiving never blocks
         self._progress.acquire()
         # print(f'thread {index} is in dequeue')
         if self.next_message:
@@ -69,26 +110,29 @@ class SteppingEmulator(SyncEmulator, AsyncEmulator):
                 self.collectThread()
                 return self.dequeue(index)
             else:
-                if self.parent == AsyncEmulator:
-                    messages = self._messages
-                else:
-                    messages = self._last_round_messages
-                result = messages[index].pop(messages[index].index(self.next_message))
+                result = self._take_picked(index)
                 self.next_message = None
                 self.pick_device = -1
                 self.barrier.reset()
-                print(f"\r\t{GREEN}Receive{RESET} {result}")
+                if result is not None:
+                    if self._log.level >= MESSAGES:
+                        self._log.record(RECEIVE, result)
+                    if self._recording:
+                        self._delivery_schedule.delivered(
+                            index, result, self._rounds, picked=True
+                        )
+                    if self._metrics is not None:
+                        self._metrics.message_received(index, result, self._time(index))
 
         else:
             result = self.parent.dequeue(self, index, True)
 
-        self.pick_running = False
-
         if result:
+            self.transit.discard(result)
             self.messages_received.append(result)
             self.last_action = "receive"
             if self.is_stepping:
-                self.step()
+                self.step(result)
 
         self._progress.release()
         return result
@@ -104,45 +148,185 @@ class SteppingEmulator(SyncEmulator, AsyncEmulator):
         self.last_action = "send"
         self.messages_sent.append(message)
 
-        self.pick_running = False
-
         if self.is_stepping:
-            self.step()
+            self.step(message)
         self._progress.release()
 
-    # the main function to stop execution
-    def step(self):
-        if self.is_stepping:
-            self.step_barrier.wait()
+    def _take_picked(self, index: int) -> Optional[MessageStub]:
+        # found by identity, a message equal to the picked one is a different message
+        picked = self.next_message
+        if self.parent is AsyncEmulator:
+            return self._messages[index].get_where(lambda m: m is picked)
+        return take_where(
+            self._last_round_messages.get(index, []), lambda m: m is picked
+        )
 
-    def pick(self):
-        self.print_transit()
+    def _copy(self, message: MessageStub, routed: bool = True) -> MessageStub:
+        m = super()._copy(message, routed)
         if self.parent is AsyncEmulator:
-            messages = self._messages
-        else:
-            messages = self._last_round_messages
-        keys = []
-        for key in messages.keys():
-            if len(messages[key]) > 0:
-                keys.append(key)
-        print(f"{GREEN}Available devices:{RESET} {keys}")
-        device = int(input("Specify device: "))
-        self.print_transit_for_device(device)
-        index = int(input("Specify index of the next message: "))
-        self.pick_device = device
-        self.next_message = messages[device][index]
-        while self.next_message:
-            self.pick_running = True
-            self.step_barrier.wait()
-            while self.pick_running and not self.all_terminated:
-                pass
-            sleep(0.1)
+            self.transit.add(m)
+        return m
+
+    def _advance_round(self):
+        # messages of the synchronous network can be picked once their round is over
+        arrived = [
+            m for messages in self._current_round_messages.values() for m in messages
+        ]
+        super()._advance_round()
+        for m in arrived:
+            self.transit.add(m)
+
+    # the main function to stop execution
+    def step(self, message: Optional[MessageStub] = None):
+        if not self.is_stepping:
+            return
+        # the device holds the progress lock, so a single device waits here at a time
+        with self._step_condition:
+            if self._permits > 0 and len(self.breakpoints) > 0 and message is not None:
+                self._check_breakpoints(message)
+            self._at_step = True
+            self._step_condition.notify_all()
+            self._step_condition.wait_for(
+                lambda: self._permits > 0 or not self.is_stepping
+            )
+            if self._permits > 0:
+                self._permits -= 1
+            self._at_step = False
+
+    def _check_breakpoints(self, message: MessageStub):
+        # called with the step condition held, by the device that sent or received the message
+        index = message.source if self.last_action == "send" else message.destination
+        hit = first_hit(
+            self.breakpoints, message, self._devices[index], self._rounds, self._devices
+        )
+        if hit is not None:
+            self._permits = 0
+            self.hit = (hit, message)
+            if hit.once:
+                self.breakpoints.remove(hit)
+
+    def _stepped(self) -> bool:
+        # a device waits for a permit, or nobody ever will again
+        return (self._at_step and self._permits == 0) or self.all_terminated
+
+    def wait_for_step(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until a device has sent or received a message and waits to be stepped, without using the CPU meanwhile.
+
+        Returns:
+            bool: False if the timeout passed first.
+        """
+        with self._step_condition:
+            return self._step_condition.wait_for(self._stepped, timeout)
+
+    def advance(self, steps: Optional[int] = 1):
+        """
+        Let the devices take a number of steps, and wait until the last one is done or a breakpoint fires.
+
+        Every step lets the device waiting in ``step`` continue until it, or another device, has sent or received the
+        next message. Nothing is polled, so stepping costs no CPU while waiting for input and long runs can be stepped
+        through as fast as the devices run.
+
+        Args:
+            steps (Optional[int]): The number of messages to send or receive, None runs until a breakpoint fires or
+                every device has returned.
+        """
+        with self._step_condition:
+            self._step_condition.wait_for(self._stepped)
+            if self.all_terminated:
+                return
+            self.hit = None
+            self._permits = math.inf if steps is None else steps
+            self._step_condition.notify_all()
+            self._step_condition.wait_for(self._stepped)
+            self._permits = 0
+
+    def add_breakpoint(self, text: str, once: bool = False) -> Breakpoint:
+        """
+        Stop running when a message matching a condition is sent or received, see Breakpoint.
+
+        Raises:
+            ValueError: If the condition cannot be understood, or depends on the round while the network has none.
+            SyntaxError: If the expression of the condition is not valid Python.
+        """
+        breakpoint = Breakpoint(text, once)
+        if breakpoint.rounds and self.parent is not SyncEmulator:
+            raise ValueError(
+                f'the [async] network has no rounds, "{text}" would never stop it, swap to the [sync] network first'
+            )
+        with self._step_condition:
+            self.breakpoints.append(breakpoint)
+        return breakpoint
+
+    def remove_breakpoint(self, number: int):
+        with self._step_condition:
+            del self.breakpoints[number]
+
+    def run_until(self, text: str):
+        """
+        Run until a message matching a condition is sent or received, without keeping the breakpoint.
+        """
+        breakpoint = self.add_breakpoint(text, once=True)
+        self.advance(None)
+        with self._step_condition:
+            if breakpoint in self.breakpoints:
+                # every device returned first
+                self.breakpoints.remove(breakpoint)
+
+    def pause(self):
+        """
+        Stop a run started by ``advance(None)`` at the next message, called from another thread than the one running.
+        """
+        with self._step_condition:
+            self._permits = 0
+            self._step_condition.notify_all()
+
+    def finish(self):
+        """
+        Stop stepping and let the devices run to the end.
+        """
+        with self._step_condition:
+            self.is_stepping = False
+            self._step_condition.notify_all()
+
+    def _device_returned(self):
+        super()._device_returned()
+        # the controller may be waiting for a device that is gone
+        with self._step_condition:
+            self._step_condition.notify_all()
+        with self._parent_changed:
+            self._parent_changed.notify_all()
+
+    def pick(self, message_id: Optional[int] = None):
+        if message_id is None:
+            self.print_transit()
+            message_id = int(input("Specify id of the next message: "))
+        message = self.transit.get(message_id)
+        if message is None:
+            print(f"No message with id {message_id} is in transit")
+            return
+        self.pick_message(message)
+
+    def pick_message(self, message: MessageStub):
+        """
+        Deliver a message in transit before any other message, and wait until it has been received.
+
+        Args:
+            message (MessageStub): A message in ``transit``.
+        """
+        self.pick_device = message.destination
+        self.next_message = message
+        # the other devices wait in collectThread until the picked message has been received
+        while self.next_message and not self.all_terminated:
+            self.advance()
 
     def prompt(self):
         self.prompt_active = True
         line = ""
         while not line == "exit":
-            sleep(1)
+            # let the last step finish printing, without waiting forever for devices that never send
+            self.wait_for_step(1.0)
+            self._log.flush()
             line = input(
                 f"\t[{CYAN}{len(self.messages_sent)} {RESET}->{CYAN} {len(self.messages_received)}{RESET}] > "
             )
@@ -150,69 +334,108 @@ class SteppingEmulator(SyncEmulator, AsyncEmulator):
             args = line.split(" ")
             match args[0]:
                 case "":
-                    if not self.all_terminated:
-                        self.step_barrier.wait()
+                    self.advance()
+                case steps if steps.isdigit():
+                    self.advance(int(steps))
+                    self.print_hit()
+                case "step":
+                    if len(args) == 1 or args[1].isdigit():
+                        self.advance(int(args[1]) if len(args) > 1 else 1)
+                        self.print_hit()
+                case "continue":
+                    self.advance(None)
+                    self.print_hit()
+                case "until":
+                    try:
+                        self.run_until(" ".join(args[1:]))
+                        self.print_hit()
+                    except (ValueError, SyntaxError) as e:
+                        print(f"Invalid condition: {e}")
+                case "break":
+                    try:
+                        self.add_breakpoint(" ".join(args[1:]))
+                    except (ValueError, SyntaxError) as e:
+                        print(f"Invalid condition: {e}")
+                case "breakpoints":
+                    self.print_breakpoints()
+                case "delete":
+                    try:
+                        self.remove_breakpoint(int(args[1]))
+                    except (IndexError, ValueError):
+                        print("Specify the number of a breakpoint")
                 case "queue":
                     if len(args) == 1:
                         self.print_transit()
-                    else:
+                    elif args[1] == "from" and len(args) > 2:
+                        self.print_transit(source=int(args[2]))
+                    elif args[1].isdigit():
                         self.print_transit_for_device(int(args[1]))
+                    else:
+                        self.print_transit(kind=args[1])
                 case "exit":
-                    self.is_stepping = False
-                    self.step_barrier.wait()
+                    self.finish()
                 case "swap":
                     self.swap_emulator()
                 case "pick":
                     try:
-                        self.pick()
+                        self.pick(int(args[1]) if len(args) > 1 else None)
                     except ValueError:
                         pass
             self.input_lock.release()
         self.prompt_active = False
 
+    def print_hit(self):
+        if self.hit is not None:
+            # the log prints in the background, the message that hit the breakpoint goes first
+            self._log.flush()
+            breakpoint, message = self.hit
+            print(f"{CYAN}Breakpoint{RESET} {breakpoint}: {message}")
+
+    def print_breakpoints(self):
+        self._log.flush()
+        print(f"{CYAN}Breakpoints:{RESET}")
+        for number, breakpoint in enumerate(self.breakpoints):
+            print(f"\t{CYAN}{number}{RESET}:         {breakpoint}")
+
     def print_prompt(self):
+        self._log.flush()
         print(
             f"\t[{CYAN}{len(self.messages_sent)} {RESET}->{CYAN} {len(self.messages_received)}{RESET}] > ",
             end="",
             flush=True,
         )
 
-    # print all messages in transit
-    def print_transit(self):
+    # print the messages in transit, optionally only those from a device or of a class
+    def print_transit(self, source: Optional[int] = None, kind: Optional[str] = None):
+        self._log.flush()
         print(f"{CYAN}Messages in transit:{RESET}")
-        if self.parent is AsyncEmulator:
-            for messages in self._messages.values():
-                for message in messages:
-                    print(f"\t{message}")
-        elif self.parent is SyncEmulator:
-            for messages in self._last_round_messages.values():
-                for message in messages:
-                    print(f"\t{message}")
+        print(f"\t{CYAN}id{RESET}:        <message>")
+        for message_id, message in self.transit.query(source=source, kind=kind):
+            print(f"\t{CYAN}{message_id}{RESET}:         {message}")
 
     # print all messages in transit to specified device
     def print_transit_for_device(self, device):
+        self._log.flush()
         print(f"{CYAN}Messages in transit to device #{device}{RESET}")
-        print(f"\t{CYAN}index{RESET}:     <message>")
-        index = 0
-        if self.parent is AsyncEmulator:
-            if device not in self._messages.keys():
-                return
-            messages: list[MessageStub] = self._messages.get(device)
-        elif self.parent is SyncEmulator:
-            if device not in self._last_round_messages.keys():
-                return
-            messages: list[MessageStub] = self._last_round_messages.get(device)
-        for message in messages:
-            print(f"\t{CYAN}{index}{RESET}:         {message}")
-            index += 1
+        print(f"\t{CYAN}id{RESET}:        <message>")
+        for message_id, message in self.transit.to(device).items():
+            print(f"\t{CYAN}{message_id}{RESET}:         {message}")
 
     # swap between which parent class the program will run in between deliveries
     def swap_emulator(self):
-        if self.parent is AsyncEmulator:
-            self.parent = SyncEmulator
-        elif self.parent is SyncEmulator:
-            self.parent = AsyncEmulator
+        with self._parent_changed:
+            if self.parent is AsyncEmulator:
+                self.parent = SyncEmulator
+            elif self.parent is SyncEmulator:
+                self.parent = AsyncEmulator
+            self._parent_changed.notify_all()
         print(f"Changed emulator to {GREEN}{self.parent.__name__}{RESET}")
+        if self.parent is AsyncEmulator:
+            for breakpoint in self.breakpoints:
+                if breakpoint.rounds:
+                    print(
+                        f"{CYAN}Breakpoint{RESET} {breakpoint} depends on the round, the [async] network has none"
+                    )
 
     def run(self):
         self._progress.acquire()
@@ -224,46 +447,38 @@ class SteppingEmulator(SyncEmulator, AsyncEmulator):
         self._round_lock.acquire()
         while True:
             if self.parent is AsyncEmulator:
-                sleep(0.1)
-                self._progress.acquire()
-                # check if everyone terminated
-                if self.all_terminated:
+                with self._parent_changed:
+                    self._parent_changed.wait_for(
+                        lambda: self.parent is not AsyncEmulator
+                        or self._all_returned.is_set()
+                    )
+                if self._all_returned.is_set():
                     break
-                self._progress.release()
             else:
                 self._round_lock.acquire()
                 # check if everyone terminated
                 self._progress.acquire()
-                print(f"\r\t## {GREEN}ROUND {self._rounds}{RESET} ##")
+                if self._log.level >= ROUNDS:
+                    self._log.record(ROUND, value=self._rounds)
+                if self._recording:
+                    self._delivery_schedule.round(self._rounds)
                 if self.all_terminated:
                     self._progress.release()
                     break
-                # send messages
-                for index in self.ids:
-                    # intentionally change the order
-                    if index in self._current_round_messages:
-                        nxt = copy.deepcopy(self._current_round_messages[index])
-                        random.shuffle(nxt)
-                        if index in self._last_round_messages:
-                            self._last_round_messages[index] += nxt
-                        else:
-                            self._last_round_messages[index] = nxt
-                self._current_round_messages = {}
-                self.reset_done()
-                self._rounds += 1
-                ids = [x for x in self.ids]  # convert to list to make it shuffleable
-                random.shuffle(ids)
-                for index in ids:
-                    if self._awaits[index].locked():
-                        self._awaits[index].release()
+                self._advance_round()
                 self._progress.release()
 
         for t in self._threads:
             t.join()
+        self._log.close()
 
     def done(self, id):
         return self.parent.done(self, id)
 
+    def idle(self, index: int, rounds: Optional[int] = None) -> bool:
+        # every round is stepped through by hand, so devices wake up every round
+        return EmulatorStub.idle(self, index, rounds)
+
     def _run_thread(self, index: int):
         super()._run_thread(index)
         self._devices[index]._finished = True
@@ -273,7 +488,6 @@ class SteppingEmulator(SyncEmulator, AsyncEmulator):
 
     def collectThread(self):
         # print("collecting a thread")
-        self.pick_running = False
         self._progress.release()
         try:
             self.barrier.wait()
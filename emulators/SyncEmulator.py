@@ -1,11 +1,13 @@
-import copy
-import random
 import threading
+import time
+from operator import attrgetter, itemgetter
 from os import name
 from typing import Optional
 
 from emulators.EmulatorStub import EmulatorStub
+from emulators.EventLog import MESSAGES, RECEIVE, ROUND, ROUNDS, SEND
 from emulators.MessageStub import MessageStub
+from emulators.Schedule import take_where
 
 if name == "posix":
     RESET = "\u001B[0m"
@@ -18,8 +20,11 @@ else:
 
 
 class SyncEmulator(EmulatorStub):
-    def __init__(self, number_of_devices: int, kind):
-        super().__init__(number_of_devices, kind)
+    # skip rounds in which every device sleeps in wait_for_message, only safe when this process sees the whole network
+    _fast_forward = True
+
+    def __init__(self, number_of_devices: int, kind, **kwargs):
+        super().__init__(number_of_devices, kind, **kwargs)
         self._round_lock = threading.Lock()
         self._done = [False for _ in self.ids]
         self._awaits = [threading.Lock() for _ in self.ids]
@@ -27,9 +32,84 @@ class SyncEmulator(EmulatorStub):
         self._current_round_messages = {}
         self._messages_sent = 0
         self._rounds = 0
+        # devices still to finish the current round, devices that returned are removed for good
+        self._alive = number_of_devices
+        self._outstanding = number_of_devices
+        self._waiting: list[int] = []
+        # devices in wait_for_message, with the round they wake up in at the latest, see _wake
+        self._sleeping: dict[int, Optional[int]] = {}
+        self._skipped = 0
+        self._quiet: set[int] = set()
+        self._round_started = time.perf_counter()
+        self._round_times: list[float] = []
 
     def reset_done(self):
-        self._done = [False for _ in self.ids]
+        for index in self._waiting:
+            self._done[index] = False
+        self._waiting = []
+        self._outstanding = self._alive - len(self._sleeping)
+
+    def now(self, index: int) -> float:
+        return self._rounds
+
+    def _advance_round(self):
+        # called with the progress lock held once every device has finished the round
+        now = time.perf_counter()
+        self._round_times.append(now - self._round_started)
+        self._round_started = now
+        # send messages
+        arrived = self._current_round_messages.items()
+        delivered = 0
+        if self._seed is not None:
+            # devices send in the order their threads happen to run, only the order of each sender is fixed
+            arrived = sorted(arrived, key=itemgetter(0))
+        for index, nxt in arrived:
+            if self._seed is not None:
+                nxt.sort(key=attrgetter("source"))
+            if not self._forced:
+                # intentionally change the order
+                self._rng.shuffle(nxt)
+            delivered += len(nxt)
+            if index in self._last_round_messages:
+                self._last_round_messages[index] += nxt
+            else:
+                self._last_round_messages[index] = nxt
+        self._current_round_messages = {}
+        if self._metrics is not None:
+            self._metrics.round(delivered)
+        waiting = self._waiting
+        self.reset_done()
+        self._rounds += 1
+        if len(self._sleeping) > 0:
+            waiting += self._wake()
+        self._rng.shuffle(waiting)
+        for index in waiting:
+            self._awaits[index].release()
+
+    def _wake(self) -> list[int]:
+        # called with the progress lock held after the messages of the round have been handed out
+        woken = [
+            index
+            for index, deadline in self._sleeping.items()
+            if len(self._last_round_messages.get(index, ())) > 0
+            or (deadline is not None and deadline <= self._rounds)
+        ]
+        if len(woken) == 0 and self._outstanding == 0 and self._fast_forward:
+            # every device is asleep and nothing is in transit, nothing happens until the first of them times out
+            deadlines = [d for d in self._sleeping.values() if d is not None]
+            if len(deadlines) > 0:
+                self._skipped += min(deadlines) - self._rounds
+                self._rounds = min(deadlines)
+                woken = [i for i, d in self._sleeping.items() if d == self._rounds]
+            else:
+                # no message can ever arrive, wake everybody to tell them
+                woken = list(self._sleeping.keys())
+                self._quiet.update(woken)
+        for index in woken:
+            del self._sleeping[index]
+            self._done[index] = False
+        self._outstanding += len(woken)
+        return woken
 
     def run(self):
         self._progress.acquire()
@@ -44,47 +124,64 @@ class SyncEmulator(EmulatorStub):
             self._round_lock.acquire()
             # check if everyone terminated
             self._progress.acquire()
-            print(f"\r\t## {GREEN}ROUND {self._rounds}{RESET} ##")
+            if self._log.level >= ROUNDS:
+                self._log.record(ROUND, value=self._rounds)
+            if self._recording:
+                self._delivery_schedule.round(self._rounds)
             if self.all_terminated:
                 self._progress.release()
                 break
-            # send messages
-            for index in self.ids:
-                # intentionally change the order
-                if index in self._current_round_messages:
-                    nxt = copy.deepcopy(self._current_round_messages[index])
-                    random.shuffle(nxt)
-                    if index in self._last_round_messages:
-                        self._last_round_messages[index] += nxt
-                    else:
-                        self._last_round_messages[index] = nxt
-            self._current_round_messages = {}
-            self.reset_done()
-            self._rounds += 1
-            ids = [x for x in self.ids]  # convert to list to make it shuffleable
-            random.shuffle(ids)
-            for index in ids:
-                if self._awaits[index].locked():
-                    self._awaits[index].release()
+            self._advance_round()
             self._progress.release()
         for t in self._threads:
             t.join()
+        self._log.close()
         return
 
     def queue(self, message: MessageStub, stepper=False):
+        if not self._exists(message):
+            return
+        if self._faults is not None and not stepper:
+            return self.queue_many([message])
         if not stepper:
             self._progress.acquire()
         self._messages_sent += 1
-        print(f"\r\t{GREEN}Send{RESET} {message}")
+        m = self._copy(message)
+        if self._metrics is not None:
+            self._metrics.message_sent(m, self._time(m.source))
         if message.destination not in self._current_round_messages:
             self._current_round_messages[message.destination] = []
-        self._current_round_messages[message.destination].append(
-            copy.deepcopy(message)
-        )  # avoid accidental memory sharing
+        self._current_round_messages[message.destination].append(m)
         if not stepper:
             self._progress.release()
+        # printing the message runs code of the exercise, which must not hold up the other devices
+        if self._log.level >= MESSAGES:
+            self._log.record(SEND, m)
 
-    def dequeue(self, index: int, stepper=False) -> Optional[MessageStub]:
+    def queue_many(self, messages: list[MessageStub]):
+        self._add_all(self._copy_many(messages))
+
+    def broadcast(
+        self,
+        message: MessageStub,
+        include_self: bool = False,
+        destinations: Optional[list[int]] = None,
+    ):
+        self._add_all(self._copy_broadcast(message, include_self, destinations))
+
+    def _add_all(self, messages: list[MessageStub]):
+        # copying happens outside, the lock is only held to file the messages for the next round
+        with self._progress:
+            self._messages_sent += len(messages)
+            for m in messages:
+                if m.destination not in self._current_round_messages:
+                    self._current_round_messages[m.destination] = []
+                self._current_round_messages[m.destination].append(m)
+
+    def dequeue(
+        self, index: int, stepper=False, timeout: Optional[float] = None
+    ) -> Optional[MessageStub]:
+        # messages only arrive between rounds, so there is nothing to wait for
         if not stepper:
             self._progress.acquire()
         if index not in self._last_round_messages:
@@ -96,12 +193,49 @@ class SyncEmulator(EmulatorStub):
                 self._progress.release()
             return None
         else:
-            m = self._last_round_messages[index].pop()
-            print(f"\r\t{GREEN}Receive{RESET} {m}")
+            if self._forced:
+                m = self._replay_round(index)
+            else:
+                m = self._last_round_messages[index].pop()
+            if m is not None:
+                if self._recording:
+                    self._delivery_schedule.delivered(index, m, self._rounds)
+                if self._metrics is not None:
+                    self._metrics.message_received(index, m, self._time(index))
             if not stepper:
                 self._progress.release()
+            if m is not None and self._log.level >= MESSAGES:
+                self._log.record(RECEIVE, m)
             return m
 
+    def _replay_round(self, index: int) -> Optional[MessageStub]:
+        expected = self._delivery_schedule.expected(index, self._rounds)
+        if expected is None:
+            return None
+        m = take_where(self._last_round_messages[index], expected)
+        if m is not None:
+            self._delivery_schedule.advance(index)
+        return m
+
+    def drain(self, index: int) -> list[MessageStub]:
+        if self._forced:
+            return EmulatorStub.drain(self, index)
+        with self._progress:
+            # the messages of a round are shuffled when the round starts, dequeue hands them out from the back
+            messages = self._last_round_messages.pop(index, [])
+            messages.reverse()
+            if self._recording:
+                for m in messages:
+                    self._delivery_schedule.delivered(index, m, self._rounds)
+            if self._metrics is not None:
+                now = self._time(index)
+                for m in messages:
+                    self._metrics.message_received(index, m, now)
+        if self._log.level >= MESSAGES:
+            for m in messages:
+                self._log.record(RECEIVE, m)
+        return messages
+
     def done(self, index: int):
         self._progress.acquire()
         if self._done[index]:
@@ -111,24 +245,76 @@ class SyncEmulator(EmulatorStub):
                 f"Device {index} called wait_for_next_round() twice in the same round!"
             )
         self._done[index] = True
-
-        # check if the thread have marked their round as done OR have ended
-        if all([self._done[x] or not self._threads[x].is_alive() for x in self.ids]):
+        self._waiting.append(index)
+        self._outstanding -= 1
+        if self._outstanding == 0:
             self._round_lock.release()
         self._progress.release()
+        self._await_round(index)
+
+    def _await_round(self, index: int):
+        # the other devices take their turns while this one waits, see Turns
+        if self._turns is not None:
+            self._turns.give(index)
         self._awaits[index].acquire()
+        if self._turns is not None:
+            self._turns.take(index)
+
+    def idle(self, index: int, rounds: Optional[int] = None) -> bool:
+        self._progress.acquire()
+        if self._done[index]:
+            self._progress.release()
+            raise RuntimeError(
+                f"Device {index} called wait_for_next_round() twice in the same round!"
+            )
+        if len(self._last_round_messages.get(index, ())) > 0:
+            # messages are waiting already, so this is just the end of the round
+            deadline = self._rounds + 1
+        else:
+            deadline = None if rounds is None else self._rounds + max(1, rounds)
+        self._done[index] = True
+        self._sleeping[index] = deadline
+        self._outstanding -= 1
+        if self._outstanding == 0:
+            self._round_lock.release()
+        self._progress.release()
+        self._await_round(index)
+        if index in self._quiet:
+            with self._progress:
+                self._quiet.discard(index)
+            return False
+        return True
 
     def print_statistics(self):
         print(f"\t{GREEN}Total:{RESET} {self._messages_sent} messages")
         print(
             f"\t{GREEN}Average:{RESET} {self._messages_sent/len(self._devices)} messages/device"
         )
+        print(f"\t{GREEN}Copied:{RESET} {self._bytes_copied} bytes")
         print(f"\t{GREEN}Total:{RESET} {self._rounds} rounds")
+        if self._skipped > 0:
+            print(
+                f"\t{GREEN}Skipped:{RESET} {self._skipped} rounds without awake devices"
+            )
+        if len(self._round_times) > 0:
+            print(
+                f"\t{GREEN}Round time:{RESET} {1000 * sum(self._round_times) / len(self._round_times):.3f} ms average, "
+                f"{1000 * max(self._round_times):.3f} ms slowest"
+            )
+
+    def statistics(self) -> dict:
+        statistics = super().statistics()
+        if len(self._round_times) > 0:
+            statistics["round_time"] = sum(self._round_times) / len(self._round_times)
+        statistics["skipped_rounds"] = self._skipped
+        return statistics
 
     def terminated(self, index: int):
         self._progress.acquire()
         self._done[index] = True
-        if all([self._done[x] or not self._threads[x].is_alive() for x in self.ids]):
+        self._alive -= 1
+        self._outstanding -= 1
+        if self._outstanding == 0:
             if self._round_lock.locked():
                 self._round_lock.release()
         self._progress.release()
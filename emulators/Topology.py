@@ -0,0 +1,237 @@
+import pickle
+import random
+from array import array
+from bisect import bisect_left
+from typing import Iterable, Optional
+
+from emulators.Latency import LatencyModel
+from emulators.MessageStub import MessageStub
+
+
+class Topology(LatencyModel):
+    """
+    The links of the network, each with a delay and a bandwidth.
+
+    A device can only send to itself and to its neighbours, and broadcasts without destinations go to the neighbours
+    only. The links are kept in compressed sparse rows: the neighbours of device ``i`` are
+    ``targets[offsets[i]:offsets[i + 1]]`` in increasing order, and the delay and bandwidth of a link are stored at
+    the same position. Everything is held in flat arrays, so a network of tens of thousands of devices costs a few
+    bytes per link instead of a Python list per device.
+
+    As a latency model of the ``async``, ``stepping`` and ``discrete`` networks a message arrives after the delay of
+    its link. On links with a bandwidth a message also takes its pickled size divided by the bandwidth to transmit,
+    and waits for the messages sent before it on the same link.
+
+    Attributes:
+        offsets (array): Where the links of every device start in the other arrays, followed by the number of links.
+        targets (array): The receiving device of every link.
+        delays (array): The delay of every link in virtual seconds.
+        bandwidths (array): The bandwidth of every link in bytes per virtual second, 0 for unlimited.
+    """
+
+    def __init__(
+        self,
+        number_of_devices: int,
+        links: Iterable[tuple],
+        delay: float = 0.01,
+        bandwidth: float = 0.0,
+        directed: bool = False,
+        rng: Optional[random.Random] = None,
+    ):
+        """
+        Args:
+            number_of_devices (int): The number of devices.
+            links (Iterable[tuple]): Pairs ``(source, destination)``, optionally followed by the delay and the bandwidth
+                of the link.
+            delay (float): The delay of links given without one.
+            bandwidth (float): The bandwidth of links given without one, 0 for unlimited.
+            directed (bool): Whether links only go from source to destination, by default they go both ways.
+        """
+        super().__init__(rng)
+        rows: dict[int, dict[int, tuple[float, float]]] = {}
+        for link in links:
+            source, destination = int(link[0]), int(link[1])
+            for index in (source, destination):
+                if not 0 <= index < number_of_devices:
+                    raise ValueError(f"Device {index} does not exist in {link}")
+            if source == destination:
+                continue
+            properties = (
+                float(link[2]) if len(link) > 2 else delay,
+                float(link[3]) if len(link) > 3 else bandwidth,
+            )
+            rows.setdefault(source, {})[destination] = properties
+            if not directed:
+                rows.setdefault(destination, {})[source] = properties
+        self.offsets = array("q", [0])
+        self.targets = array("i")
+        self.delays = array("d")
+        self.bandwidths = array("d")
+        for source in range(number_of_devices):
+            row = rows.pop(source, {})
+            for destination in sorted(row):
+                self.targets.append(destination)
+                self.delays.append(row[destination][0])
+                self.bandwidths.append(row[destination][1])
+            self.offsets.append(len(self.targets))
+        # waiting takes as long as the fastest link of the device, like in the MatrixLatency
+        self._idle = array(
+            "d",
+            [
+                min(self.delays[start:end]) if end > start else 0.0
+                for start, end in zip(self.offsets, self.offsets[1:])
+            ],
+        )
+        # the virtual time at which every link finishes transmitting, only the thread of the sender touches its links
+        self._busy = array("d", bytes(8 * len(self.targets)))
+
+    @classmethod
+    def ring(cls, number_of_devices: int, **kwargs) -> "Topology":
+        return cls(
+            number_of_devices,
+            [(i, (i + 1) % number_of_devices) for i in range(number_of_devices)],
+            **kwargs,
+        )
+
+    @classmethod
+    def random(
+        cls,
+        number_of_devices: int,
+        degree: float,
+        rng: Optional[random.Random] = None,
+        **kwargs,
+    ) -> "Topology":
+        """
+        A connected graph with random links, ``degree`` links per device on average.
+
+        Random links are drawn first, then every part of the graph that is not connected to the largest part is joined
+        to it by a link between random members, so the graph is connected however low the degree.
+        """
+        rng = rng if rng is not None else random
+        links = set()
+        wanted = min(
+            int(number_of_devices * degree / 2),
+            number_of_devices * (number_of_devices - 1) // 2,
+        )
+        while len(links) < wanted:
+            source = rng.randrange(number_of_devices)
+            destination = rng.randrange(number_of_devices)
+            if source != destination:
+                links.add((min(source, destination), max(source, destination)))
+        # union-find over the devices to connect the parts
+        parent = list(range(number_of_devices))
+
+        def find(index: int) -> int:
+            while parent[index] != index:
+                parent[index] = parent[parent[index]]
+                index = parent[index]
+            return index
+
+        for source, destination in links:
+            parent[find(source)] = find(destination)
+        members: dict[int, list[int]] = {}
+        for index in range(number_of_devices):
+            members.setdefault(find(index), []).append(index)
+        # joining the parts to the largest one, instead of to each other, keeps the paths short
+        parts = sorted(members.values(), key=len, reverse=True)
+        for part in parts[1:]:
+            links.add((rng.choice(parts[0]), rng.choice(part)))
+        return cls(number_of_devices, sorted(links), rng=rng, **kwargs)
+
+    @classmethod
+    def load(cls, number_of_devices: int, path: str, **kwargs) -> "Topology":
+        """
+        Read the links from a file with one link per line: the source, the destination and optionally the delay and
+        the bandwidth, separated by whitespace. Lines starting with ``#`` are skipped.
+        """
+        with open(path) as file:
+            links = [line.split() for line in file if line.strip() and line[0] != "#"]
+        return cls(number_of_devices, links, **kwargs)
+
+    @property
+    def number_of_devices(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def number_of_links(self) -> int:
+        return len(self.targets)
+
+    def neighbours(self, index: int) -> list[int]:
+        """
+        Returns:
+            list[int]: The devices the device can send to, in increasing order.
+        """
+        return self.targets[self.offsets[index] : self.offsets[index + 1]].tolist()
+
+    def degree(self, index: int) -> int:
+        return self.offsets[index + 1] - self.offsets[index]
+
+    def link(self, source: int, destination: int) -> Optional[int]:
+        """
+        Returns:
+            Optional[int]: The position of the link in the arrays, or None if the devices are not neighbours.
+        """
+        start, end = self.offsets[source], self.offsets[source + 1]
+        position = bisect_left(self.targets, destination, start, end)
+        if position < end and self.targets[position] == destination:
+            return position
+        return None
+
+    def reachable(self, source: int, destination: int) -> bool:
+        return source == destination or self.link(source, destination) is not None
+
+    def check(self, source: int, destination: int):
+        if not self.reachable(source, destination):
+            raise RuntimeError(
+                f"Device {source} cannot send to device {destination}, they are not neighbours in the topology"
+            )
+
+    def sample(self, source: int, destination: int) -> float:
+        position = self.link(source, destination)
+        return 0.0 if position is None else self.delays[position]
+
+    def idle(self, index: int) -> float:
+        return self._idle[index]
+
+    def arrival(self, message: MessageStub, now: float) -> float:
+        position = self.link(message.source, message.destination)
+        if position is None:
+            return now
+        bandwidth = self.bandwidths[position]
+        if bandwidth <= 0:
+            return now + self.delays[position]
+        sent = max(now, self._busy[position]) + _size(message) / bandwidth
+        self._busy[position] = sent
+        return sent + self.delays[position]
+
+
+def _size(message: MessageStub) -> int:
+    try:
+        return len(pickle.dumps(message, pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return 0
+
+
+def parse_topology(text: str, number_of_devices: int) -> Topology:
+    """
+    Create a topology from a command line argument.
+
+    Args:
+        text (str): One of ``ring``, ``random:DEGREE`` or ``file:PATH`` (see ``Topology.load``), optionally followed
+            by ``@DELAY`` or ``@DELAY,BANDWIDTH`` for the links given without them.
+        number_of_devices (int): The number of devices.
+
+    Returns:
+        Topology: The topology.
+    """
+    text, _, link = text.partition("@")
+    kind, _, argument = text.partition(":")
+    values = [float(x) for x in link.split(",") if x != ""]
+    kwargs = dict(zip(["delay", "bandwidth"], values))
+    if kind == "ring":
+        return Topology.ring(number_of_devices, **kwargs)
+    if kind == "random":
+        return Topology.random(number_of_devices, float(argument), **kwargs)
+    if kind == "file":
+        return Topology.load(number_of_devices, argument, **kwargs)
+    raise ValueError(f'Unknown topology "{text}"')
@@ -0,0 +1,144 @@
+import threading
+from typing import Iterator, Optional, Union
+
+from emulators.MessageStub import MessageStub
+
+
+class TransitStore:
+    """
+    The messages in transit, each with a stable id, used by the stepping emulator to show and pick messages.
+
+    Messages are kept in dictionaries keyed on their id, which remember the order in which the messages were added, so
+    looking up and removing a message by its id takes constant time, and so does removing a delivered message, which
+    is found by identity instead of by comparing it to the other messages. Messages are indexed on their destination
+    and their source, so listing the messages to or from a device only touches those messages.
+
+    Attributes:
+        _messages (dict[int, MessageStub]): The messages by id.
+        _ids (dict[int, int]): The id of every message, keyed on the ``id`` of the message object.
+        _by_destination (dict[int, dict[int, MessageStub]]): The messages to every device, by id.
+        _by_source (dict[int, dict[int, MessageStub]]): The messages from every device, by id.
+    """
+
+    def __init__(self):
+        self._messages: dict[int, MessageStub] = {}
+        self._ids: dict[int, int] = {}
+        self._by_destination: dict[int, dict[int, MessageStub]] = {}
+        self._by_source: dict[int, dict[int, MessageStub]] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def add(self, message: MessageStub) -> int:
+        """
+        Args:
+            message (MessageStub): A message that was sent.
+
+        Returns:
+            int: The id of the message, never reused for another message.
+        """
+        with self._lock:
+            message_id = self._next_id
+            self._next_id += 1
+            self._messages[message_id] = message
+            self._ids[id(message)] = message_id
+            self._by_destination.setdefault(message.destination, {})[
+                message_id
+            ] = message
+            self._by_source.setdefault(message.source, {})[message_id] = message
+            return message_id
+
+    def remove(self, message_id: int) -> MessageStub:
+        """
+        Raises:
+            KeyError: If no message with the id is in transit.
+        """
+        with self._lock:
+            message = self._messages.pop(message_id)
+            self._unindex(message_id, message)
+            return message
+
+    def discard(self, message: MessageStub) -> Optional[int]:
+        """
+        Remove a message that was delivered, if it is in the store.
+
+        Returns:
+            Optional[int]: The id the message had, or None if it was not in the store.
+        """
+        with self._lock:
+            message_id = self._ids.get(id(message))
+            if message_id is None:
+                return None
+            del self._messages[message_id]
+            self._unindex(message_id, message)
+            return message_id
+
+    # called with the lock held
+    def _unindex(self, message_id: int, message: MessageStub):
+        del self._ids[id(message)]
+        del self._by_destination[message.destination][message_id]
+        del self._by_source[message.source][message_id]
+
+    def get(self, message_id: int) -> Optional[MessageStub]:
+        return self._messages.get(message_id)
+
+    def to(self, destination: int) -> dict[int, MessageStub]:
+        """
+        Returns:
+            dict[int, MessageStub]: The messages in transit to a device by id, in the order they were sent.
+        """
+        with self._lock:
+            return dict(self._by_destination.get(destination, {}))
+
+    def destinations(self) -> list[int]:
+        """
+        Returns:
+            list[int]: The devices with messages in transit to them, in increasing order.
+        """
+        with self._lock:
+            return sorted(d for d, messages in self._by_destination.items() if messages)
+
+    def query(
+        self,
+        source: Optional[int] = None,
+        destination: Optional[int] = None,
+        kind: Union[type, str, None] = None,
+    ) -> list[tuple[int, MessageStub]]:
+        """
+        Find messages in transit.
+
+        Args:
+            source (Optional[int]): Only messages from this device.
+            destination (Optional[int]): Only messages to this device.
+            kind (Union[type, str, None]): Only messages of this class, or of a class with this name.
+
+        Returns:
+            list[tuple[int, MessageStub]]: The ids and the messages, in the order they were sent.
+        """
+        with self._lock:
+            if destination is not None:
+                candidates = self._by_destination.get(destination, {})
+            elif source is not None:
+                candidates = self._by_source.get(source, {})
+            else:
+                candidates = self._messages
+            found = []
+            for message_id, message in candidates.items():
+                if source is not None and message.source != source:
+                    continue
+                if isinstance(kind, str):
+                    if type(message).__name__ != kind:
+                        continue
+                elif kind is not None and not isinstance(message, kind):
+                    continue
+                found.append((message_id, message))
+            return found
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def __contains__(self, message_id: int) -> bool:
+        return message_id in self._messages
+
+    def __iter__(self) -> Iterator[tuple[int, MessageStub]]:
+        with self._lock:
+            return iter(list(self._messages.items()))
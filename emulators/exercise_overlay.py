@@ -1,5 +1,4 @@
 from threading import Thread
-from time import sleep
 from PyQt6.QtWidgets import (
     QWidget,
     QApplication,
@@ -8,23 +7,24 @@ from PyQt6.QtWidgets import (
     QPushButton,
     QTabWidget,
     QLabel,
+    QLineEdit,
 )
 from PyQt6.QtGui import QIcon
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, pyqtSignal
 from sys import argv
 from os import name
 from math import cos, sin, pi
-from emulators.AsyncEmulator import AsyncEmulator
+from typing import Optional
 from emulators.MessageStub import MessageStub
 
 from emulators.table import Table
 from emulators.SteppingEmulator import SteppingEmulator
 
 if name == "posix":
-    RESET = "\u001B[0m"
-    CYAN = "\u001B[36m"
-    GREEN = "\u001B[32m"
-    RED = "\u001B[31m"
+    RESET = "\u001b[0m"
+    CYAN = "\u001b[36m"
+    GREEN = "\u001b[32m"
+    RED = "\u001b[31m"
 else:
     RESET = ""
     CYAN = ""
@@ -62,10 +62,15 @@ class Window(QWidget):
     device_size = 80
     last_message = None
     windows = list()
+    # emitted by the thread running the emulator, the slots run in the thread of the window
+    stopped = pyqtSignal()
 
     def __init__(self, elements, restart_function, emulator: SteppingEmulator):
         super().__init__()
         self.emulator = emulator
+        # running the devices until a breakpoint or the end happens off the thread of the window, see run_in_background
+        self.running: Optional[Thread] = None
+        self.stopped.connect(self.show_stop)
         self.setFixedSize(self.w, self.h)
         layout = QVBoxLayout()
         tabs = QTabWidget()
@@ -94,7 +99,7 @@ class Window(QWidget):
         def show():
             received: list[MessageStub] = list()
             sent: list[MessageStub] = list()
-            for message in self.emulator.messages_received:
+            for _, message in self.emulator.messages_received.involving(device_id):
                 if message.destination == device_id:
                     received.append(message)
                 if message.source == device_id:
@@ -162,7 +167,7 @@ class Window(QWidget):
             return
         self.all_data_window = True
         content = []
-        messages = self.emulator.messages_sent
+        messages = list(self.emulator.messages_sent)
         message_content = []
         for message in messages:
             temp = str(message)
@@ -197,21 +202,21 @@ class Window(QWidget):
         if self.queue_window:
             return
         self.queue_window = True
-        content = [["Source", "Destination", "Message"]]
-        if self.emulator.parent is AsyncEmulator:
-            queue = self.emulator._messages.values()
-        else:
-            queue = self.emulator._last_round_messages.values()
-        for messages in queue:
-            for message in messages:
-                message_stripped = (
-                    str(message)
-                    .replace(f"{message.source} -> {message.destination} : ", "")
-                    .replace(f"{message.source}->{message.destination} : ", "")
-                )
-                content.append(
-                    [str(message.source), str(message.destination), message_stripped]
-                )
+        content = [["Id", "Source", "Destination", "Message"]]
+        for message_id, message in self.emulator.transit:
+            message_stripped = (
+                str(message)
+                .replace(f"{message.source} -> {message.destination} : ", "")
+                .replace(f"{message.source}->{message.destination} : ", "")
+            )
+            content.append(
+                [
+                    str(message_id),
+                    str(message.source),
+                    str(message.destination),
+                    message_stripped,
+                ]
+            )
         parent = self
 
         class MyWidget(QWidget):
@@ -229,11 +234,11 @@ class Window(QWidget):
         window.show()
 
     def pick(self):
-        if self.pick_window:
+        if self.pick_window or (self.running is not None and self.running.is_alive()):
             return
         self.pick_window = True
 
-        def execute(device, index):
+        def execute(device, message_id):
             def inner_execute():
                 if self.emulator._devices[device]._finished:
                     table.destroy(True, True)
@@ -241,10 +246,14 @@ class Window(QWidget):
                         f"{RED}The selected device has already finished execution!{RESET}"
                     )
                     return
-                if self.emulator.parent is AsyncEmulator:
-                    message = self.emulator._messages[device][index]
-                else:
-                    message = self.emulator._last_round_messages[device][index]
+                message = self.emulator.transit.get(message_id)
+                if message is None:
+                    table.destroy(True, True)
+                    self.pick_window = False
+                    print(
+                        f"{RED}The selected message has already been received!{RESET}"
+                    )
+                    return
 
                 print(f"\r{CYAN}Choice from pick command{RESET}: {message}")
 
@@ -253,27 +262,15 @@ class Window(QWidget):
                 table.destroy(True, True)
                 self.pick_window = False
                 size = len(self.emulator.messages_received)
-                while self.emulator.next_message:
-                    self.emulator.pick_running = True
+                while self.emulator.next_message and not self.emulator.all_terminated:
                     self.step()
-                    while (
-                        self.emulator.pick_running and not self.emulator.all_terminated
-                    ):
-                        pass
-                    sleep(0.1)
 
                 assert len(self.emulator.messages_received) == size + 1
 
             return inner_execute
 
-        keys = []
-        if self.emulator.parent is AsyncEmulator:
-            messages = self.emulator._messages
-        else:
-            messages = self.emulator._last_round_messages
-        for item in messages.items():
-            keys.append(item[0])
-        keys.sort()
+        keys = self.emulator.transit.destinations()
+        messages = {key: list(self.emulator.transit.to(key).items()) for key in keys}
         max_size = 0
         for m in messages.values():
             if len(m) > max_size:
@@ -284,8 +281,9 @@ class Window(QWidget):
             content.append([])
             for key in keys:
                 if len(messages[key]) > i:
-                    button = QPushButton(str(messages[key][i]))
-                    function_reference = execute(key, i)
+                    message_id, message = messages[key][i]
+                    button = QPushButton(f"#{message_id} {message}")
+                    function_reference = execute(key, message_id)
                     button.clicked.connect(function_reference)
                     content[i].append(button)
                 else:
@@ -309,15 +307,25 @@ class Window(QWidget):
     def end(self):
         if self.emulator.all_terminated:
             return
-        self.emulator.is_stepping = False
-        self.emulator.step_barrier.wait()
-        while not self.emulator.all_terminated:
-            self.set_device_color()
-        sleep(0.1)
+        self.emulator.finish()
+        if self.running is None or not self.running.is_alive():
+            self.run_in_background(self.emulator.wait_for_termination)
         # self.emulator.print_prompt()
 
+    def run_in_background(self, function):
+        # the window keeps responding meanwhile, and can pause the devices
+        def run():
+            function()
+            self.stopped.emit()
+
+        self.running = Thread(target=run, daemon=True)
+        self.running.start()
+
+    def show_stop(self):
+        self.emulator.print_hit()
+        self.set_device_color()
+
     def set_device_color(self):
-        sleep(0.1)
         messages = (
             self.emulator.messages_sent
             if self.emulator.last_action == "send"
@@ -342,13 +350,12 @@ class Window(QWidget):
                 self.last_message = last_message
 
     def step(self):
+        if self.running is not None and self.running.is_alive():
+            return
+        # returns once the next message has been sent or received, so the colors show it
         self.emulator.input_lock.acquire()
-        if not self.emulator.all_terminated:
-            self.emulator.step_barrier.wait()
+        self.emulator.advance()
         self.emulator.input_lock.release()
-
-        while self.emulator.step_barrier.n_waiting == 0:
-            pass
         self.set_device_color()
         # self.emulator.print_prompt()
 
@@ -400,6 +407,8 @@ class Window(QWidget):
             "Switch emulator": self.swap_emulator,
             "Show queue": self.show_queue,
             "Pick": self.pick,
+            "Continue": self.resume,
+            "Pause": self.pause,
         }
         inner_layout = QHBoxLayout()
         index = 0
@@ -412,9 +421,41 @@ class Window(QWidget):
             button.clicked.connect(action[1])
             inner_layout.addWidget(button)
         layout.addLayout(inner_layout)
+        breakpoint_input = QLineEdit()
+        breakpoint_input.setPlaceholderText(
+            "Add a breakpoint: [Message] [from #] [to #] [round #] [if expression]"
+        )
+        breakpoint_input.returnPressed.connect(
+            lambda: self.add_breakpoint(breakpoint_input)
+        )
+        layout.addWidget(breakpoint_input)
 
         return main_tab
 
+    def add_breakpoint(self, field: QLineEdit):
+        try:
+            breakpoint = self.emulator.add_breakpoint(field.text())
+        except (ValueError, SyntaxError) as e:
+            print(f"{RED}Invalid breakpoint{RESET}: {e}")
+            return
+        print(f"{CYAN}Breakpoint added{RESET}: {breakpoint}")
+        field.clear()
+
+    def resume(self):
+        if self.running is not None and self.running.is_alive():
+            return
+
+        # runs at full speed until a breakpoint fires, Pause is pressed or every device has returned
+        def run():
+            self.emulator.input_lock.acquire()
+            self.emulator.advance(None)
+            self.emulator.input_lock.release()
+
+        self.run_in_background(run)
+
+    def pause(self):
+        self.emulator.pause()
+
     def swap_emulator(self):
         self.emulator.input_lock.acquire()
         print()
@@ -426,10 +467,19 @@ class Window(QWidget):
         controls_tab = QWidget()
         content = {
             "step(press return)": "Step a single time through messages",
+            "<n>, step <n>": "Step n times through messages",
+            "continue": "Run until a breakpoint stops the algorithm, Pause stops it in the window",
+            "until round <r>": "Run until round r of the [sync] network",
+            "break <condition>": "Stop running at messages matching [Message] [from #] [to #] [round #] [if expression]",
+            "breakpoints": "Show all breakpoints",
+            "delete <#>": "Delete a breakpoint",
             "exit": "Finish the execution of the algorithm",
             "queue": "Show all messages currently waiting to be transmitted",
             "queue <device #>": "Show all messages currently waiting to be transmitted to a specific device",
+            "queue from <device #>": "Show all messages currently waiting to be transmitted from a specific device",
+            "queue <Message>": "Show all messages of a class currently waiting to be transmitted",
             "pick": "Pick the next message waiting to be transmitted to transmit next",
+            "pick <id>": "Pick the message with the id to be transmitted next",
             "swap": "Toggle between sync and async emulation",
         }
         main = QVBoxLayout()
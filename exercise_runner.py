@@ -1,14 +1,35 @@
 import argparse
+import contextlib
 import importlib
 import inspect
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import product
 from os import name
-from threading import Thread
+from threading import Event, Thread
+from typing import Optional
 
 from emulators.exercise_overlay import Window
 from emulators.AsyncEmulator import AsyncEmulator
+from emulators.AsyncioEmulator import AsyncioEmulator
+from emulators.CopyPolicy import POLICIES
+from emulators.DiscreteEventEmulator import DiscreteEventEmulator
+from emulators.EventLog import LEVELS, QUIET, EventLog, make_log
+from emulators.Faults import parse_faults
+from emulators.Latency import parse_latency
+from emulators.Metrics import Metrics
+from emulators.Schedule import Schedule
+from emulators.ShardedEmulator import ShardedEmulator
 from emulators.SyncEmulator import SyncEmulator
 from emulators.SteppingEmulator import SteppingEmulator
-
+from emulators.Topology import parse_topology
 
 if name == "posix":
     RESET = "\u001B[0m"
@@ -33,42 +54,125 @@ def fetch_alg(lecture: str, algorithm: str):
     return alg
 
 
+def fetch_emulator(network_type: str, options: dict):
+    if options.get("shards") is not None:
+        return partial(ShardedEmulator, synchronous=network_type == "sync")
+    if network_type == "async":
+        return AsyncEmulator
+    elif network_type == "sync":
+        return SyncEmulator
+    elif network_type == "stepping":
+        return SteppingEmulator
+    elif network_type == "discrete":
+        return DiscreteEventEmulator
+    elif network_type == "asyncio":
+        return AsyncioEmulator
+    return None
+
+
+def fetch_exercise(lecture_no: int, algorithm: str):
+    if lecture_no == 0:
+        # AsyncPingPong is PingPong as a coroutine, for the asyncio network type
+        return fetch_alg(
+            "demo", "AsyncPingPong" if algorithm == "AsyncPingPong" else "PingPong"
+        )
+    return fetch_alg(f"exercise{lecture_no}", algorithm)
+
+
 def run_exercise(
     lecture_no: int,
     algorithm: str,
     network_type: str,
     number_of_devices: int,
     gui: bool,
+    log: dict = None,
+    schedule: dict = None,
+    metrics: dict = None,
+    **options,
 ):
     print(
         f"Running Lecture {lecture_no} Algorithm {algorithm} in a network of type [{network_type}] using {number_of_devices} devices"
     )
-    if number_of_devices < 2:
+    if number_of_devices < MIN_DEVICES:
         raise IndexError(
-            f"At least two devices are needed as an input argument, got {number_of_devices}"
+            f"At least {MIN_DEVICES} devices are needed as an input argument, got {number_of_devices}"
         )
-    emulator = None
-    if network_type == "async":
-        emulator = AsyncEmulator
-    elif network_type == "sync":
-        emulator = SyncEmulator
-    elif network_type == "stepping":
-        emulator = SteppingEmulator
-    instance = None
-    if lecture_no == 0:
-        alg = fetch_alg("demo", "PingPong")
-        instance = emulator(number_of_devices, alg)
-    else:
-        alg = fetch_alg(f"exercise{lecture_no}", algorithm)
-        instance = emulator(number_of_devices, alg)
+    emulator = fetch_emulator(network_type, options)
+    record = (schedule or {}).get("record")
+    replay = (schedule or {}).get("replay")
+    emulator_options = dict(options)
+    if replay is not None:
+        emulator_options["schedule"] = Schedule.load(replay)
+        emulator_options["seed"] = emulator_options["schedule"].seed
+    elif record is not None:
+        if emulator_options.get("seed") is None:
+            # a replay has to draw the same random numbers as the recorded run
+            emulator_options["seed"] = random.randrange(2**31)
+        emulator_options["schedule"] = Schedule(emulator_options["seed"])
+    metrics_file = (metrics or {}).get("file")
+    if metrics_file is not None:
+        emulator_options["metrics"] = Metrics()
+    if emulator_options.get("seed") is not None:
+        # devices and latency models draw from the global generator
+        random.seed(emulator_options["seed"])
+    if emulator_options.get("topology") is not None:
+        # random topologies are drawn after seeding, so a seeded run gets the same network every time
+        emulator_options["topology"] = parse_topology(
+            emulator_options["topology"], number_of_devices
+        )
+    if emulator_options.get("faults") is not None:
+        # a fresh model for every run, it counts the faults and draws from the seeded generator
+        emulator_options["faults"] = parse_faults(emulator_options["faults"])
+    alg = fetch_exercise(lecture_no, algorithm)
+    instance = emulator(
+        number_of_devices, alg, log=make_log(**(log or {})), **emulator_options
+    )
+
+    def write_metrics(stop: Event, interval: float):
+        # lets a running emulation be inspected, the file is overwritten every interval
+        while not stop.wait(interval):
+            emulator_options["metrics"].write(metrics_file)
 
     def run_instance():
         if instance:
+            stop = Event()
+            writer = None
+            if metrics_file is not None and metrics.get("interval") is not None:
+                writer = Thread(
+                    target=write_metrics, args=[stop, metrics["interval"]], daemon=True
+                )
+                writer.start()
             instance.run()
+            stop.set()
+            if writer is not None:
+                writer.join()
+            if metrics_file is not None:
+                emulator_options["metrics"].write(metrics_file)
+                print(f"{CYAN}Metrics{RESET} written to {metrics_file}")
+            if record is not None:
+                emulator_options["schedule"].save(record)
+                print(f"{CYAN}Schedule{RESET} written to {record}")
+            if replay is not None:
+                print_replay(emulator_options["schedule"])
             print(f"{CYAN}Execution Complete{RESET}")
             instance.print_result()
             print(f"{CYAN}Statistics{RESET}")
             instance.print_statistics()
+            if metrics_file is not None:
+                collected = emulator_options["metrics"]
+                print(
+                    f"\t{GREEN}Delivery time{RESET} {collected.latency.quantile(0.5):.3g} s median, "
+                    f"{collected.latency.quantile(0.99):.3g} s 99th percentile"
+                )
+                print(
+                    f"\t{GREEN}Fullest mailbox{RESET} {max(collected.high_water.values(), default=0)} messages"
+                )
+            if emulator_options.get("faults") is not None:
+                faults = emulator_options["faults"]
+                print(
+                    f"\t{GREEN}Faults{RESET} {faults.lost} lost, {faults.duplicated} duplicated, "
+                    f"{faults.partitioned} partitioned, {faults.crashed} to or from crashed devices"
+                )
         else:
             raise NotImplementedError(
                 f"You are trying to run an exercise ({algorithm}) of a lecture ({lecture_no}) which has not yet been released"
@@ -79,7 +183,15 @@ def run_exercise(
         window = Window(
             number_of_devices,
             lambda: run_exercise(
-                lecture_no, algorithm, network_type, number_of_devices, True
+                lecture_no,
+                algorithm,
+                network_type,
+                number_of_devices,
+                True,
+                log,
+                schedule,
+                metrics,
+                **options,
             ),
             instance,
         )
@@ -89,6 +201,253 @@ def run_exercise(
         instance.shell()
 
 
+def print_replay(schedule: Schedule):
+    position = schedule.divergence()
+    if position is None:
+        print(
+            f"{CYAN}Replay matched{RESET} all {len(schedule.events)} recorded deliveries and rounds"
+        )
+        return
+    recorded = schedule.events[position : position + 1] or ["the end of the run"]
+    replayed = schedule.replayed[position : position + 1] or ["the end of the run"]
+    print(
+        f"{CYAN}Replay diverged{RESET} at event {position} of {len(schedule.events)}: recorded {recorded[0]}, "
+        f"replayed {replayed[0]}"
+    )
+
+
+NETWORKS = ["async", "sync", "stepping", "discrete", "asyncio"]
+# the exercises have devices talk to each other, run_exercise refuses smaller networks
+MIN_DEVICES = 2
+
+# settings of a run that --sweep can vary, and how their values are read from the command line
+SWEEPABLE = {
+    "devices": int,
+    "type": str,
+    "latency": str,
+    "topology": str,
+    "faults": str,
+    "copy": str,
+    "shards": int,
+}
+
+
+def check_configuration(configuration: dict) -> Optional[str]:
+    """
+    Check the settings of a run for combinations the networks do not support, used for the command line and for
+    every combination of a sweep.
+
+    Args:
+        configuration (dict): The settings of the run, see ``run_headless``.
+
+    Returns:
+        Optional[str]: What is wrong with the settings, or None if they can be run.
+    """
+    network_type = configuration["type"]
+    if network_type not in NETWORKS:
+        return f"unknown network [{network_type}]"
+    if configuration["devices"] < MIN_DEVICES:
+        return f"a network needs at least {MIN_DEVICES} devices"
+    latency = configuration.get("latency")
+    topology = configuration.get("topology")
+    faults = configuration.get("faults")
+    shards = configuration.get("shards")
+    if latency is not None:
+        if network_type not in ["async", "stepping", "discrete"]:
+            return f"--latency is not supported by the [{network_type}] network"
+        if topology is not None:
+            return "the links of --topology have delays of their own, --latency cannot be added"
+    if faults is not None and network_type == "stepping":
+        return "--faults is not supported by the [stepping] network"
+    if configuration.get("copy") is not None and configuration["copy"] not in POLICIES:
+        return f"unknown copy policy [{configuration['copy']}]"
+    if shards is not None:
+        if network_type not in ["async", "sync"]:
+            return f"--shards is not supported by the [{network_type}] network"
+        if latency is not None or topology is not None:
+            return "--shards does not support --latency and --topology"
+        if faults is not None:
+            return "--shards does not support --faults"
+        if configuration.get("seed") is not None:
+            return "--shards does not support --seed"
+    try:
+        # the files named by the settings are read as well, rather than failing in the middle of a batch
+        if latency is not None:
+            parse_latency(latency)
+        if topology is not None:
+            parse_topology(topology, configuration["devices"])
+        if faults is not None:
+            parse_faults(faults)
+    except (ValueError, TypeError, OSError) as e:
+        return f"invalid settings: {e}"
+    return None
+
+
+def run_headless(
+    lecture_no: int,
+    algorithm: str,
+    configuration: dict,
+    schedule: Optional[Schedule] = None,
+) -> dict:
+    """
+    Run an exercise without printing anything, used by ``run_batch`` in worker processes and by ``check_replay``.
+
+    Args:
+        lecture_no (int): The lecture of the exercise.
+        algorithm (str): The name of the solution.
+        configuration (dict): ``type`` and ``devices``, optionally ``latency``, ``topology``, ``faults`` and ``copy``
+            as given on the command line, ``shards`` and ``seed``.
+        schedule (Optional[Schedule]): A schedule to record or replay.
+
+    Returns:
+        dict: The statistics of the emulator (see ``EmulatorStub.statistics``) and the ``wall`` time in seconds.
+    """
+    options = {}
+    if configuration.get("latency") is not None:
+        # parsed here, so the model draws from the generator seeded below
+        options["latency"] = parse_latency(configuration["latency"])
+    if configuration.get("copy") is not None:
+        options["copy_policy"] = POLICIES[configuration["copy"]]
+    if configuration.get("shards") is not None:
+        options["shards"] = configuration["shards"]
+    if configuration.get("seed") is not None:
+        options["seed"] = configuration["seed"]
+        random.seed(configuration["seed"])
+    if configuration.get("topology") is not None:
+        options["topology"] = parse_topology(
+            configuration["topology"], configuration["devices"]
+        )
+    if configuration.get("faults") is not None:
+        options["faults"] = parse_faults(configuration["faults"])
+    if schedule is not None:
+        options["schedule"] = schedule
+    emulator = fetch_emulator(configuration["type"], options)
+    alg = fetch_exercise(lecture_no, algorithm)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        instance = emulator(
+            configuration["devices"], alg, log=EventLog(QUIET, []), **options
+        )
+        start = time.perf_counter()
+        instance.run()
+        wall = time.perf_counter() - start
+    result = instance.statistics()
+    result["wall"] = wall
+    return result
+
+
+def check_replay(lecture_no: int, algorithm: str, configuration: dict) -> Schedule:
+    """
+    Record a run of an exercise and replay it right away, to see whether its replays can be trusted.
+
+    Args:
+        lecture_no (int): The lecture of the exercise.
+        algorithm (str): The name of the solution.
+        configuration (dict): The settings of the run, see ``run_headless``.
+
+    Returns:
+        Schedule: The replayed schedule, see ``Schedule.divergence``.
+    """
+    seed = configuration.get("seed")
+    recording = Schedule(seed if seed is not None else random.randrange(2**31))
+    run_headless(
+        lecture_no, algorithm, dict(configuration, seed=recording.seed), recording
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        # through the file, like --record and --replay
+        path = os.path.join(directory, "schedule.json")
+        recording.save(path)
+        replay = Schedule.load(path)
+    run_headless(lecture_no, algorithm, dict(configuration, seed=replay.seed), replay)
+    return replay
+
+
+def run_batch(
+    lecture_no: int,
+    algorithm: str,
+    configuration: dict,
+    repeat: int,
+    jobs: int = None,
+    sweep: dict = None,
+) -> list[dict]:
+    """
+    Run an exercise many times in a pool of processes and print the mean and percentiles of the results.
+
+    Every combination of the values in ``sweep`` is run ``repeat`` times. With a seed in ``configuration`` the
+    repetitions use the seeds ``seed``, ``seed + 1``, ..., so a batch can be reproduced.
+
+    Args:
+        lecture_no (int): The lecture of the exercise.
+        algorithm (str): The name of the solution.
+        configuration (dict): The settings of every run, see ``run_headless``.
+        repeat (int): The number of runs of every combination.
+        jobs (int): The number of worker processes, by default one per CPU.
+        sweep (dict): Lists of values replacing the settings in ``configuration``, see SWEEPABLE.
+
+    Returns:
+        list[dict]: One record per run, holding its settings and its results, or the ``error`` it raised.
+    """
+    sweep = sweep or {}
+    names = list(sweep.keys())
+    runs = []
+    for values in product(*[sweep[name] for name in names]):
+        combination = dict(configuration)
+        combination.update(zip(names, values))
+        for repetition in range(repeat):
+            settings = dict(combination)
+            if combination.get("seed") is not None:
+                settings["seed"] = combination["seed"] + repetition
+            runs.append(settings)
+    print(
+        f"Running Lecture {lecture_no} Algorithm {algorithm} {len(runs)} times in {jobs or os.cpu_count()} processes"
+    )
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in methods else "spawn")
+    records = []
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=context) as pool:
+        futures = [
+            pool.submit(run_headless, lecture_no, algorithm, settings)
+            for settings in runs
+        ]
+        for settings, future in zip(runs, futures):
+            record = dict(settings)
+            try:
+                record.update(future.result())
+            except Exception as e:
+                record["error"] = repr(e)
+            records.append(record)
+    print_batch(records, names, repeat)
+    return records
+
+
+def _percentile(values: list[float], q: float) -> float:
+    # nearest rank, the values are sorted
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def print_batch(records: list[dict], names: list[str], repeat: int):
+    for start in range(0, len(records), repeat):
+        group = records[start : start + repeat]
+        label = ", ".join(f"{name}={group[0][name]}" for name in names)
+        succeeded = [record for record in group if "error" not in record]
+        print(
+            f"{CYAN}{label or 'Results'}{RESET} {len(succeeded)} of {len(group)} runs succeeded"
+        )
+        for record in group:
+            if "error" in record:
+                print(f"\tseed {record.get('seed')}: {record['error']}")
+        if len(succeeded) == 0:
+            continue
+        print(
+            f"\t{'':>10} {'mean':>10} {'p50':>10} {'p90':>10} {'p99':>10} {'max':>10}"
+        )
+        for key in ["messages", "rounds", "wall"]:
+            values = sorted(record[key] for record in succeeded)
+            print(
+                f"\t{GREEN}{key:>10}{RESET} {statistics.mean(values):>10.4g} {_percentile(values, 0.5):>10.4g} "
+                f"{_percentile(values, 0.9):>10.4g} {_percentile(values, 0.99):>10.4g} {values[-1]:>10.4g}"
+            )
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         description="For exercises in Distributed Systems."
@@ -115,9 +474,9 @@ if __name__ == "__main__":
         metavar="nw",
         type=str,
         nargs=1,
-        help="whether to use [async] or [sync] network",
+        help="whether to use [async], [sync], [stepping], [discrete] (single-threaded async) or [asyncio] network",
         required=True,
-        choices=["async", "sync", "stepping"],
+        choices=NETWORKS,
     )
     parser.add_argument(
         "--devices",
@@ -130,18 +489,291 @@ if __name__ == "__main__":
     parser.add_argument(
         "--gui", action="store_true", help="Toggle the gui or cli", required=False
     )
+    parser.add_argument(
+        "--latency",
+        metavar="model",
+        type=str,
+        help="Network delays of the [async], [stepping] and [discrete] networks in virtual time: none, constant:D, "
+        "uniform:LOW,HIGH (default uniform:0.01,0.1), exponential:MEAN or matrix:FILE",
+        required=False,
+    )
+    parser.add_argument(
+        "--topology",
+        metavar="graph",
+        type=str,
+        help="Links between the devices, a device can only send to its neighbours: ring, random:DEGREE or file:FILE, "
+        "optionally followed by @DELAY,BANDWIDTH of the links in virtual seconds and bytes per second",
+        required=False,
+    )
+    parser.add_argument(
+        "--faults",
+        metavar="spec",
+        type=str,
+        help="Lose and duplicate messages with a probability: drop=P,duplicate=P, or a JSON file that can also give "
+        "probabilities per link, partitions and crashes in the time of the network",
+        required=False,
+    )
+    parser.add_argument(
+        "--copy",
+        metavar="policy",
+        type=str,
+        help="How messages are copied when sent: [deep] (default), [freeze] or [cow] (copy-on-write)",
+        required=False,
+        choices=list(POLICIES.keys()),
+    )
+    parser.add_argument(
+        "--quiet",
+        action="store_true",
+        help="Do not print the messages sent and received",
+        required=False,
+    )
+    parser.add_argument(
+        "--log-level",
+        metavar="level",
+        type=str,
+        help="What to log: [quiet], [rounds] or [messages] (default)",
+        required=False,
+        default="messages",
+        choices=list(LEVELS.keys()),
+    )
+    parser.add_argument(
+        "--log-jsonl",
+        metavar="file",
+        type=str,
+        help="Also write the log to a file as JSON lines",
+        required=False,
+    )
+    parser.add_argument(
+        "--log-binary",
+        metavar="file",
+        type=str,
+        help="Also write the log to a file in a compact binary format",
+        required=False,
+    )
+    parser.add_argument(
+        "--shards",
+        metavar="N",
+        type=int,
+        help="Run the devices of an [async] or [sync] network in N processes",
+        required=False,
+    )
+    parser.add_argument(
+        "--seed",
+        metavar="N",
+        type=int,
+        help="Seed the random choices of the network and the devices",
+        required=False,
+    )
+    parser.add_argument(
+        "--record",
+        metavar="file",
+        type=str,
+        help="Write the order in which messages were delivered to a file",
+        required=False,
+    )
+    parser.add_argument(
+        "--replay",
+        metavar="file",
+        type=str,
+        help="Deliver the messages in the order written by --record",
+        required=False,
+    )
+    parser.add_argument(
+        "--check-replay",
+        action="store_true",
+        help="Record a run without output and replay it right away, and report whether the replay received the "
+        "same messages in the same order",
+        required=False,
+    )
+    parser.add_argument(
+        "--metrics",
+        metavar="file",
+        type=str,
+        help="Write counters, mailbox depths and delivery times to a file, in the Prometheus text format for files "
+        "ending in .prom and as JSON otherwise",
+        required=False,
+    )
+    parser.add_argument(
+        "--metrics-interval",
+        metavar="S",
+        type=float,
+        help="Also write the metrics every S seconds while the emulation is running",
+        required=False,
+    )
+    parser.add_argument(
+        "--repeat",
+        metavar="K",
+        type=int,
+        help="Run the exercise K times without output and print the mean and percentiles of the results, with --seed "
+        "the runs use consecutive seeds",
+        required=False,
+    )
+    parser.add_argument(
+        "--jobs",
+        metavar="J",
+        type=int,
+        help="Number of processes running the repetitions, by default one per CPU",
+        required=False,
+    )
+    parser.add_argument(
+        "--sweep",
+        metavar="setting=values",
+        type=str,
+        action="append",
+        help=f"Repeat the exercise for each of the comma separated values of a setting, one of "
+        f"{', '.join(SWEEPABLE.keys())}, e.g. devices=4,8,16. Can be given several times",
+        required=False,
+    )
+    parser.add_argument(
+        "--results",
+        metavar="file",
+        type=str,
+        help="Write the results of every repetition as JSON",
+        required=False,
+    )
     args = parser.parse_args()
     import sys
 
-    if args.gui and args.type[0] == "stepping":
+    log = {
+        "level": args.log_level,
+        "console": not args.quiet,
+        "jsonl": args.log_jsonl,
+        "binary": args.log_binary,
+    }
+
+    configuration = {
+        "type": args.type[0],
+        "devices": args.devices[0],
+        "latency": args.latency,
+        "topology": args.topology,
+        "faults": args.faults,
+        "copy": args.copy,
+        "shards": args.shards,
+        "seed": args.seed,
+    }
+    problem = check_configuration(configuration)
+    if problem is not None:
+        parser.error(problem)
+    options = {}
+    if args.latency is not None:
+        options["latency"] = parse_latency(args.latency)
+    if args.topology is not None:
+        options["topology"] = args.topology
+    if args.faults is not None:
+        options["faults"] = args.faults
+    if args.copy is not None:
+        options["copy_policy"] = POLICIES[args.copy]
+    if args.shards is not None:
+        if args.log_jsonl is not None or args.log_binary is not None:
+            parser.error("--shards only logs to the console")
+        options["shards"] = args.shards
+    if args.seed is not None:
+        options["seed"] = args.seed
+    schedule = {"record": args.record, "replay": args.replay}
+    if args.record is not None or args.replay is not None:
+        if args.record is not None and args.replay is not None:
+            parser.error("--record and --replay cannot be combined")
+        if args.shards is not None:
+            parser.error("--shards does not support --record and --replay")
+        if args.replay is not None and args.seed is not None:
+            parser.error("--replay uses the seed of the recorded run")
+    if args.check_replay:
+        if args.type[0] == "stepping" or args.gui:
+            parser.error("the [stepping] network and the gui cannot check replays")
+        if args.shards is not None:
+            parser.error("--shards does not support --check-replay")
+        if args.record is not None or args.replay is not None:
+            parser.error("--check-replay records and replays a run itself")
+    metrics = {"file": args.metrics, "interval": args.metrics_interval}
+    if args.metrics is not None and args.shards is not None:
+        parser.error("--shards does not support --metrics")
+    if args.metrics_interval is not None and args.metrics is None:
+        parser.error("--metrics-interval needs --metrics")
+
+    batch = (
+        args.repeat is not None
+        or args.jobs is not None
+        or args.sweep is not None
+        or args.results is not None
+    )
+    sweep = {}
+    if batch:
+        if args.type[0] == "stepping" or args.gui:
+            parser.error("the [stepping] network and the gui cannot run repetitions")
+        if args.record is not None or args.replay is not None:
+            parser.error("repetitions do not support --record and --replay")
+        if args.metrics is not None:
+            parser.error("repetitions do not support --metrics")
+        if args.log_jsonl is not None or args.log_binary is not None:
+            parser.error("repetitions are not logged")
+        for setting in args.sweep or []:
+            key, _, values = setting.partition("=")
+            if key not in SWEEPABLE or values == "":
+                parser.error(f"cannot sweep over {setting}")
+            try:
+                sweep[key] = [SWEEPABLE[key](value) for value in values.split(",")]
+            except ValueError:
+                parser.error(f"cannot sweep over {setting}")
+        names = list(sweep.keys())
+        for values in product(*[sweep[name] for name in names]):
+            # the runs happen in worker processes, settings they cannot run with are rejected before any of them starts
+            combination = dict(configuration, **dict(zip(names, values)))
+            problem = check_configuration(combination)
+            if problem is None and combination["type"] == "stepping":
+                problem = "the [stepping] network cannot run repetitions"
+            if problem is not None:
+                swept = ", ".join(
+                    f"{name}={value}" for name, value in zip(names, values)
+                )
+                parser.error(f"{problem} (--sweep {swept})")
+        if args.check_replay:
+            parser.error("repetitions cannot check replays")
+
+    if args.check_replay:
+        print(
+            f"Recording and replaying Lecture {args.lecture[0]} Algorithm {args.algorithm[0]} in a network of type "
+            f"[{args.type[0]}] using {args.devices[0]} devices"
+        )
+        replayed = check_replay(args.lecture[0], args.algorithm[0], configuration)
+        print_replay(replayed)
+        sys.exit(0 if replayed.divergence() is None else 1)
+    elif batch:
+        records = run_batch(
+            args.lecture[0],
+            args.algorithm[0],
+            configuration,
+            args.repeat or 1,
+            args.jobs,
+            sweep,
+        )
+        if args.results is not None:
+            with open(args.results, "w") as file:
+                json.dump(records, file, indent=1)
+    elif args.gui and args.type[0] == "stepping":
         from PyQt6.QtWidgets import QApplication
 
         app = QApplication(sys.argv)
         run_exercise(
-            args.lecture[0], args.algorithm[0], args.type[0], args.devices[0], True
+            args.lecture[0],
+            args.algorithm[0],
+            args.type[0],
+            args.devices[0],
+            True,
+            log,
+            schedule,
+            metrics,
+            **options,
         )
         app.exec()
     else:
         run_exercise(
-            args.lecture[0], args.algorithm[0], args.type[0], args.devices[0], False
+            args.lecture[0],
+            args.algorithm[0],
+            args.type[0],
+            args.devices[0],
+            False,
+            log,
+            schedule,
+            metrics,
+            **options,
         )
@@ -43,7 +43,7 @@ class InputArea(QFormLayout):
         self.lecture.addItems([str(i) for i in range(13) if i != 3])
 
         self.type = QComboBox()
-        self.type.addItems(["stepping", "async", "sync"])
+        self.type.addItems(["stepping", "async", "sync", "discrete", "asyncio"])
 
         self.alg = QComboBox()
         self.alg.addItems(self.__algs)
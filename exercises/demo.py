@@ -2,11 +2,15 @@ import random
 
 from emulators.Device import Device
 from emulators.Medium import Medium
-from emulators.MessageStub import MessageStub
+from emulators.MessageStub import MessageStub, compact
 
 
-# We extend the MessageStub here for the message-types we wish to communicate
+# We extend the MessageStub here for the message-types we wish to communicate. The (optional) compact decorator
+# stores the fields declared below more compactly, which pays off when many messages are in transit
+@compact
 class PingMessage(MessageStub):
+    is_ping: bool
+
     # the constructor-function takes the source and destination as arguments. These are used for "routing" but also
     # for pretty-printing. Here we also take the specific flag of "is_ping"
     def __init__(self, sender: int, destination: int, is_ping: bool):
@@ -74,3 +78,31 @@ class PingPong(Device):
         print(
             f"\tDevice {self.index} got pings: {self._rec_ping} and pongs: {self._rec_pong}"
         )
+
+
+# The same protocol for the asyncio network type (--type asyncio). When run is a coroutine, the medium is awaited and
+# all devices share a single thread, so waiting for a message does not block the others
+class AsyncPingPong(PingPong):
+    async def run(self):
+        for repetetions in range(0, 10):
+            message = PingMessage(
+                self.index,
+                random.randrange(0, self.number_of_devices),
+                self._is_ping,
+            )
+            await self.medium.send(message)
+            while True:
+                # wait a little for an answer instead of returning None right away
+                ingoing = await self.medium.receive(timeout=0.01)
+                if ingoing is None:
+                    break
+
+                if ingoing.is_ping:
+                    self._rec_ping += 1
+                else:
+                    self._rec_pong += 1
+
+                if self._is_ping != ingoing.is_ping:
+                    self._is_ping = ingoing.is_ping
+
+            await self.medium.wait_for_next_round()
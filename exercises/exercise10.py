@@ -82,7 +82,7 @@ class BlockchainMiner(Device):
     def __init__(self, index: int, number_of_devices: int, medium: Medium):
         super().__init__(index, number_of_devices, medium)
         self.blockchain = Blockchain()
-        BlockchainNetwork.miners.append(index)
+        BlockchainNetwork.miners(medium).append(index)
         self.next_nonce = 0
         # the genesis block will be created by "do_some_work"
 
@@ -116,10 +116,14 @@ class BlockchainMiner(Device):
 
     def disseminate_chain(self):
         # I send the blockchain to everybody
-        for m in BlockchainNetwork.miners:
-            if not m == self.index:
-                message = BlockchainMessage(self.index, m, self.blockchain.chain)
-                self.medium.send(message)
+        # all miners share one copy of the chain, see Medium.broadcast
+        message = BlockchainMessage(self.index, self.index, self.blockchain.chain)
+        self.medium.broadcast(
+            message,
+            destinations=[
+                m for m in BlockchainNetwork.miners(self.medium) if m != self.index
+            ],
+        )
         # Since I flushed the unconfirmed transactions, I assign the incentives to myself for next block, in case I will be the winner of the proof of work test
         self.blockchain.add_new_transaction(f"(miner {self.index} gets incentive)")
 
@@ -152,6 +156,7 @@ class BlockchainMiner(Device):
             # TODO: design a logic to respect the "longest chain" rule
             # TODO: implement it
             # HINT: consider what a fork is, that forks can happen, and what to do in that case
+            # NOTE: the chain of the message is a tuple shared with the other miners, make a list of it to change it
             pass
         elif isinstance(ingoing, BlockchainRequestMessage):
             # this is used to send the blockchain data to a client requesting them
@@ -214,7 +219,10 @@ class BlockchainClient(Device):
 
 
 class BlockchainNetwork:
-    miners = []
+    # the indices of the miners live in the context of the run, so every run starts empty
+    @staticmethod
+    def miners(medium: Medium) -> list[int]:
+        return medium.context.shared("miners", list)
 
     def __new__(cls, index: int, number_of_devices: int, medium: Medium):
         # first miner MUST have index 0
@@ -237,7 +245,8 @@ class QuitMessage(MessageStub):
 class BlockchainMessage(MessageStub):
     def __init__(self, sender: int, destination: int, chain: list):
         super().__init__(sender, destination)
-        self.chain = chain
+        # a broadcast shares the chain between all receivers, so none of them can change it
+        self.chain = tuple(chain)
 
     def __str__(self):
         return f"NEW BLOCK MESSAGE {self.source} -> {self.destination}: ({len(self.chain)} blocks)"
@@ -3,7 +3,7 @@ from typing import Optional
 
 from emulators.Device import Device
 from emulators.Medium import Medium
-from emulators.MessageStub import MessageStub
+from emulators.MessageStub import MessageStub, compact
 
 import time
 
@@ -14,9 +14,6 @@ import time
 
 # size for the chord addresses in bits
 address_size = 6
-# only for initialization:
-all_nodes: list[int] = []
-all_routing_data: list["RoutingData"] = []
 
 
 class RoutingData:
@@ -69,7 +66,7 @@ class ChordNode(Device):
             for ingoing in self.medium.receive_all():
                 if not self.handle_ingoing(ingoing):
                     return
-            self.medium.wait_for_next_round()
+            self.medium.wait_for_message()
 
     def is_request_for_me(self, guid: int) -> bool:
         # TODO: implement this function that checks if the routing process is over
@@ -140,7 +137,7 @@ class ChordClient(Device):
 
         # TODO: uncomment this code to start the JOIN process
         # new_chord_id = random.randint(0, pow(2,address_size)-1)
-        # while new_chord_id in all_nodes:
+        # while new_chord_id in ChordNetwork.initial_routing(self.medium)[0]:
         #   new_chord_id = random.randint(0, pow(2,address_size)-1)
         # message = StartJoinMessage(self.index(), 1, new_chord_id)
         # self.medium().send(message)
@@ -170,10 +167,14 @@ class ChordClient(Device):
 
 class ChordNetwork:
     # Initializes routing tables for all nodes, except for the client and disconnected node
-    def init_routing_tables(number_of_devices: int):
+    def init_routing_tables(
+        number_of_devices: int,
+    ) -> tuple[list[int], list[RoutingData]]:
         # The first node is always the client, and the second is a disconnected node
         # Therefore routing_data 0 will be for device 2, etc
         N = number_of_devices - 2  
+        all_nodes: list[int] = []
+        all_routing_data: list[RoutingData] = []
 
         # Populate the list of Chord IDs for the nodes
         while len(all_nodes) < N:
@@ -213,15 +214,24 @@ class ChordNetwork:
             print(
                 RoutingData(id + 2, all_nodes[id], prev, new_finger_table).to_string()
             )
+        return all_nodes, all_routing_data
+
+    # the Chord IDs and routing data of a run, created once by the first node and kept in the context of the run
+    @staticmethod
+    def initial_routing(medium: Medium) -> tuple[list[int], list[RoutingData]]:
+        context = medium.context
+        return context.shared(
+            "routing",
+            lambda: ChordNetwork.init_routing_tables(context.number_of_devices),
+        )
 
     def __new__(cls, index: int, number_of_devices: int, medium: Medium):
         # device #0 is the client
         # device #1 is a disconnected node
         # since device #2, they are connected nodes
 
-        # if all_nodes is empty, I init it:
-        if all_nodes == []:
-            cls.init_routing_tables(number_of_devices)
+        # the routing tables are initialised by the first device of the run
+        _, all_routing_data = cls.initial_routing(medium)
 
         if index == 0:
             return ChordClient(index, number_of_devices, medium)
@@ -241,7 +251,11 @@ class QuitMessage(MessageStub):
         return f"QUIT REQUEST {self.source} -> {self.destination}"
 
 
+@compact
 class PutMessage(MessageStub):
+    guid: int
+    data: str
+
     def __init__(self, sender: int, destination: int, guid: int, data: str):
         super().__init__(sender, destination)
         self.guid = guid
@@ -1,10 +1,9 @@
 import random
-import threading
 from typing import Optional
 
 from emulators.Device import Device
 from emulators.Medium import Medium
-from emulators.MessageStub import MessageStub
+from emulators.MessageStub import MessageStub, compact
 
 
 # if you need controlled repetitions:
@@ -18,16 +17,15 @@ probability_arc = 0.2
 
 
 class AodvNode(Device):
-    # I am doing a hack for the termination: I have a global variable increasing every time a data message is received. When it is high enough, the device sends a Quit to everybody
-    data_messages_received = 0
-    messages_lock = threading.Lock()
-
     def __init__(self, index: int, number_of_devices: int, medium: Medium):
         super().__init__(index, number_of_devices, medium)
-        # I get the topology from the singleton
-        self.neighbors = TopologyCreator.get_topology(
-            number_of_devices, probability_arc
-        )[index]
+        # I get the topology of this run, the one of the network if it has one (see --topology)
+        if medium.topology is not None:
+            self.neighbors = medium.neighbours()
+        else:
+            self.neighbors = TopologyCreator.get_topology(
+                medium, number_of_devices, probability_arc
+            )[index]
         # I initialize the "routing tables". Feel free to create your own structure if you prefer
         self.forward_path: dict[
             int, int
@@ -58,10 +56,11 @@ class AodvNode(Device):
                 # the message is for me
                 self.saved_data.append(ingoing.data)
                 # <hack for the termination>
-                AodvNode.messages_lock.acquire()
-                AodvNode.data_messages_received += 1
-                AodvNode.messages_lock.release()
-                if AodvNode.data_messages_received == self.number_of_devices:
+                # a counter of the run increases every time a data message is received. When it is high enough, the device sends a Quit to everybody
+                if (
+                    self.context.count("data_messages_received")
+                    == self.number_of_devices
+                ):
                     for i in range(0, self.number_of_devices):
                         self.medium.send(QuitMessage(self.index, i))
                 # </hack for the termination>
@@ -120,8 +119,7 @@ class AodvNode(Device):
 
 
 class TopologyCreator:
-    # singleton design pattern
-    __topology: dict[int, list[int]] = None  # "Node index" --> [neighbor node indices]
+    # one topology per run, kept in the context of the run: "Node index" --> [neighbor node indices]
 
     def __check_connected(topology: dict[int, list[int]]) -> Optional[tuple[int, int]]:
         # if the network is connected, it returns None;
@@ -155,12 +153,13 @@ class TopologyCreator:
         return topology
 
     @classmethod
-    def get_topology(cls, number_of_devices: int, probability: float):
-        if cls.__topology is None:
-            cls.__topology = TopologyCreator.__create_topology(
-                number_of_devices, probability
-            )
-        return cls.__topology
+    def get_topology(
+        cls, medium: Medium, number_of_devices: int, probability: float
+    ) -> dict[int, list[int]]:
+        return medium.context.shared(
+            "topology",
+            lambda: TopologyCreator.__create_topology(number_of_devices, probability),
+        )
 
 
 class QuitMessage(MessageStub):
@@ -191,7 +190,11 @@ class AodvRrepMessage(MessageStub):
         return f"RREP MESSAGE {self.source} -> {self.destination}: ({self.first} -> {self.last})"
 
 
+@compact
 class DataMessage(MessageStub):
+    last: int
+    data: str
+
     def __init__(self, sender: int, destination: int, last: int, data: str):
         super().__init__(sender, destination)
         self.last = last
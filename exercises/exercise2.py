@@ -29,7 +29,8 @@ class RipCommunication(Device):
     def __init__(self, index: int, number_of_devices: int, medium: Medium):
         super().__init__(index, number_of_devices, medium)
 
-        self.neighbors = []  # generate an appropriate list
+        # with --topology the network decides who the neighbours are, otherwise generate an appropriate list
+        self.neighbors = medium.neighbours() if medium.topology is not None else []
 
         self.routing_table = dict()
 
@@ -57,7 +58,7 @@ class RipCommunication(Device):
                             RipMessage(self.index, neigh, self.routing_table)
                         )
 
-            if type(ingoing) is RoutableMessage:
+            if isinstance(ingoing, RoutableMessage):
                 print(
                     f"Device {self.index}: Routing from {ingoing.first_node} to {ingoing.last_node} via #{self.index}: [#{ingoing.content}]"
                 )
@@ -2,10 +2,11 @@ import math
 
 from emulators.Medium import Medium
 from emulators.Device import Device, WorkerDevice
-from emulators.MessageStub import MessageStub
+from emulators.MessageStub import MessageStub, compact
 import enum
 
 
+@compact
 class Ping(MessageStub):
     def __init__(self, sender: int, destination: int):
         super().__init__(sender, destination)
@@ -41,7 +42,10 @@ class Type(enum.Enum):
     GRANT = 2
 
 
+@compact
 class MutexMessage(MessageStub):
+    _type: Type
+
     def __init__(self, sender: int, destination: int, message_type: Type):
         super().__init__(sender, destination)
         self._type = message_type
@@ -155,7 +159,10 @@ class TokenRing(WorkerDevice):
         print(f"Token Ring {self.index} Terminated with request? {self._requested}")
 
 
+@compact
 class StampedMessage(MutexMessage):
+    _stamp: int
+
     def __init__(self, sender: int, destination: int, message_type: Type, time: int):
         super().__init__(sender, destination, message_type)
         self._stamp = time
@@ -232,11 +239,10 @@ class RicartAgrawala(WorkerDevice):
             return
         self._state = State.WANTED
         self._time += 1
-        for id in self.medium.ids:
-            if id != self.index:
-                self.medium.send(
-                    StampedMessage(self.index, id, Type.REQUEST, self._time)
-                )
+        # the destination is filled in by the medium for every receiver
+        self.medium.broadcast(
+            StampedMessage(self.index, self.index, Type.REQUEST, self._time)
+        )
 
     def print_result(self):
         print(f"RA {self.index} Terminated with request? {self._state == State.WANTED}")
@@ -376,7 +382,7 @@ class SuzukiKasami(WorkerDevice):
     def handle_request(self, message: StampedMessage):
         self._rn[message.source] = max(self._rn[message.source], message.stamp())
         if self._token is not None and not self._working:
-            (queue, ln) = self._token
+            queue, ln = self._token
             if self._rn[message.source] == ln[message.source] + 1:
                 self._token = None
                 self.medium.send(SKToken(self.index, message.source, queue, ln))
@@ -403,11 +409,9 @@ class SuzukiKasami(WorkerDevice):
         # Tell everyone that we want the token!
         self._requested = True
         self._rn[self.index] += 1
-        for id in self.medium.ids:
-            if id != self.index:
-                self.medium.send(
-                    StampedMessage(self.index, id, Type.REQUEST, self._rn[self.index])
-                )
+        self.medium.broadcast(
+            StampedMessage(self.index, self.index, Type.REQUEST, self._rn[self.index])
+        )
 
 
 # Election Algorithms
@@ -514,9 +518,9 @@ class Bully(Device):
                         self.start_election()
                     else:
                         # we are the new leader, we could declare everybody else dead
-                        for id in self.medium.ids:
-                            if id != self.index:
-                                self.medium.send(Vote(self.index, id, self.index, True))
+                        self.medium.broadcast(
+                            Vote(self.index, self.index, self.index, True)
+                        )
                         self._leader = self.index
                         return
             self.medium.wait_for_next_round()
@@ -525,9 +529,11 @@ class Bully(Device):
     def start_election(self):
         if not self._election:
             self._election = True
-            for id in self.medium.ids:
-                if id > self.index:
-                    self.medium.send(Vote(self.index, id, self.index, self.largest()))
+            self.medium.send_many(
+                Vote(self.index, id, self.index, self.largest())
+                for id in self.medium.ids
+                if id > self.index
+            )
 
     def print_result(self):
         print(f"Leader seen from {self._id} is {self._leader}")
@@ -86,10 +86,10 @@ class BasicMulticast(Device, MulticastService):
             self._application.forward(ingoing)
 
     def send_to_all(self, content):
-        for id in self.medium.ids:
-            # we purposely send to ourselves also!
-            message = MulticastMessage(self.index, id, content)
-            self.medium.send(message)
+        # we purposely send to ourselves also!
+        self.medium.broadcast(
+            MulticastMessage(self.index, self.index, content), include_self=True
+        )
 
     def send(self, message):
         self._outbox.append(copy.deepcopy(message))
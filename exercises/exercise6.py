@@ -78,9 +78,7 @@ class FResilientConsensus(Device):
 
     def b_multicast(self, message: MessageStub):
         message.source = self.index
-        for i in self.medium.ids:
-            message.destination = i
-            self.medium.send(message)
+        self.medium.broadcast(message, include_self=True)
 
     def print_result(self):
         print(f"Device {self.index} agrees on {min(self._v)}")
@@ -126,9 +124,7 @@ class SingleByzantine(Device):
 
     def b_multicast(self, message: MessageStub):
         message.source = self.index
-        for i in self.medium.ids:
-            message.destination = i
-            self.medium.send(message)
+        self.medium.broadcast(message, include_self=True)
 
     def print_result(self):
         if self.index != 0:
@@ -172,9 +168,7 @@ class King(Device):
 
     def b_multicast(self, message: MessageStub):
         message.source = self.index
-        for i in self.medium.ids:
-            message.destination = i
-            self.medium.send(message)
+        self.medium.broadcast(message, include_self=True)
 
     def run(self):
         # Set own v to a preferred value // f+1 phases in total
@@ -259,18 +253,16 @@ class PAXOSNetwork:
         self._majority = math.ceil(len(acceptors) / 2.0)
 
     def prepare(self, uid: int):
-        for dest in self._acceptors:
-            msg = PrepareMessage(self._index, dest, uid)
-            self._medium.send(msg)
+        msg = PrepareMessage(self._index, self._index, uid)
+        self._medium.broadcast(msg, destinations=self._acceptors)
 
     def promise(self, destination: int, uid: int, prev_uid: int, prev_value):
         msg = PromiseMessage(self._index, destination, uid, prev_uid, prev_value)
         self._medium.send(msg)
 
     def request_accept(self, uid: int, value):
-        for dest in self._acceptors:
-            msg = RequestAcceptMessage(self._index, dest, uid, value)
-            self._medium.send(msg)
+        msg = RequestAcceptMessage(self._index, self._index, uid, value)
+        self._medium.broadcast(msg, destinations=self._acceptors)
 
     def accept(self, destination: int, uid: int, value):
         msg = AcceptMessage(self._index, destination, uid, value)
@@ -20,7 +20,7 @@ class GfsMaster(Device):
         self.chunks_being_allocated: list[
             tuple[int, int]
         ] = []  # [(chunkhandle, requester_index)]
-        GfsNetwork.gfsmaster.append(index)
+        GfsNetwork.gfsmaster(medium).append(index)
 
     def run(self):
         # since this is a server, its job is to wait for requests (messages), then do something
@@ -28,7 +28,7 @@ class GfsMaster(Device):
             for ingoing in self.medium.receive_all():
                 if not self.handle_ingoing(ingoing):
                     return
-            self.medium.wait_for_next_round()
+            self.medium.wait_for_message()
 
     def handle_ingoing(self, ingoing: MessageStub):
         if isinstance(ingoing, File2ChunkReqMessage):
@@ -84,7 +84,9 @@ class GfsMaster(Device):
         self._metadata[(filename, chunkindex)] = (chunkhandle, [])
 
         # Allocate the new chunk on "NUMBER_OF_REPLICAS" random chunkservers
-        chunkservers = random.sample(GfsNetwork.gfschunkserver, NUMBER_OF_REPLICAS)
+        chunkservers = random.sample(
+            GfsNetwork.gfschunkserver(self.medium), NUMBER_OF_REPLICAS
+        )
         for i in chunkservers:
             message = AllocateChunkReqMessage(self.index, i, chunkhandle, chunkservers)
             self.medium.send(message)
@@ -96,7 +98,7 @@ class GfsMaster(Device):
 class GfsChunkserver(Device):
     def __init__(self, index: int, number_of_devices: int, medium: Medium):
         super().__init__(index, number_of_devices, medium)
-        GfsNetwork.gfschunkserver.append(index)
+        GfsNetwork.gfschunkserver(medium).append(index)
         self.localchunks: dict[int, str] = {}  # chunkhandle -> contents
         # the first server in chunkservers is the primary
         self.chunkservers: dict[int, list[int]] = {}  # chunkhandle -> [chunkservers]
@@ -107,7 +109,7 @@ class GfsChunkserver(Device):
             for ingoing in self.medium.receive_all():
                 if not self.handle_ingoing(ingoing):
                     return
-            self.medium.wait_for_next_round()
+            self.medium.wait_for_message()
 
     def handle_ingoing(self, ingoing: MessageStub):
         if isinstance(ingoing, QuitMessage):
@@ -144,7 +146,7 @@ class GfsClient(Device):
     def run(self):
         # being a client, it listens to incoming messages, but it also does something to put the ball rolling
         print(f"I am Client {self.index}")
-        master = GfsNetwork.gfsmaster[0]
+        master = GfsNetwork.gfsmaster(self.medium)[0]
         message = File2ChunkReqMessage(self.index, master, "myfile.txt", 0, True)
         self.medium.send(message)
 
@@ -171,9 +173,9 @@ class GfsClient(Device):
             )
         elif isinstance(ingoing, RecordAppendRspMessage):
             # project completed, time to quit
-            for i in GfsNetwork.gfsmaster:
+            for i in GfsNetwork.gfsmaster(self.medium):
                 self.medium.send(QuitMessage(self.index, i))
-            for i in GfsNetwork.gfschunkserver:
+            for i in GfsNetwork.gfschunkserver(self.medium):
                 self.medium.send(QuitMessage(self.index, i))
             return False
         return True
@@ -191,8 +193,14 @@ class GfsNetwork:
         else:
             return GfsClient(index, number_of_devices, medium)
 
-    gfsmaster = []
-    gfschunkserver = []
+    # the indices of the masters and chunkservers live in the context of the run, so every run starts empty
+    @staticmethod
+    def gfsmaster(medium: Medium) -> list[int]:
+        return medium.context.shared("gfsmaster", list)
+
+    @staticmethod
+    def gfschunkserver(medium: Medium) -> list[int]:
+        return medium.context.shared("gfschunkserver", list)
 
 
 class QuitMessage(MessageStub):
@@ -26,7 +26,7 @@ class MapReduceMaster(Device):
             for ingoing in self.medium.receive_all():
                 if not self.handle_ingoing(ingoing):
                     return
-            self.medium.wait_for_next_round()
+            self.medium.wait_for_message()
 
     def handle_ingoing(self, ingoing: MessageStub):
         if isinstance(ingoing, ClientJobStartMessage):
@@ -53,7 +53,7 @@ class MapReduceMaster(Device):
                 self.medium.send(message)
         elif isinstance(ingoing, QuitMessage):
             # if the client is satisfied with the work done, I can tell all workers to quit, then I can quit
-            for w in MapReduceNetwork.workers:
+            for w in MapReduceNetwork.workers(self.medium):
                 self.medium.send(QuitMessage(self.index, w))
             return False
         elif isinstance(ingoing, MappingDoneMessage):
@@ -82,7 +82,7 @@ class ReducerVisitMapperMessage:
 class MapReduceWorker(Device):
     def __init__(self, index: int, number_of_devices: int, medium: Medium):
         super().__init__(index, number_of_devices, medium)
-        MapReduceNetwork.workers.append(index)
+        MapReduceNetwork.workers(medium).append(index)
         self.role = Role.IDLE
         # number of partitions (equals to number of reducers)
         self.number_partitions = 0
@@ -262,7 +262,11 @@ class MapReduceNetwork:
 
     client_index = 0
     master_index = 1
-    workers: list[int] = []
+
+    # the indices of the workers live in the context of the run, so every run starts empty
+    @staticmethod
+    def workers(medium: Medium) -> list[int]:
+        return medium.context.shared("workers", list)
 
 
 class QuitMessage(MessageStub):